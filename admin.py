@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Authenticated admin actions shared by the apps
+
+Manual refreshes are no longer triggered by a query parameter on the public
+routes; POST /api/admin/refresh starts one instead:
+- Callers authenticate with `Authorization: Bearer <ADMIN_TOKEN>`; without
+  ADMIN_TOKEN set, admin routes are disabled
+- Every client (by remote address) has a token bucket of REFRESH_BURST
+  triggers, refilled at REFRESH_PER_MINUTE; failed logins spend tokens too
+- Concurrent triggers join the refresh already in flight, and the caller
+  gets the id of that refresh instead of waiting on the crawl; GET
+  /api/admin/refresh/<id> reports whether it is still running and, once
+  done, the snapshot version it published
+"""
+import hmac
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+REFRESH_BURST = int(os.environ.get('REFRESH_BURST', 3))
+REFRESH_PER_MINUTE = float(os.environ.get('REFRESH_PER_MINUTE', 2))
+MAX_CLIENTS = 10000  # Buckets kept before idle ones are dropped
+RUNS_KEPT = 20  # Finished refreshes whose status can still be polled
+
+
+def authorized(header):
+    """Whether an Authorization header carries the admin token"""
+    if not ADMIN_TOKEN or not header or not header.startswith('Bearer '):
+        return False
+    return hmac.compare_digest(header[len('Bearer '):].strip().encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+
+class TokenBucket:
+    """`burst` tokens, refilled at `rate` tokens per second"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = now
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, now):
+        """0 if a token was taken, else the seconds until one is available"""
+        self.refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float('inf')
+
+
+class RateLimiter:
+    """Per-client token buckets"""
+
+    def __init__(self, per_minute=REFRESH_PER_MINUTE, burst=REFRESH_BURST, max_clients=MAX_CLIENTS):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.limited = 0
+
+    def take(self, client):
+        """0 if the client may go ahead, else the seconds it must wait"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._evict(now)
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+            wait = bucket.take(now)
+            if wait:
+                self.limited += 1
+            return wait
+
+    def _evict(self, now):
+        # Full buckets hold no state worth keeping
+        for client, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._buckets[client]
+        if len(self._buckets) >= self.max_clients:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._buckets), 'limited': self.limited}
+
+
+class RefreshRuns:
+    """Status of the latest refreshes by id, for clients to poll
+
+    Ids are random, so a poll that reaches another worker process finds
+    nothing rather than that process's refresh.
+    """
+
+    def __init__(self, keep=RUNS_KEPT):
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._runs = OrderedDict()
+
+    def start(self):
+        """Id of a new running refresh"""
+        run_id = uuid.uuid4().hex
+        with self._lock:
+            self._runs[run_id] = {'id': run_id, 'status': 'running', 'version': None, 'error': None,
+                                  'seconds': None, 'started': time.monotonic()}
+            while len(self._runs) > self.keep:
+                self._runs.popitem(last=False)
+        return run_id
+
+    def finish(self, run_id, version=None, error=None):
+        """Record the version a refresh published, or the error it failed with"""
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                return
+            run['status'] = 'failed' if error is not None else 'published'
+            run['version'] = version
+            run['error'] = error
+            run['seconds'] = round(time.monotonic() - run['started'], 3)
+
+    def get(self, run_id):
+        """Status of a refresh, or None if it is unknown or long finished"""
+        with self._lock:
+            run = self._runs.get(run_id)
+            return {key: value for key, value in run.items() if key != 'started'} if run else None
+
+    def latest(self):
+        with self._lock:
+            run_id = next(reversed(self._runs), None)
+        return self.get(run_id) if run_id else None
+
+
+class RefreshTrigger:
+    """Runs at most one refresh at a time in a background thread
+
+    refresh(profile, force) runs the crawl, publishes it and returns the
+    published snapshot version, under the profiler if profile is set, over
+    every feed if force is set and over the due feeds otherwise. Scheduled
+    and manual refreshes both go through trigger(), so two crawls never
+    share the pipeline state or publish out of order. A trigger while a
+    refresh is in flight joins it and gets the same id, except that a forced
+    trigger joining an unforced refresh queues one forced refresh after it.
+    """
+
+    def __init__(self, refresh):
+        self._refresh = refresh
+        self._lock = threading.Lock()
+        self._thread = None
+        self._forced = False  # Whether the in-flight (or last) refresh crawls every feed
+        self.runs = RefreshRuns()
+        self.run_id = None  # Id of the in-flight (or last) refresh
+        self.triggered = 0
+        self.coalesced = 0
+
+    def in_flight(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def trigger(self, profile=False, force=True):
+        """(id of the refresh, whether the trigger joined a refresh already in flight)"""
+        run_id, coalesced, _ = self._trigger(profile, force)
+        return run_id, coalesced
+
+    def run(self, profile=False, force=False):
+        """Trigger a refresh and wait for the one it started or joined; returns that run's status"""
+        run_id, _, thread = self._trigger(profile, force)
+        thread.join()
+        return self.runs.get(run_id)
+
+    def _trigger(self, profile, force):
+        with self._lock:
+            self.triggered += 1
+            in_flight = self.in_flight()
+            if in_flight and (self._forced or not force):
+                self.coalesced += 1
+                return self.run_id, True, self._thread
+            self.run_id = self.runs.start()
+            self._forced = force
+            # A forced trigger that finds an unforced refresh in flight runs after it
+            self._thread = threading.Thread(target=self._run, name='refresh', daemon=True, args=(
+                self.run_id, profile, force, self._thread if in_flight else None))
+            self._thread.start()
+            return self.run_id, False, self._thread
+
+    def _run(self, run_id, profile, force, after):
+        if after is not None:
+            after.join()
+        try:
+            self.runs.finish(run_id, version=self._refresh(profile, force))
+        except Exception as e:
+            logger.error(f"Error in refresh: {e}")
+            self.runs.finish(run_id, error=str(e))
+
+    def status(self, run_id):
+        return self.runs.get(run_id)
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight(),
+            'triggered': self.triggered,
+            'coalesced': self.coalesced,
+            'last': self.runs.latest()
+        }
+
+
+refresh_limiter = RateLimiter()
+
+
+def check_refresh(client, header):
+    """None if the client may trigger a refresh, else (status, body, headers) to reply with"""
+    wait = refresh_limiter.take(client)
+    if wait:
+        return 429, {'error': 'Too many refresh requests'}, {'Retry-After': str(max(1, int(wait + 0.999)))}
+    return check_admin(header)
+
+
+def check_admin(header):
+    """None if an Authorization header grants admin access, else (status, body, headers) to reply with"""
+    if not ADMIN_TOKEN:
+        return 403, {'error': 'Admin access is disabled; set ADMIN_TOKEN'}, {}
+    if not authorized(header):
+        return 401, {'error': 'Unauthorized'}, {'WWW-Authenticate': 'Bearer'}
+    return None
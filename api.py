@@ -2,16 +2,27 @@
 """
 AI News API - Fetches news from RSS feeds and serves them via a Flask API
 """
-import feedparser
-import requests
-from bs4 import BeautifulSoup
-from flask import Flask, jsonify, request, send_from_directory, make_response
+from flask import Flask, jsonify, request, send_from_directory, make_response, redirect, send_file
 from flask_cors import CORS
 from datetime import datetime
-import random
+import threading
 import logging
 import time
 import os
+import admin
+import assets
+from archive import archive, parse_range, MAX_QUERY_ARTICLES
+from feed_health import health_registry
+from image_proxy import image_proxy, ImageFetchError
+import json
+import pipeline
+import profiling
+from pipeline import refresh
+from feed_registry import FeedRegistry
+from changelog import Changelog
+from ranking import rank_views, map_views, page
+from sharding import build_ingestor
+from topics import FacetCache, TOPICS
 from sqlalchemy import create_engine, Column, String, Integer, DateTime, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -28,9 +39,6 @@ class Email(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     submitted_at = Column(DateTime(timezone=True), server_default=func.now())
 
-# Create the table if it doesn't exist
-Base.metadata.create_all(bind=engine)
-
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,9 +46,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Get the directory of this script
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Initialize Flask app
 app = Flask(__name__, static_folder='.', static_url_path='')
 CORS(app)
+# cProfile of requests, only when PROFILE=requests or an admin asks with X-Profile
+profiling.install(app, admin.authorized, bool(admin.ADMIN_TOKEN))
 
 # Add logging middleware for requests
 @app.before_request
@@ -48,422 +61,217 @@ def log_request_info():
     logger.info('Request Headers: %s', request.headers)
     logger.info('Request Method: %s, Path: %s', request.method, request.path)
 
-# List of AI-related RSS feeds
-RSS_FEEDS = [
-    {
-        'url': 'https://techcrunch.com/category/artificial-intelligence/feed/',
-        'name': 'TechCrunch',
-        'website': 'https://techcrunch.com',
-        'logo': 'https://techcrunch.com/wp-content/uploads/2021/01/TechCrunch_logo.png'
-    },
-    {
-        'url': 'https://venturebeat.com/category/ai/feed/',
-        'name': 'VentureBeat',
-        'website': 'https://venturebeat.com',
-        'logo': 'https://venturebeat.com/wp-content/uploads/2018/09/venturebeat-logo-rec.png?w=192'
-    },
-    {
-        'url': 'https://www.wired.com/feed/tag/ai/latest/rss',
-        'name': 'Wired',
-        'website': 'https://www.wired.com',
-        'logo': 'https://www.wired.com/assets/logo-header.png'
-    }
-]
-
-# Fallback images if no image is found in the feed
-FALLBACK_IMAGES = [
-    'https://images.unsplash.com/photo-1677442135046-c10d516d84c6?q=100&w=2000&auto=format&fit=crop',
-    'https://images.unsplash.com/photo-1529107386315-e1a2ed48a620?q=100&w=2000&auto=format&fit=crop',
-    'https://images.unsplash.com/photo-1532187863486-abf9dbad1b69?q=100&w=2000&auto=format&fit=crop',
-    'https://images.unsplash.com/photo-1620712943543-bcc4688e7485?q=100&w=2000&auto=format&fit=crop'
-]
-
+# Feed registry, hot-reloaded from feeds.json
+feed_registry = FeedRegistry()
+# Ingests in this process unless INGEST_WORKERS or INGEST_NODE_COUNT are set
+ingestor = build_ingestor()
 # Cache for articles to reduce repeated parsing
 # Initialize the articles cache with empty values
 articles_cache = {
     'articles': [],
-    'last_updated': None
+    'last_updated': None,
+    'last_attempt': None,  # When the last refresh finished, even if it published nothing
+    'version': 0,  # Bumped every time a new snapshot is published
+    'index': {},  # Article ID -> (article, ETag) for /api/articles/<id>
+    'views': None  # Ranked hero and front page (ranking.RankedViews) of the snapshot
 }
 CACHE_TIMEOUT = 3600  # 1 hour in seconds
+REFRESH_INTERVAL = 1800  # Seconds between background refreshes
+COLD_START_WAIT = 10  # Seconds a request waits for the first snapshot before a 503
+# Last published snapshot, reloaded at boot so a restarted worker serves at once
+CACHE_FILE = os.environ.get('CACHE_FILE', os.path.join(BASE_DIR, 'articles_cache.json'))
+# Guards swaps of the published snapshot
+cache_lock = threading.Lock()
+# Per-version article changes for /api/articles/changes
+changelog = Changelog()
+# Per-topic and per-source article lists of the snapshot for /api/articles?topic=&source=
+facet_cache = FacetCache(lambda article: json.dumps(image_proxy.proxy_articles([article])[0]))
+# Set once a snapshot is loaded or published; /readyz reports ready from then on
+snapshot_ready = threading.Event()
+# Wakes the background fetcher early, e.g. when a request finds the snapshot stale
+refresh_now = threading.Event()
+# Orders snapshot writes from the refresh and image enrichment threads
+save_lock = threading.Lock()
+saved_version = 0
+warm_start = {'loaded': 0, 'age_seconds': None, 'error': None}
 
-def parse_rss_feeds():
-    """Parse multiple RSS feeds and extract article information"""
-    logger.info("Starting to parse RSS feeds...")
-    all_articles = []
-    
-    for feed_source in RSS_FEEDS:
+def install_snapshot(articles, last_updated):
+    """Atomically replace the published snapshot and bump its version; returns (version, views)"""
+    # Rank once per snapshot; hero and front-page requests read the precomputed views
+    views = rank_views(articles, feed_registry.source_weights())
+    articles = views.articles
+    with cache_lock:
+        articles_cache['articles'] = articles
+        articles_cache['views'] = views
+        articles_cache['last_updated'] = last_updated
+        articles_cache['version'] += 1
+        old_index, articles_cache['index'] = articles_cache['index'], pipeline.index_articles(articles)
+        changelog.record(articles_cache['version'], old_index, articles_cache['index'])
+        image_proxy.register(articles)
+        version = articles_cache['version']
+    facet_cache.get(views)
+    if articles:
+        snapshot_ready.set()
+    return version, views
+
+def save_snapshot():
+    """Write the published snapshot to CACHE_FILE, unless a newer one was already written"""
+    global saved_version
+    with save_lock:
+        with cache_lock:
+            version, articles, last_updated = (articles_cache['version'], articles_cache['articles'],
+                                               articles_cache['last_updated'])
+        if version <= saved_version or not articles:
+            return
+        # Same format as pythonanywhereapp.py's cache file; replaced atomically so a booting worker never reads half of it
+        tmp_path = CACHE_FILE + '.tmp'
         try:
-            logger.info(f"Parsing feed: {feed_source['url']}")
-            feed = feedparser.parse(feed_source['url'])
-            
-            for entry in feed.entries[:5]:  # Limit to 5 articles per feed
-                # Extract article details
-                article = {
-                    'id': random.randint(1000, 9999),
-                    'title': entry.get('title', 'Untitled Article'),
-                    'summary': _extract_summary(entry),
-                    'link': entry.get('link', ''),
-                    'published': entry.get('published', datetime.now().isoformat()),
-                    'image': get_article_image(entry),
-                    'source': {
-                        'name': feed_source['name'],
-                        'url': feed_source['website'],
-                        'logo': feed_source['logo']
-                    },
-                    'isHero': False
-                }
-                
-                # Set the first article as hero
-                if len(all_articles) == 0:
-                    article['isHero'] = True
-                
-                all_articles.append(article)
-            
-            logger.info(f"Successfully parsed {len(feed.entries[:5])} articles from {feed_source['name']}")
-            
-        except Exception as e:
-            logger.error(f"Error parsing feed {feed_source['url']}: {e}")
-    
-    logger.info(f"Total articles parsed: {len(all_articles)}")
-    return all_articles
+            with open(tmp_path, 'w') as f:
+                json.dump({'articles': articles, 'timestamp': last_updated.timestamp() if last_updated else None}, f)
+            os.replace(tmp_path, CACHE_FILE)
+            saved_version = version
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Error saving snapshot: {e}")
 
-def _extract_summary(entry):
-    """Extract and clean up article summary"""
-    summary = ""
-    
-    # Try to get summary from different feed formats
-    if hasattr(entry, 'summary'):
-        summary = entry.summary
-    elif hasattr(entry, 'description'):
-        summary = entry.description
-    
-    # Clean up HTML from summary
-    if summary:
-        soup = BeautifulSoup(summary, 'html.parser')
-        summary = soup.get_text().strip()
-        
-        # Limit summary length
-        if len(summary) > 200:
-            summary = summary[:197] + "..."
-    else:
-        summary = "Click to read the full article."
-        
-    return summary
+def load_snapshot():
+    """Publish the snapshot saved by the previous process, if any; returns how many articles it held"""
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            cache_data = json.load(f)
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        warm_start['error'] = str(e)
+        logger.error(f"Error loading snapshot: {e}")
+        return 0
+    articles = cache_data.get('articles') or []
+    timestamp = cache_data.get('timestamp')
+    if not articles:
+        return 0
+    install_snapshot(articles, datetime.fromtimestamp(timestamp) if timestamp else None)
+    warm_start['loaded'] = len(articles)
+    warm_start['age_seconds'] = round(time.time() - timestamp) if timestamp else None
+    logger.info(f"Loaded {len(articles)} articles from {CACHE_FILE}")
+    return len(articles)
 
-def extract_first_paragraph(html_content, max_words=50):
-    """Extract first paragraph from HTML content, limited to max_words"""
-    if not html_content:
-        return ""
-    
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Remove any script or style elements
-    for script in soup(["script", "style"]):
-        script.extract()
-    
-    # Find the first paragraph
-    paragraph = soup.find('p')
-    if paragraph:
-        text = paragraph.get_text().strip()
-    else:
-        # If no paragraph, just get the text
-        text = soup.get_text().strip()
-    
-    # Clean up the text
-    text = clean_text(text)
-    
-    # Split into words and limit to max_words
-    words = text.split()
-    if len(words) > max_words:
-        text = ' '.join(words[:max_words]) + '...'
-    
-    return text
+def publish_articles(articles):
+    """Atomically replace the published snapshot and bump its version"""
+    if not articles and articles_cache['articles']:
+        # e.g. every feed failed right after a restart; keep serving the loaded snapshot
+        logger.warning("No articles parsed from feeds, keeping the current snapshot")
+        return articles_cache['version']
+    version, views = install_snapshot(articles, datetime.now())
+    save_snapshot()
+    archive.append(views.articles)
+    return version
 
-def clean_text(text):
-    """Clean up text by removing unusual characters and fixing encoding issues"""
-    if not text:
-        return ""
-    
-    # Replace common HTML entities and Unicode characters
-    replacements = {
-        '&nbsp;': ' ',
-        '&amp;': '&',
-        '&lt;': '<',
-        '&gt;': '>',
-        '&quot;': '"',
-        '&apos;': "'",
-        '\u2019': "'",  # Right single quotation mark
-        '\u2018': "'",  # Left single quotation mark
-        '\u201c': '"',  # Left double quotation mark
-        '\u201d': '"',  # Right double quotation mark
-        '\u2014': '-',  # Em dash
-        '\u2013': '-',  # En dash
-        '\u00a0': ' ',  # Non-breaking space
-    }
-    
-    for old, new in replacements.items():
-        if old in text:
-            text = text.replace(old, new)
-    
-    # Normalize whitespace
-    import re
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+def patch_images(resolved):
+    """Patch resolved images into the live snapshot in one atomic swap"""
+    with cache_lock:
+        # Copy the articles we patch so readers of the previous snapshot never see a partial update
+        views = map_views(articles_cache['views'], lambda article: dict(
+            article, image=resolved[article['link']]) if article.get('link') in resolved else article)
+        articles_cache['articles'] = views.articles
+        articles_cache['views'] = views
+        articles_cache['version'] += 1
+        old_index, articles_cache['index'] = articles_cache['index'], pipeline.index_articles(articles_cache['articles'])
+        changelog.record(articles_cache['version'], old_index, articles_cache['index'])
+        image_proxy.register(articles_cache['articles'])
+        version = articles_cache['version']
+    facet_cache.get(views)
+    save_snapshot()
+    # Archive the copies with their resolved images; queries return the newest copy
+    archive.append([article for article in views.articles if article.get('link') in resolved], update=True)
+    return version
 
-def is_ai_related(entry, keywords):
-    """Check if entry is related to AI based on keywords"""
-    try:
-        if not keywords:
-            # If no keywords provided, include all articles
-            return True
-            
-        # Convert all content to lowercase for case-insensitive matching
-        title = entry.title.lower() if hasattr(entry, 'title') else ''
-        summary = ''
-        
-        if hasattr(entry, 'summary'):
-            summary = entry.summary.lower()
-        elif hasattr(entry, 'description'):
-            summary = entry.description.lower()
-            
-        # Check if any keyword is in title or summary
-        for keyword in keywords:
-            if keyword.lower() in title or keyword.lower() in summary:
-                return True
-                
-        return False
-    except Exception as e:
-        logger.error(f"Error in is_ai_related: {str(e)}")
-        return False
+def fetch_all_articles(defer_images=True, force=False, profile=False):
+    """Fetch articles from all sources and update the cache
 
-def get_article_image(entry):
-    """Extract image URL from feed entry"""
+    With defer_images (the default) the refresh runs in two phases: articles
+    are published as soon as the feeds are parsed, using in-feed images or
+    deterministic placeholders, and a background thread then resolves the
+    remaining images from the article pages and patches them in. force
+    crawls every feed regardless of its poll interval. The run is profiled
+    with profile, or always with PROFILE=refresh. Returns the published
+    snapshot version.
+    """
     try:
-        # Method 1: Check for media_thumbnail
-        if hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
-            return entry.media_thumbnail[0]['url']
-            
-        # Method 2: Check for media content
-        if hasattr(entry, 'media_content') and entry.media_content:
-            for media in entry.media_content:
-                if media.get('type', '').startswith('image/'):
-                    return media['url']
-                # Some feeds don't specify type but still contain image URLs
-                if 'url' in media and (media['url'].endswith('.jpg') or 
-                                      media['url'].endswith('.jpeg') or 
-                                      media['url'].endswith('.png')):  
-                    return media['url']
-        
-        # Method 3: Check for enclosures
-        if hasattr(entry, 'enclosures') and entry.enclosures:
-            for enclosure in entry.enclosures:
-                if enclosure.get('type', '').startswith('image/'):
-                    return enclosure.get('href', enclosure.get('url', ''))
-        
-        # Method 4: Check for content field
-        if hasattr(entry, 'content') and entry.content:
-            for content in entry.content:
-                if 'value' in content:
-                    soup = BeautifulSoup(content['value'], 'html.parser')
-                    img = soup.find('img')
-                    if img and img.get('src'):
-                        # Avoid small icons and tracking pixels
-                        if not (img.get('width') and int(img['width']) < 50) and not \
-                           (img.get('height') and int(img['height']) < 50):
-                            # Make sure we're not grabbing an icon or tiny image
-                            if not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
-                                return img['src']
-        
-        # Method 5: Parse HTML in summary
-        if hasattr(entry, 'summary'):
-            soup = BeautifulSoup(entry.summary, 'html.parser')
-            imgs = soup.find_all('img')
-            for img in imgs:
-                # Avoid small icons and tracking pixels by checking src and dimensions
-                if img.get('src'):
-                    # Skip probable logos/icons
-                    if not (img.get('width') and int(img['width']) < 50) and not \
-                       (img.get('height') and int(img['height']) < 50):
-                        # Make sure we're not grabbing an icon or tiny image
-                        if not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
-                            return img['src']
-        
-        # Method 6: Fetch the full article to look for images (optimized for performance)
-        try:
-            # Only attempt this for entries where we couldn't find images
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(entry.link, headers=headers, timeout=3)  # 3-second timeout to not slow down the app
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # First look for Open Graph image meta tag (most accurate for article image)
-                og_image = soup.find('meta', property='og:image')
-                if og_image and og_image.get('content'):
-                    return og_image['content']
-                
-                # Then look for Twitter image card
-                twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
-                if twitter_image and twitter_image.get('content'):
-                    return twitter_image['content']
-                
-                # Finally look for article-specific images
-                article_tag = soup.find('article') or soup.find('main') or soup
-                imgs = article_tag.find_all('img')
-                for img in imgs:
-                    if img.get('src') and not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
-                        if img.get('width') and int(img['width']) >= 200 or img.get('height') and int(img['height']) >= 200:
-                            # Found a reasonably sized image
-                            src = img['src']
-                            # Fix relative URLs
-                            if src.startswith('//'):
-                                src = 'https:' + src
-                            elif src.startswith('/'):
-                                # Extract domain from entry link
-                                from urllib.parse import urlparse
-                                domain = '{uri.scheme}://{uri.netloc}'.format(uri=urlparse(entry.link))
-                                src = domain + src
-                            return src
-        except Exception as e:
-            logger.info(f"Couldn't extract image from article content: {e}")
-        
-        # If all else fails, fallback to random image
-        fallback = random.choice(FALLBACK_IMAGES)
-        logger.info(f"Using fallback image for {entry.get('title', 'Unknown title')}: {fallback}")
-        return fallback
-    except Exception as e:
-        logger.error(f"Error extracting image: {e}")
-        return random.choice(FALLBACK_IMAGES)
-    
-    # Check summary/description
-    summary = entry.get('summary', '').lower()
-    for keyword in keywords:
-        if keyword.lower() in summary:
-            return True
-    
-    # Check categories/tags
-    if 'tags' in entry:
-        for tag in entry.tags:
-            tag_name = tag.get('term', '').lower()
-            for keyword in keywords:
-                if keyword.lower() in tag_name:
-                    return True
-    
-    return False
-
-# Define fallback images to use when no image is found
-FALLBACK_IMAGES = [
-    "https://images.unsplash.com/photo-1677442135046-c10d516d84c6?q=100&w=2000&auto=format&fit=crop",
-    "https://images.unsplash.com/photo-1620712943543-bcc4688e7485?q=100&w=2000&auto=format&fit=crop",
-    "https://images.unsplash.com/photo-1529107386315-e1a2ed48a620?q=100&w=2000&auto=format&fit=crop",
-    "https://images.unsplash.com/photo-1532187863486-abf9dbad1b69?q=100&w=2000&auto=format&fit=crop",
-    "https://images.unsplash.com/photo-1526304640581-d334cdbbf45e?q=100&w=2000&auto=format&fit=crop",
-    "https://images.unsplash.com/photo-1616469829581-73993eb86b02?q=100&w=2000&auto=format&fit=crop",
-    "https://images.unsplash.com/photo-1557838429-06a189a5cb26?q=100&w=2000&auto=format&fit=crop",
-]
-
-def fetch_article_from_source(source, max_articles=5):
-    """Fetch and parse RSS feed from a given source"""
-    try:
-        feed = feedparser.parse(source['url'])
-        articles = []
-        
-        count = 0
-        for entry in feed.entries:
-            # Only process if AI-related or if this source has AI-specific feed
-            ai_keywords = ['ai', 'artificial intelligence', 'machine learning', 'deep learning', 'neural network', 'gpt', 'llm']
-            if 'ai' in source['url'].lower() or is_ai_related(entry, ai_keywords):
-                # Try to get the published date
-                published = entry.get('published_parsed')
-                if published:
-                    published_date = datetime(*published[:6]).isoformat()
-                else:
-                    published_date = datetime.now().isoformat()
-                
-                # Extract summary
-                if 'summary' in entry:
-                    summary = extract_first_paragraph(entry.summary, 50)
-                elif 'description' in entry:
-                    summary = extract_first_paragraph(entry.description, 50)
-                else:
-                    summary = "Read the full article for more information."
-                    
-                # Clean the title to remove any artifacts
-                title = clean_text(entry.title)
-                
-                # Get image URL or use a fallback image
-                try:
-                    image_url = get_article_image(entry)
-                except Exception as e:
-                    logger.error(f"Error getting image: {str(e)}")
-                    image_url = random.choice(FALLBACK_IMAGES)
-                
-                # Create article object
-                article = {
-                    'id': hash(entry.link) % 100000,  # Generate a simple hash as ID
-                    'title': entry.title,  # We'll clean the title directly in the code
-                    'summary': summary,
-                    'link': entry.link,
-                    'published': published_date,
-                    'image': image_url,
-                    'source': {
-                        'name': source['name'],
-                        'website': source.get('website', ''),
-                        'logo': source.get('logo', '')
-                    }
-                }
-                
-                articles.append(article)
-                count += 1
-                
-                if count >= max_articles:
-                    break
-                    
-        return articles
-    except Exception as e:
-        logger.error(f"Error fetching from {source['name']}: {str(e)}")
-        return []
+        return profiling.profile_refresh('fetch_all_articles', lambda: refresh(
+            feed_registry.feeds(), publish_articles, patch_images, defer_images=defer_images, ingestor=ingestor,
+            force=force), force=profile)
+    finally:
+        # An empty or failed refresh keeps the old snapshot; without this it would stay stale and
+        # every request would wake the fetcher again at once
+        articles_cache['last_attempt'] = datetime.now()
 
-def fetch_all_articles():
-    """Fetch articles from all sources and update the cache"""
-    all_articles = []
-    
-    for source in RSS_FEEDS:
-        articles = fetch_article_from_source(source)
-        all_articles.extend(articles)
-    
-    # Sort by published date (newest first)
-    all_articles.sort(key=lambda x: x.get('published', ''), reverse=True)
-    
-    # Designate the newest article as the hero
-    if all_articles:
-        all_articles[0]['isHero'] = True
-    
-    # Update cache
-    articles_cache['articles'] = all_articles
-    articles_cache['last_updated'] = datetime.now()
-    
-    logger.info(f"Fetched {len(all_articles)} articles from {len(RSS_FEEDS)} sources")
-    return all_articles
+# Scheduled and manual refreshes run one at a time in the background; see POST /api/admin/refresh
+refresh_trigger = admin.RefreshTrigger(lambda profile, force: fetch_all_articles(force=force, profile=profile))
 
 def background_fetcher():
     """Background thread to update the article cache periodically"""
     while True:
-        try:
-            fetch_all_articles()
-            # Update every 30 minutes
-            time.sleep(1800)
-        except Exception as e:
-            logger.error(f"Error in background fetcher: {str(e)}")
+        refresh_now.clear()
+        # Joins a manual refresh in flight rather than crawling alongside it
+        run = refresh_trigger.run()
+        if run and run['status'] == 'failed':
+            logger.error(f"Error in background fetcher: {run['error']}")
             # If there's an error, try again in 5 minutes
             time.sleep(300)
+            continue
+        # Update every 30 minutes, or sooner when a request finds the snapshot stale
+        refresh_now.wait(REFRESH_INTERVAL)
+
+def start_background_fetcher():
+    """Refresh from a daemon thread, so the process serves its loaded snapshot (or /readyz says not ready) at once"""
+    thread = threading.Thread(target=background_fetcher, name='background-fetcher', daemon=True)
+    thread.start()
+    return thread
+
+def is_stale():
+    """True if neither a published snapshot nor a refresh attempt is within REFRESH_INTERVAL"""
+    checked = max(filter(None, (articles_cache['last_updated'], articles_cache['last_attempt'])), default=None)
+    return checked is None or (datetime.now() - checked).total_seconds() > REFRESH_INTERVAL
+
+def current_views():
+    """Ranked views of the snapshot, or None if none arrived within COLD_START_WAIT
+
+    Requests never crawl: a stale snapshot wakes the background fetcher and
+    is served meanwhile.
+    """
+    if is_stale():
+        refresh_now.set()
+    if not snapshot_ready.wait(COLD_START_WAIT):
+        return None
+    return articles_cache['views']
+
+def not_ready():
+    response = jsonify({'error': 'Articles are still loading'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
 
 @app.route('/')
 def index():
     """Serve the main page"""
-    return app.send_static_file('index.html')
+    return send_asset('index.html') or app.send_static_file('index.html')
+
+def send_asset(name):
+    """Send a built asset, picking the best precompressed variant the client accepts"""
+    asset = assets.resolve(name, request.headers.get('Accept-Encoding'))
+    if asset is None:
+        return None
+    path, content_type, encoding, cache_control = asset
+    response = send_file(path, mimetype=content_type, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.route('/assets/<path:name>')
+def fingerprinted_asset(name):
+    """Serve a minified, content-hashed asset with immutable caching"""
+    return send_asset('assets/' + name) or (jsonify({'error': 'Not found'}), 404)
 
 @app.route('/test')
 def test_endpoint():
@@ -530,45 +338,230 @@ def api_summary():
 
 @app.route('/api/articles')
 def api_articles():
-    """API endpoint to get articles"""
-    # Check if cache needs refreshing (older than 30 minutes or empty)
-    if (articles_cache['last_updated'] is None or 
-        (datetime.now() - articles_cache['last_updated']).seconds > 1800 or
-        not articles_cache['articles']):
-        fetch_all_articles()
+    """API endpoint to get articles, optionally only those of one topic and/or source"""
+    views = current_views()
+    if views is None:
+        return not_ready()
     
     # Get optional limit parameter
     limit = request.args.get('limit', default=10, type=int)
+    topic = request.args.get('topic')
+    source = request.args.get('source')
     
-    # Return cached articles with limit
+    if topic or source:
+        if topic and topic not in TOPICS:
+            return jsonify({'error': f"Unknown topic: {topic}", 'topics': list(TOPICS)}), 400
+        # Served from the lists prebuilt for this snapshot
+        body = facet_cache.get(views).page_json(
+            topic, source, limit,
+            lastUpdated=articles_cache['last_updated'].isoformat() if articles_cache['last_updated'] else None,
+            version=articles_cache['version'], epoch=changelog.epoch)
+        return app.response_class(body, mimetype='application/json')
+    
+    # Return the best ranked articles with limit
     return jsonify({
-        'articles': articles_cache['articles'][:limit],
+        'articles': image_proxy.proxy_articles(page(views, limit)),
         'total': len(articles_cache['articles']),
-        'lastUpdated': articles_cache['last_updated'].isoformat() if articles_cache['last_updated'] else None
+        'lastUpdated': articles_cache['last_updated'].isoformat() if articles_cache['last_updated'] else None,
+        'version': articles_cache['version'],
+        'epoch': changelog.epoch
+    })
+
+@app.route('/api/archive')
+def api_archive():
+    """Archived articles published in a date range, optionally from one source
+
+    from/to are UTC dates or ISO timestamps; the range defaults to the last 7 days.
+    """
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = min(request.args.get('limit', default=100, type=int), MAX_QUERY_ARTICLES)
+    articles, total = archive.query(start, end, request.args.get('source'), limit)
+    return jsonify({
+        'articles': articles,
+        'total': total
     })
 
+@app.route('/api/articles/changes')
+def api_article_changes():
+    """Articles added, updated or removed since the client's snapshot version
+
+    Returns the new version with the current copy of every added or updated
+    article, the IDs of removed ones and the IDs of the first `limit`
+    articles in rank order (as /api/articles lists them), or reset=true when
+    the client must reload /api/articles.
+    """
+    since = request.args.get('since', default=0, type=int)
+    limit = request.args.get('limit', default=10, type=int)
+    with cache_lock:
+        version, index, views = articles_cache['version'], articles_cache['index'], articles_cache['views']
+    delta = changelog.since(since, version, index, request.args.get('epoch'))
+    if delta is None:
+        return jsonify({'version': version, 'epoch': changelog.epoch, 'reset': True})
+    upserted, removed = delta
+    return jsonify({
+        'version': version,
+        'epoch': changelog.epoch,
+        'reset': False,
+        'upserted': image_proxy.proxy_articles(upserted),
+        'removed': removed,
+        'order': [article['id'] for article in page(views, limit)] if views is not None else []
+    })
+
+@app.route('/api/articles/<article_id>')
+def api_article(article_id):
+    """A single article by its stable ID, revalidated with its own ETag"""
+    entry = articles_cache['index'].get(article_id)
+    if entry is None:
+        return jsonify({'error': 'Article not found'}), 404
+    article, etag = entry
+    if request.headers.get('If-None-Match') == etag:
+        response = make_response('', 304)
+    else:
+        response = jsonify({
+            'article': image_proxy.proxy_articles([article])[0],
+            'version': articles_cache['version']
+        })
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/hero')
 def get_hero_article():
     """API endpoint to get only the hero article"""
-    # Check if cache needs refreshing
-    if (articles_cache['last_updated'] is None or 
-        (datetime.now() - articles_cache['last_updated']).seconds > 1800 or
-        not articles_cache['articles']):
-        fetch_all_articles()
+    views = current_views()
+    if views is None:
+        return not_ready()
     
-    # Find hero article
-    hero = next((article for article in articles_cache['articles'] if article.get('isHero')), None)
-    
-    if not hero and articles_cache['articles']:
-        # If no hero is designated but we have articles, use the first one
-        hero = articles_cache['articles'][0]
-        hero['isHero'] = True
+    # The hero was ranked when the snapshot was published
+    hero = views.hero
     
     return jsonify({
-        'article': hero,
+        'article': image_proxy.proxy_articles([hero])[0],
+        'lastUpdated': articles_cache['last_updated'].isoformat() if articles_cache['last_updated'] else None,
+        'version': articles_cache['version']
+    })
+
+@app.route('/api/admin/refresh', methods=['POST'])
+def admin_refresh():
+    """Start a full refresh in the background (admin token required, rate limited per client)
+
+    Returns 202 with the id of the refresh; poll /api/admin/refresh/<id>
+    until it reports the version it published. Triggers while a full refresh
+    is in flight join it; one that finds a refresh of only the due feeds in
+    flight queues a full refresh after it. With profile=1 the refresh is profiled and the
+    profile shows up in /api/admin/profiles.
+    """
+    rejected = admin.check_refresh(request.remote_addr, request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    profile = request.args.get('profile') == '1'
+    run_id, coalesced = refresh_trigger.trigger(profile)
+    return jsonify({
+        'id': run_id,
+        'status': f"/api/admin/refresh/{run_id}",
+        'currentVersion': articles_cache['version'],
+        'coalesced': coalesced,
+        'profiled': profile and not coalesced
+    }), 202
+
+@app.route('/api/admin/refresh/<run_id>')
+def admin_refresh_status(run_id):
+    """Status of a manual refresh: running, published (with its version) or failed (admin token required)"""
+    rejected = admin.check_admin(request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    run = refresh_trigger.status(run_id)
+    if run is None:
+        return jsonify({'error': 'Unknown refresh'}), 404
+    return jsonify(run)
+
+@app.route('/api/admin/profiles')
+def admin_profiles():
+    """Saved request and refresh profiles, newest first (admin token required)"""
+    rejected = admin.check_admin(request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    return jsonify({'profiles': profiling.list_profiles()})
+
+@app.route('/api/admin/profiles/<name>')
+def admin_profile(name):
+    """Download a saved profile (admin token required)"""
+    rejected = admin.check_admin(request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    path = profiling.find_profile(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: 200 once a snapshot is loaded from disk or published, 503 until then"""
+    if not snapshot_ready.is_set():
+        response = jsonify({'status': 'starting'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+    return jsonify({
+        'status': 'ready',
+        'version': articles_cache['version'],
+        'articles_count': len(articles_cache['articles']),
         'lastUpdated': articles_cache['last_updated'].isoformat() if articles_cache['last_updated'] else None
     })
 
+@app.route('/debug')
+def debug_info():
+    """Debug endpoint to check app status and upstream health"""
+    return jsonify({
+        'status': 'running',
+        'ready': snapshot_ready.is_set(),
+        'warm_start': warm_start,
+        'articles_count': len(articles_cache['articles']),
+        'version': articles_cache['version'],
+        'cache_updated': articles_cache['last_updated'].isoformat() if articles_cache['last_updated'] else None,
+        'feeds': feed_registry.feeds(),
+        'upstream_health': health_registry.snapshot(),
+        'pipeline': pipeline.last_stats,
+        'image_proxy': image_proxy.stats(),
+        'changelog': changelog.stats(),
+        'archive': archive.stats(),
+        'manual_refresh': dict(refresh_trigger.stats(), rate_limit=admin.refresh_limiter.stats())
+    })
+
+@app.route('/img/<article_id>')
+def proxied_image(article_id):
+    """Serve a resized variant of an article's image from the local image cache"""
+    try:
+        image = image_proxy.get(article_id, request.args.get('w', type=int), request.args.get('v'))
+    except ImageFetchError as e:
+        logger.warning(str(e))
+        # Let the browser try the publisher directly
+        response = redirect(image_proxy.source(article_id))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if image is None:
+        return jsonify({'error': 'Unknown image'}), 404
+    if request.headers.get('If-None-Match') == image.etag:
+        response = make_response('', 304)
+    else:
+        response = make_response(image.body)
+        response.headers['Content-Type'] = image.content_type
+    response.headers['ETag'] = image.etag
+    response.headers['Cache-Control'] = image.cache_control
+    return response
+
 @app.route('/api/submit-email', methods=['POST'])
 def submit_email():
     data = request.get_json()
@@ -607,13 +600,45 @@ def view_emails():
     finally:
         session.close()
 
+init_lock = threading.Lock()
+initialized = False
+
+def init():
+    """Start the process: assets, archive compactor, warm snapshot, background fetcher and database table
+
+    Runs once per process. It is not run at import, so ingestion worker
+    processes (which re-import the main module) and tests stay free of side
+    effects; wsgi.py and __main__ call it, and the first request does if
+    neither did.
+    """
+    global initialized
+    with init_lock:
+        if initialized:
+            return
+        # Minified, fingerprinted and precompressed copies of the page assets
+        assets.build_or_none()
+        # Articles that dropped out of the snapshot stay queryable through /api/archive
+        archive.start_compactor()
+        # Serve the last snapshot right away and refresh it in the background
+        load_snapshot()
+        start_background_fetcher()
+        initialized = True
+        # Last, so an unreachable database only affects the email routes
+        try:
+            # Create the table if it doesn't exist
+            Base.metadata.create_all(bind=engine)
+        except Exception as e:
+            logger.error(f"Error creating database tables: {e}")
+
+@app.before_request
+def ensure_initialized():
+    if not initialized:
+        init()
+
 if __name__ == '__main__':
+    init()
     # Set the port, use 5001 if not specified
     port = int(os.environ.get('PORT', 5001))
-    
-    # Initial fetch of articles
-    CACHED_ARTICLES = parse_rss_feeds()
-    LAST_UPDATED = time.time()
-    
+
     logger.info(f"Starting API server on port {port}")
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Append-only archive of every published article, partitioned by day
+
+Stories drop out of the snapshot once newer ones push them past their feed's
+limit; the archive keeps them queryable by date range and source:
+- One segment per UTC publication day (ARCHIVE_DIR/<day>.jsonl.gz), written
+  as independent gzip members, so the file is plain gzipped JSONL and any
+  block can be decompressed on its own
+- A fixed-width index per segment (<day>.idx) with the publication time, ID
+  digest, source hash and block position of every record; queries mmap it
+  and read only the blocks holding matching records
+- Segments older than COMPACT_AFTER_DAYS are compacted in the background
+  into time-ordered blocks of BLOCK_ARTICLES, dropping superseded copies
+"""
+import gzip
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; locking is then per process only
+    fcntl = None
+
+from records import EPOCH, NO_TIME, encode_time, parse_digest
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(BASE_DIR, 'archive'))
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE', '1') != '0'
+
+BLOCK_ARTICLES = 256  # Records per block when a segment is compacted
+COMPACT_AFTER_DAYS = 2  # Segments this old no longer receive regular appends
+COMPACT_INTERVAL = 6 * 3600  # Seconds between compaction passes
+DEFAULT_QUERY_DAYS = 7
+MAX_QUERY_DAYS = 31
+MAX_QUERY_ARTICLES = 1000
+DAY_MICROS = 86400 * 1000000
+
+# published (microseconds since the epoch), ID digest, source hash, block offset, block length
+INDEX_ENTRY = struct.Struct('<qQIQI')
+
+
+def day_of(timestamp):
+    """UTC day ('YYYY-MM-DD') of a timestamp in microseconds"""
+    return (EPOCH + timedelta(microseconds=timestamp)).strftime('%Y-%m-%d')
+
+
+def day_start(day):
+    return encode_time(day + 'T00:00:00')
+
+
+def source_hash(name):
+    return zlib.crc32((name or '').strip().lower().encode('utf-8'))
+
+
+def parse_bound(value, end=False):
+    """Microseconds of a 'from'/'to' query value (a date or an ISO timestamp), or None
+
+    A bare date as the end of a range includes that whole day.
+    """
+    timestamp = encode_time(value)
+    if timestamp == NO_TIME:
+        return None
+    if end and len(value) == 10:
+        timestamp += DAY_MICROS - 1
+    return timestamp
+
+
+def parse_range(start_value=None, end_value=None):
+    """(start, end) in microseconds for /api/archive's from/to, raising ValueError on bad input
+
+    The range defaults to the last DEFAULT_QUERY_DAYS days and may span at most MAX_QUERY_DAYS.
+    """
+    end = parse_bound(end_value, end=True) if end_value else encode_time(datetime.now(timezone.utc).isoformat())
+    if end is None:
+        raise ValueError(f"Invalid 'to': {end_value}")
+    start = parse_bound(start_value) if start_value else end - DEFAULT_QUERY_DAYS * DAY_MICROS
+    if start is None:
+        raise ValueError(f"Invalid 'from': {start_value}")
+    if start > end:
+        raise ValueError("'from' is after 'to'")
+    if end - start > MAX_QUERY_DAYS * DAY_MICROS:
+        raise ValueError(f"Ranges are limited to {MAX_QUERY_DAYS} days")
+    return start, end
+
+
+class Archive:
+    """Daily gzipped JSONL segments with memory-mapped indexes
+
+    Writers take an exclusive lock on ARCHIVE_DIR/.lock and readers a shared
+    one while opening a segment, so several worker processes can share a
+    directory with compaction swapping files underneath them.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR, enabled=ARCHIVE_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        self._lock = threading.RLock()
+        self._archived = None  # ID digests already written, loaded from the indexes on first use
+        self._compactor = None
+        self.appended = 0
+        self.queries = 0
+        self.blocks_read = 0
+        self.bytes_read = 0
+        self.compactions = 0
+
+    def _paths(self, day):
+        return os.path.join(self.directory, f"{day}.jsonl.gz"), os.path.join(self.directory, f"{day}.idx")
+
+    def days(self):
+        """Days with a segment, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.idx')] for name in names if name.endswith('.idx'))
+
+    @contextmanager
+    def _locked(self, shared=False):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _entries(index_file):
+        """Index entries of an open index file, read through an mmap"""
+        size = os.fstat(index_file.fileno()).st_size
+        size -= size % INDEX_ENTRY.size  # Ignore a partially written last entry
+        if not size:
+            return []
+        with mmap.mmap(index_file.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            return list(INDEX_ENTRY.iter_unpack(mapped))
+
+    def _archived_ids(self):
+        if self._archived is None:
+            archived = set()
+            for day in self.days():
+                with open(self._paths(day)[1], 'rb') as index_file:
+                    archived.update(entry[1] for entry in self._entries(index_file))
+            self._archived = archived
+        return self._archived
+
+    @staticmethod
+    def _write_block(segment_path, index_path, records):
+        """Append one gzip member holding records [(timestamp, digest, article)] and index it"""
+        lines = ''.join(json.dumps(article, separators=(',', ':')) + '\n' for _, _, article in records)
+        block = gzip.compress(lines.encode('utf-8'), mtime=0)
+        with open(segment_path, 'ab') as segment:
+            offset = segment.seek(0, os.SEEK_END)
+            segment.write(block)
+        # The index is written last, so it never points past the end of the segment
+        with open(index_path, 'ab') as index_file:
+            index_file.write(b''.join(
+                INDEX_ENTRY.pack(timestamp, digest, source_hash(article.get('source', {}).get('name')), offset,
+                                 len(block))
+                for timestamp, digest, article in records))
+
+    def append(self, articles, update=False):
+        """Archive the articles not archived yet; returns how many were written
+
+        With update=True every given article is written again (e.g. once its
+        image is resolved) and queries return the newest copy. Articles
+        without a link-digest ID, like the sample data, are never archived.
+        """
+        if not self.enabled:
+            return 0
+        try:
+            written = self._append(articles, update)
+        except (OSError, ValueError) as e:
+            # Never let the archive get in the way of publishing
+            logger.error(f"Error archiving articles: {e}")
+            return 0
+        self.appended += written
+        return written
+
+    def _append(self, articles, update):
+        now = encode_time(datetime.now(timezone.utc).isoformat())
+        with self._locked():
+            archived = self._archived_ids()
+            by_day = {}
+            for article in articles:
+                digest = parse_digest(article.get('id'))
+                if digest is None or (digest in archived and not update):
+                    continue
+                timestamp = encode_time(article.get('published'))
+                if timestamp == NO_TIME:
+                    timestamp = now
+                by_day.setdefault(day_of(timestamp), []).append((timestamp, digest, dict(article, isHero=False)))
+            for day, records in by_day.items():
+                self._write_block(*self._paths(day), records)
+                archived.update(digest for _, digest, _ in records)
+        return sum(len(records) for records in by_day.values())
+
+    def _read_day(self, day, start, end, wanted_source):
+        """Matching articles of one segment, reading only the blocks that hold them"""
+        segment_path, index_path = self._paths(day)
+        with self._locked(shared=True):
+            try:
+                segment = open(segment_path, 'rb')
+            except FileNotFoundError:
+                return []
+            try:
+                index_file = open(index_path, 'rb')
+            except FileNotFoundError:
+                segment.close()
+                return []
+        # Open files keep the segment readable even if compaction replaces it now
+        with segment, index_file:
+            blocks = {}
+            for timestamp, _, source, offset, length in self._entries(index_file):
+                if start <= timestamp <= end and (wanted_source is None or source == wanted_source):
+                    blocks[offset] = length
+            articles = []
+            for offset in sorted(blocks):
+                segment.seek(offset)
+                block = segment.read(blocks[offset])
+                self.blocks_read += 1
+                self.bytes_read += len(block)
+                for line in gzip.decompress(block).splitlines():
+                    articles.append(json.loads(line))
+        return articles
+
+    def query(self, start, end, source=None, limit=100):
+        """(articles newest first, number matched) published between start and end (microseconds)"""
+        self.queries += 1
+        wanted_source = source_hash(source) if source else None
+        days = [day for day in self.days() if day_start(day) <= end and day_start(day) + DAY_MICROS > start]
+        # Later copies of an article replace earlier ones
+        latest = {}
+        for day in days:
+            for article in self._read_day(day, start, end, wanted_source):
+                timestamp = encode_time(article.get('published'))
+                if source and (article.get('source') or {}).get('name', '').strip().lower() != source.strip().lower():
+                    continue  # Source hash collision
+                if timestamp != NO_TIME and not start <= timestamp <= end:
+                    continue
+                latest[article['id']] = article
+        ordered = sorted(latest.values(), key=lambda article: article.get('published', ''), reverse=True)
+        return ordered[:max(limit, 0)], len(ordered)
+
+    def needs_compaction(self, day, today=None):
+        today = today or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        if day_start(today) - day_start(day) < COMPACT_AFTER_DAYS * DAY_MICROS:
+            return False
+        with open(self._paths(day)[1], 'rb') as index_file:
+            entries = self._entries(index_file)
+        blocks = {entry[3] for entry in entries}
+        digests = {entry[1] for entry in entries}
+        return len(digests) < len(entries) or len(blocks) > math.ceil(len(entries) / BLOCK_ARTICLES)
+
+    def compact(self, day):
+        """Rewrite a segment as time-ordered blocks, keeping only the newest copy of each article"""
+        segment_path, index_path = self._paths(day)
+        with self._locked():
+            with open(segment_path, 'rb') as segment:
+                # gzip reads every member of the segment in sequence
+                lines = gzip.decompress(segment.read()).splitlines()
+            latest = {}
+            for line in lines:
+                article = json.loads(line)
+                latest[article['id']] = article
+            records = sorted(((encode_time(article.get('published')), parse_digest(article['id']), article)
+                              for article in latest.values()), key=lambda record: record[0])
+
+            tmp_segment, tmp_index = segment_path + '.tmp', index_path + '.tmp'
+            for path in (tmp_segment, tmp_index):
+                if os.path.exists(path):
+                    os.remove(path)
+            for position in range(0, len(records), BLOCK_ARTICLES):
+                self._write_block(tmp_segment, tmp_index, records[position:position + BLOCK_ARTICLES])
+            os.replace(tmp_segment, segment_path)
+            os.replace(tmp_index, index_path)
+        self.compactions += 1
+        logger.info(f"Compacted archive segment {day}: {len(lines)} records into {len(records)}")
+
+    def compact_all(self):
+        for day in self.days():
+            try:
+                if self.needs_compaction(day):
+                    self.compact(day)
+            except Exception as e:
+                logger.error(f"Error compacting archive segment {day}: {e}")
+
+    def start_compactor(self, interval=COMPACT_INTERVAL):
+        """Compact old segments from a daemon thread (once per process)"""
+        if not self.enabled or (self._compactor is not None and self._compactor.is_alive()):
+            return
+
+        def loop():
+            while True:
+                self.compact_all()
+                time.sleep(interval)
+
+        self._compactor = threading.Thread(target=loop, name='archive-compactor', daemon=True)
+        self._compactor.start()
+
+    def stats(self):
+        days = self.days()
+        size = 0
+        for day in days:
+            for path in self._paths(day):
+                try:
+                    size += os.path.getsize(path)
+                except OSError:
+                    pass
+        return {
+            'enabled': self.enabled,
+            'segments': len(days),
+            'oldest': days[0] if days else None,
+            'newest': days[-1] if days else None,
+            'bytes': size,
+            'appended': self.appended,
+            'queries': self.queries,
+            'blocks_read': self.blocks_read,
+            'bytes_read': self.bytes_read,
+            'compactions': self.compactions
+        }
+
+
+archive = Archive()
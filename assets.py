@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Fingerprinted, precompressed static assets
+
+At startup (or with `python assets.py`) the stylesheets and script used by
+index.html are minified and written to ASSET_BUILD_DIR under content-hashed
+names, together with gzip and brotli variants. index.html is rewritten to
+reference the hashed names, so the assets themselves can be cached forever
+and only index.html is revalidated.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip variants are always built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_BUILD_DIR = os.environ.get('ASSET_BUILD_DIR', os.path.join(BASE_DIR, 'dist'))
+ASSET_PREFIX = 'assets/'  # URL path the hashed assets are served under
+
+# Assets referenced by index.html
+ASSETS = ['styles.css', 'fix.css', 'script.js']
+INDEX = 'index.html'
+
+CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+    '.html': 'text/html'
+}  # Flask adds the utf-8 charset to text types
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+INDEX_CACHE_CONTROL = 'no-cache'  # Always revalidated; unchanged builds answer with a 304
+
+# Preferred first when the client accepts several
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+CSS_SPACE_RE = re.compile(r'\s*([{};,])\s*')
+CSS_COLON_RE = re.compile(r':\s+')
+HTML_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.S)
+JS_BLOCK_COMMENT_RE = re.compile(r'^\s*/\*.*?\*/\s*$', re.S | re.M)
+
+_build_lock = threading.Lock()
+manifest = {}  # Source name -> hashed name of the current build
+
+
+def minify_css(text):
+    """Drop comments and the whitespace around punctuation"""
+    text = CSS_COMMENT_RE.sub('', text)
+    text = CSS_SPACE_RE.sub(r'\1', text)
+    text = CSS_COLON_RE.sub(':', text)
+    return ' '.join(text.split()).replace(';}', '}')
+
+
+def minify_js(text):
+    """Conservative line-based minification that never touches string contents
+
+    Removes comment-only lines and indentation, and trailing // comments on
+    lines that contain no quotes or slashes before them.
+    """
+    text = JS_BLOCK_COMMENT_RE.sub('', text)
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+        code, sep, _ = line.partition(' //')
+        if sep and not any(char in code for char in '\'"`/'):
+            line = code.rstrip()
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def minify_html(text):
+    """Drop comments, indentation and blank lines"""
+    text = HTML_COMMENT_RE.sub('', text)
+    return '\n'.join(line.strip() for line in text.splitlines() if line.strip()) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js, '.html': minify_html}
+
+
+def _write(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _write_variants(path, data):
+    """Write data with its gzip and (if available) brotli variants"""
+    _write(path, data)
+    # mtime=0 keeps the gzip bytes identical across builds
+    _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write(path + '.br', brotli.compress(data, quality=11))
+
+
+def build(source_dir=BASE_DIR, build_dir=ASSET_BUILD_DIR):
+    """Minify, fingerprint and precompress the assets; returns the manifest"""
+    with _build_lock:
+        assets_dir = os.path.join(build_dir, ASSET_PREFIX)
+        os.makedirs(assets_dir, exist_ok=True)
+        built = {}
+        for name in ASSETS:
+            path = os.path.join(source_dir, name)
+            if not os.path.exists(path):
+                continue
+            stem, ext = os.path.splitext(name)
+            with open(path, 'r', encoding='utf-8') as f:
+                data = MINIFIERS[ext](f.read()).encode('utf-8')
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+            if not os.path.exists(os.path.join(assets_dir, hashed)):
+                _write_variants(os.path.join(assets_dir, hashed), data)
+            built[name] = ASSET_PREFIX + hashed
+
+        with open(os.path.join(source_dir, INDEX), 'r', encoding='utf-8') as f:
+            index = f.read()
+        for name, hashed in built.items():
+            index = re.sub(r'''((?:href|src)=["'])%s(["'])''' % re.escape(name), r'\g<1>/%s\g<2>' % hashed, index)
+        _write_variants(os.path.join(build_dir, INDEX), minify_html(index).encode('utf-8'))
+
+        # Assets of earlier builds are kept for clients still holding an older index.html
+        _write(os.path.join(build_dir, 'manifest.json'), json.dumps(built, indent=2).encode('utf-8'))
+        manifest.clear()
+        manifest.update(built)
+        logger.info(f"Built {len(built)} fingerprinted assets in {build_dir}")
+        return dict(built)
+
+
+def build_or_none(source_dir=BASE_DIR, build_dir=ASSET_BUILD_DIR):
+    """Build at startup; on failure the apps keep serving the raw files"""
+    try:
+        return build(source_dir, build_dir)
+    except Exception as e:
+        logger.error(f"Error building static assets: {e}")
+        return None
+
+
+def accepted_encodings(header):
+    """Content codings accepted by an Accept-Encoding header (q=0 excluded)"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def resolve(name, accept_encoding=None, build_dir=ASSET_BUILD_DIR):
+    """Pick the built file to send for name ('index.html' or 'assets/<hashed>')
+
+    Returns (path, content_type, content_encoding, cache_control), or None if
+    the file was not built. content_encoding is None for the identity variant.
+    """
+    if name != INDEX and not name.startswith(ASSET_PREFIX):
+        return None
+    build_dir = os.path.abspath(build_dir)
+    path = os.path.normpath(os.path.join(build_dir, name))
+    if not path.startswith(build_dir + os.sep) or not os.path.isfile(path):
+        return None
+    content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+    cache_control = INDEX_CACHE_CONTROL if name == INDEX else IMMUTABLE_CACHE_CONTROL
+    accepted = accepted_encodings(accept_encoding)
+    for coding, suffix in ENCODINGS:
+        if (coding in accepted or '*' in accepted) and os.path.isfile(path + suffix):
+            return path + suffix, content_type, coding, cache_control
+    return path, content_type, None, cache_control
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(build(), indent=2))
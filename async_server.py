@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+asyncio serving mode for NexusAI News Hub
+
+Serves the routes of pythonanywhereapp.py from a single aiohttp event loop,
+sharing its snapshot, feed registry and cache file:
+- Feeds and article pages are downloaded with aiohttp through the upstream
+  health registry, so a refresh never holds a request thread
+- Feed parsing, the rest of the pipeline and article page HTML parsing run
+  in a thread pool off the event loop
+- /api/events streams every new snapshot version to Server-Sent Events clients
+
+Usage:
+    python async_server.py [port]
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+import admin
+import assets
+from archive import archive, parse_range, MAX_QUERY_ARTICLES
+import pipeline
+import profiling
+import pythonanywhereapp as site
+from extraction import find_page_image
+from feed_health import health_registry, CircuitOpenError, BudgetExceededError, REFRESH_BUDGET
+from image_proxy import image_proxy, ImageFetchError
+from ranking import page
+from topics import TOPICS
+
+logger = logging.getLogger(__name__)
+
+PORT = int(os.environ.get('PORT', 5002))
+EXECUTOR_WORKERS = int(os.environ.get('ASYNC_EXECUTOR_WORKERS', 8))
+FETCH_CONCURRENCY = 32  # Simultaneous upstream connections
+POLL_INTERVAL = 60  # Seconds between checks for a stale snapshot
+SSE_HEARTBEAT = 15  # Seconds between keep-alive comments on idle event streams
+
+
+class AsyncNewsServer:
+    """Snapshot refreshes and request handlers for one event loop"""
+
+    def __init__(self, executor_workers=EXECUTOR_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='async-worker')
+        self.loop = None
+        self.session = None
+        self.poller = None
+        self.refreshing = None  # Task of the running refresh
+        self.refresh_runs = admin.RefreshRuns()  # Status of the latest refreshes, for /api/admin/refresh/<id>
+        self.refresh_run = None  # Id of the running (or last) refresh
+        self.refresh_forced = False  # Whether the running (or last) refresh crawls every feed
+        self.sse_clients = 0
+        self._changed = None  # Replaced by a fresh asyncio.Event after every new version
+
+    async def start(self, app):
+        site.init()
+        self.loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=FETCH_CONCURRENCY))
+        self.poller = asyncio.create_task(self.poll())
+
+    async def stop(self, app):
+        self.poller.cancel()
+        await self.session.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # Snapshot updates
+
+    def notify(self):
+        """Wake every event stream (call on the loop)"""
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, articles):
+        version = site.publish_articles(articles)
+        self.loop.call_soon_threadsafe(self.notify)
+        return version
+
+    def patch(self, resolved):
+        version = site.patch_images(resolved)
+        self.loop.call_soon_threadsafe(self.notify)
+        return version
+
+    def is_stale(self):
+        return not site.LAST_UPDATED or time.time() - site.LAST_UPDATED > site.CACHE_TIMEOUT
+
+    async def poll(self):
+        """Refresh whenever the snapshot goes stale"""
+        while True:
+            if self.is_stale():
+                try:
+                    await self.trigger_refresh()
+                except Exception as e:
+                    logger.error(f"Error refreshing articles: {e}")
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def trigger_refresh(self, force=False, profile=False):
+        """Start a refresh unless one is already running; returns its task
+
+        A forced trigger while an unforced refresh runs queues a forced one
+        after it, so a manual refresh always crawls every feed.
+        """
+        running = self.refreshing is not None and not self.refreshing.done()
+        if running and (self.refresh_forced or not force):
+            return self.refreshing
+        self.refresh_run = run_id = self.refresh_runs.start()
+        self.refresh_forced = force
+        self.refreshing = asyncio.create_task(self.run_refresh(
+            force, profile, self.refreshing if running else None))
+        self.refreshing.add_done_callback(lambda task: self.finish_run(run_id, task))
+        return self.refreshing
+
+    async def run_refresh(self, force, profile, after=None):
+        if after is not None:
+            # Queued behind the running refresh; its outcome doesn't matter here
+            await asyncio.wait([after])
+        return await profiling.profile_refresh_async(
+            'async_refresh', functools.partial(self.refresh, force), force=profile)
+
+    def finish_run(self, run_id, task):
+        if task.cancelled():
+            self.refresh_runs.finish(run_id, error='cancelled')
+        elif task.exception() is not None:
+            self.refresh_runs.finish(run_id, error=str(task.exception()))
+        else:
+            self.refresh_runs.finish(run_id, version=task.result())
+
+    async def download(self, url, deadline):
+        """(content, content_type) of a feed, or None if it could not be downloaded"""
+        try:
+            status, headers, body = await health_registry.fetch_async(url, self.session, deadline)
+            if status == 200:
+                return body, headers.get('content-type', 'application/xml')
+            logger.error(f"Error fetching feed {url}: HTTP {status}")
+        except (CircuitOpenError, BudgetExceededError) as e:
+            logger.info(f"Skipping feed: {e}")
+        except Exception as e:
+            logger.error(f"Error fetching feed {url}: {e}")
+        return None
+
+    async def refresh(self, force=False):
+        """Download due feeds concurrently, then run the pipeline on them in the executor
+
+        Returns the published snapshot version.
+        """
+        feeds = site.feed_registry.feeds()
+        due = feeds if force else pipeline.due_feeds(feeds, time.time())
+        deadline = time.monotonic() + REFRESH_BUDGET
+        downloads = await asyncio.gather(*(self.download(feed['url'], deadline) for feed in due))
+        prefetched = {feed['url']: download for feed, download in zip(due, downloads) if download}
+
+        def ingestor(batch, defer_images=True):
+            return pipeline.ingest(batch, defer_images=defer_images, prefetched=prefetched)
+
+        return await self.loop.run_in_executor(self.executor, functools.partial(
+            pipeline.refresh, feeds, self.publish, self.patch, ingestor=ingestor, force=force,
+            enricher=self.enricher))
+
+    # Image enrichment
+
+    def enricher(self, links, apply):
+        """pipeline.refresh() hook: resolve images on the loop instead of in a thread"""
+        asyncio.run_coroutine_threadsafe(self.enrich(links, apply), self.loop)
+
+    async def page_image(self, link, deadline):
+        try:
+            status, headers, body = await health_registry.fetch_async(link, self.session, deadline)
+            if status == 200:
+                # BeautifulSoup is CPU-bound; keep it off the event loop
+                return await self.loop.run_in_executor(self.executor, find_page_image, body, link)
+        except (CircuitOpenError, BudgetExceededError) as e:
+            logger.info(f"Skipping article page fetch: {e}")
+        except Exception as e:
+            logger.info(f"Couldn't extract image from article content: {e}")
+        return None
+
+    async def enrich(self, links, apply):
+        start = time.monotonic()
+        deadline = start + pipeline.ENRICH_DEADLINE
+        tasks = {asyncio.create_task(self.page_image(link, deadline)): link for link in links}
+        done, pending = await asyncio.wait(tasks, timeout=pipeline.ENRICH_DEADLINE)
+        for task in pending:
+            task.cancel()
+        resolved = {tasks[task]: task.result() for task in done if task.result()}
+        logger.info(f"Image enrichment resolved {len(resolved)} of {len(links)} images "
+                    f"in {time.monotonic() - start:.1f}s")
+        await self.loop.run_in_executor(self.executor, apply, resolved)
+
+    # Routes
+
+    async def current_articles(self):
+        """The published articles; waits for a refresh only when there are none"""
+        if self.is_stale():
+            self.trigger_refresh()
+        if not site.CACHED_ARTICLES:
+            try:
+                await asyncio.shield(self.trigger_refresh())
+            except Exception as e:
+                logger.error(f"Error refreshing articles: {e}")
+        return site.CACHED_ARTICLES or site.SAMPLE_ARTICLES
+
+    async def current_views(self):
+        """Ranked hero and front page of the published articles"""
+        await self.current_articles()
+        with site.cache_lock:
+            return site.get_views_locked()
+
+    def last_updated(self):
+        return datetime.fromtimestamp(site.LAST_UPDATED).isoformat() if site.LAST_UPDATED else None
+
+    async def api_articles(self, request):
+        try:
+            limit = int(request.query.get('limit', 12))
+        except ValueError:
+            limit = 12
+        views = await self.current_views()
+        articles = views.articles
+        topic, source = request.query.get('topic'), request.query.get('source')
+        if topic or source:
+            if topic and topic not in TOPICS:
+                return web.json_response({'error': f"Unknown topic: {topic}", 'topics': list(TOPICS)}, status=400)
+            # Served from the lists prebuilt for this snapshot
+            body = site.facet_cache.get(views).page_json(topic, source, limit, lastUpdated=self.last_updated(),
+                                                         version=site.CACHE_VERSION, epoch=site.changelog.epoch)
+            return web.Response(text=body, content_type='application/json')
+        non_hero_articles = page(views, limit, include_hero=False)
+        return web.json_response({
+            'articles': image_proxy.proxy_articles(non_hero_articles),
+            'lastUpdated': self.last_updated(),
+            'total': len(articles),
+            'version': site.CACHE_VERSION,
+            'epoch': site.changelog.epoch
+        })
+
+    async def api_hero(self, request):
+        hero = (await self.current_views()).hero
+        return web.json_response({
+            'article': image_proxy.proxy_articles([hero])[0],
+            'lastUpdated': self.last_updated(),
+            'version': site.CACHE_VERSION
+        })
+
+    async def api_archive(self, request):
+        try:
+            start, end = parse_range(request.query.get('from'), request.query.get('to'))
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+        try:
+            limit = min(int(request.query.get('limit', 100)), MAX_QUERY_ARTICLES)
+        except ValueError:
+            limit = 100
+        # Segment reads and decompression stay off the event loop
+        articles, total = await self.loop.run_in_executor(self.executor, archive.query, start, end,
+                                                          request.query.get('source'), limit)
+        return web.json_response({
+            'articles': articles,
+            'total': total
+        })
+
+    async def api_article_changes(self, request):
+        try:
+            since = int(request.query.get('since', 0))
+        except ValueError:
+            since = 0
+        try:
+            limit = int(request.query.get('limit', 12))
+        except ValueError:
+            limit = 12
+        await self.current_articles()
+        with site.cache_lock:
+            version, index, views = site.CACHE_VERSION, site.ARTICLE_INDEX, site.get_views_locked()
+        changelog = site.changelog
+        delta = changelog.since(since, version, index, request.query.get('epoch'))
+        if delta is None:
+            return web.json_response({'version': version, 'epoch': changelog.epoch, 'reset': True})
+        upserted, removed = delta
+        return web.json_response({
+            'version': version,
+            'epoch': changelog.epoch,
+            'reset': False,
+            'upserted': image_proxy.proxy_articles(upserted),
+            'removed': removed,
+            'order': [article['id'] for article in page(views, limit + 1)]
+        })
+
+    async def api_article(self, request):
+        if not site.ARTICLE_INDEX:
+            await self.current_articles()
+        entry = site.ARTICLE_INDEX.get(request.match_info['article_id'])
+        if entry is None:
+            return web.json_response({'error': 'Article not found'}, status=404)
+        article, etag = entry
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers=headers)
+        return web.json_response({
+            'article': image_proxy.proxy_articles([article])[0],
+            'version': site.CACHE_VERSION
+        }, headers=headers)
+
+    async def admin_refresh(self, request):
+        """Start a full refresh without waiting for it; triggers while a full refresh runs join it"""
+        rejected = admin.check_refresh(request.remote, request.headers.get('Authorization'))
+        if rejected is not None:
+            status, body, headers = rejected
+            return web.json_response(body, status=status, headers=headers)
+        joined = self.refresh_run
+        profile = request.query.get('profile') == '1'
+        self.trigger_refresh(force=True, profile=profile)
+        coalesced = self.refresh_run == joined
+        return web.json_response({
+            'id': self.refresh_run,
+            'status': f"/api/admin/refresh/{self.refresh_run}",
+            'currentVersion': site.CACHE_VERSION,
+            'coalesced': coalesced,
+            'profiled': profile and not coalesced
+        }, status=202)
+
+    async def admin_refresh_status(self, request):
+        rejected = admin.check_admin(request.headers.get('Authorization'))
+        if rejected is not None:
+            status, body, headers = rejected
+            return web.json_response(body, status=status, headers=headers)
+        run = self.refresh_runs.get(request.match_info['run_id'])
+        if run is None:
+            return web.json_response({'error': 'Unknown refresh'}, status=404)
+        return web.json_response(run)
+
+    async def admin_profiles(self, request):
+        rejected = admin.check_admin(request.headers.get('Authorization'))
+        if rejected is not None:
+            status, body, headers = rejected
+            return web.json_response(body, status=status, headers=headers)
+        return web.json_response({'profiles': profiling.list_profiles()})
+
+    async def admin_profile(self, request):
+        rejected = admin.check_admin(request.headers.get('Authorization'))
+        if rejected is not None:
+            status, body, headers = rejected
+            return web.json_response(body, status=status, headers=headers)
+        name = request.match_info['name']
+        path = profiling.find_profile(name)
+        if path is None:
+            return web.json_response({'error': 'Profile not found'}, status=404)
+        return web.FileResponse(path, headers={'Content-Type': 'application/octet-stream',
+                                               'Content-Disposition': f'attachment; filename="{name}"'})
+
+    async def api_summary(self, request):
+        current_date = datetime.now().strftime("%Y-%m-%d")
+        summary = site.build_summary(await self.current_articles())
+        return web.Response(text=summary, content_type='text/plain', headers={
+            'Content-Disposition': f"attachment; filename=nexusai_news_summary_{current_date}.txt"
+        })
+
+    async def api_events(self, request):
+        """Server-Sent Events: a 'version' event for every published snapshot"""
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+        await response.prepare(request)
+        self.sse_clients += 1
+        try:
+            sent = None
+            while True:
+                changed = self._changed
+                if site.CACHE_VERSION != sent:
+                    sent = site.CACHE_VERSION
+                    data = json.dumps({'version': sent, 'lastUpdated': self.last_updated()})
+                    await response.write(f"event: version\ndata: {data}\n\n".encode('utf-8'))
+                try:
+                    await asyncio.wait_for(changed.wait(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    await response.write(b": ping\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            self.sse_clients -= 1
+        return response
+
+    async def debug(self, request):
+        return web.json_response({
+            'status': 'running',
+            'mode': 'async',
+            'articles_count': len(site.CACHED_ARTICLES),
+            'version': site.CACHE_VERSION,
+            'cache_updated': self.last_updated(),
+            'refreshing': self.refreshing is not None and not self.refreshing.done(),
+            'sse_clients': self.sse_clients,
+            'feeds': site.feed_registry.feeds(),
+            'upstream_health': health_registry.snapshot(),
+            'pipeline': pipeline.last_stats,
+            'image_proxy': image_proxy.stats(),
+            'changelog': site.changelog.stats(),
+            'archive': archive.stats(),
+            'manual_refresh': {'in_flight': self.refreshing is not None and not self.refreshing.done(),
+                               'last': self.refresh_runs.latest(), 'rate_limit': admin.refresh_limiter.stats()}
+        })
+
+    async def proxied_image(self, request):
+        article_id = request.match_info['article_id']
+        try:
+            width = int(request.query['w']) if 'w' in request.query else None
+        except ValueError:
+            width = None
+        try:
+            image = await self.loop.run_in_executor(self.executor, image_proxy.get, article_id, width,
+                                                    request.query.get('v'))
+        except ImageFetchError as e:
+            logger.warning(str(e))
+            raise web.HTTPFound(image_proxy.source(article_id), headers={'Cache-Control': 'no-store'})
+        if image is None:
+            return web.json_response({'error': 'Unknown image'}, status=404)
+        headers = {'ETag': image.etag, 'Cache-Control': image.cache_control}
+        if request.headers.get('If-None-Match') == image.etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=image.body, content_type=image.content_type, headers=headers)
+
+    async def send_asset(self, request, name):
+        asset = assets.resolve(name, request.headers.get('Accept-Encoding'))
+        if asset is None:
+            return None
+        path, content_type, content_encoding, cache_control = asset
+        # The .br/.gz sibling is picked here: aiohttp 3.9's FileResponse only knows about .gz
+        headers = {'Content-Type': content_type, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+        if content_encoding:
+            headers['Content-Encoding'] = content_encoding
+        return web.FileResponse(path, headers=headers)
+
+    async def index(self, request):
+        return await self.send_asset(request, assets.INDEX) or \
+            web.FileResponse(os.path.join(site.BASE_DIR, 'index.html'))
+
+    async def fingerprinted_asset(self, request):
+        response = await self.send_asset(request, assets.ASSET_PREFIX + request.match_info['name'])
+        if response is None:
+            return web.json_response({'error': 'Not found'}, status=404)
+        return response
+
+    async def test_endpoint(self, request):
+        return web.Response(text="Test endpoint working!")
+
+    async def static_files(self, request):
+        path = os.path.normpath(os.path.join(site.BASE_DIR, request.match_info['path']))
+        if not path.startswith(site.BASE_DIR + os.sep) or not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+
+@web.middleware
+async def profile_middleware(request, handler):
+    """cProfile of a request, as profiling.ProfilingMiddleware does for the Flask apps
+
+    Other requests served by the loop meanwhile show up in the profile too.
+    """
+    if not profiling.wants_request_profile(request.headers.get(profiling.PROFILE_HEADER),
+                                           request.headers.get('Authorization'), admin.authorized):
+        return await handler(request)
+    with profiling.RequestProfile(f"{request.method} {request.path}"):
+        return await handler(request)
+
+
+def create_app(server=None):
+    server = server or AsyncNewsServer()
+    # No middleware at all unless request profiles can be asked for
+    middlewares = [profile_middleware] if profiling.PROFILE_REQUESTS or admin.ADMIN_TOKEN else []
+    app = web.Application(middlewares=middlewares)
+    app['server'] = server
+    app.on_startup.append(server.start)
+    app.on_cleanup.append(server.stop)
+    app.add_routes([
+        web.get('/', server.index),
+        web.get('/test', server.test_endpoint),
+        web.get('/assets/{name:.+}', server.fingerprinted_asset),
+        web.get('/img/{article_id}', server.proxied_image),
+        web.get('/api/summary', server.api_summary),
+        web.get('/api/articles', server.api_articles),
+        web.get('/api/archive', server.api_archive),
+        web.get('/api/articles/changes', server.api_article_changes),
+        web.get('/api/articles/{article_id}', server.api_article),
+        web.get('/api/hero', server.api_hero),
+        web.get('/api/events', server.api_events),
+        web.post('/api/admin/refresh', server.admin_refresh),
+        web.get('/api/admin/refresh/{run_id}', server.admin_refresh_status),
+        web.get('/api/admin/profiles', server.admin_profiles),
+        web.get('/api/admin/profiles/{name}', server.admin_profile),
+        web.get('/debug', server.debug),
+        web.get('/{path:.+}', server.static_files)
+    ])
+    return app
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else PORT
+    web.run_app(create_app(), port=port, backlog=4096)
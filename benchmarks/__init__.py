@@ -0,0 +1,5 @@
+"""
+Offline benchmark suite for NexusAI News Hub
+
+Run from the repository root with: python -m benchmarks.run
+"""
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+asyncio serving mode under many concurrent connections
+
+Starts async_server.py against the stand-ins, connects a crowd of
+Server-Sent Events clients, triggers a refresh through /api/admin/refresh
+and measures API latency while it runs, and how many event streams
+received the new version.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.bench_load import percentile
+
+ADMIN_TOKEN = 'bench-admin-token'
+
+
+def start_async_app(feeds):
+    """Run async_server in its own event loop thread; returns (stop, base_url)"""
+    import admin
+    import async_server
+    from feed_registry import FeedRegistry
+
+    admin.ADMIN_TOKEN = ADMIN_TOKEN
+
+    site = async_server.site
+    site.feed_registry = FeedRegistry(feeds=feeds)
+    bench_dir = tempfile.mkdtemp(prefix='nexusai-bench-')
+    site.CACHE_FILE = os.path.join(bench_dir, 'articles_cache.json')
+    async_server.image_proxy.cache_dir = os.path.join(bench_dir, 'image_cache')
+    async_server.image_proxy.allow_private = True  # The stand-ins listen on 127.0.0.1
+    async_server.archive.directory = os.path.join(bench_dir, 'archive')
+
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(async_server.create_app())
+    loop.run_until_complete(runner.setup())
+    site_server = web.TCPSite(runner, '127.0.0.1', 0, backlog=4096)
+    loop.run_until_complete(site_server.start())
+    port = site_server._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, name='bench-async', daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(30)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+
+    return stop, f"http://127.0.0.1:{port}"
+
+
+async def sse_client(session, url, connected, target_version, received):
+    """Follow the event stream until it reports target_version['value'] or newer"""
+    async with session.get(url + '/api/events', timeout=aiohttp.ClientTimeout(total=None)) as response:
+        connected.append(True)
+        async for line in response.content:
+            if line.startswith(b'data: '):
+                version = json.loads(line[len(b'data: '):])['version']
+                if target_version['value'] is not None and version >= target_version['value']:
+                    received.append(time.perf_counter())
+                    return
+
+
+async def scenario(url, sse_clients, requests_during_refresh):
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Let the startup refresh finish first
+        while True:
+            async with session.get(url + '/debug') as response:
+                debug = await response.json()
+            if not debug['refreshing']:
+                break
+            await asyncio.sleep(0.1)
+        start_version = debug['version']
+        target_version = {'value': None}
+        connected, received = [], []
+        streams = [asyncio.create_task(sse_client(session, url, connected, target_version, received))
+                   for _ in range(sse_clients)]
+        while len(connected) < sse_clients:
+            await asyncio.sleep(0.05)
+
+        # Trigger a refresh and hit the API while it runs; streams count the first version after the trigger
+        target_version['value'] = start_version + 1
+        refresh_start = time.perf_counter()
+        async with session.post(url + '/api/admin/refresh',
+                                headers={'Authorization': f"Bearer {ADMIN_TOKEN}"}) as response:
+            assert response.status == 202, response.status
+            status_url = url + (await response.json())['status']
+
+        async def refresh():
+            # The trigger returns at once; poll the refresh until it reports its published version
+            while True:
+                async with session.get(status_url, headers={'Authorization': f"Bearer {ADMIN_TOKEN}"}) as response:
+                    run = await response.json()
+                if run['status'] != 'running':
+                    assert run['status'] == 'published', run
+                    return
+                await asyncio.sleep(0.02)
+
+        refreshed = asyncio.create_task(refresh())
+
+        async def timed_get(path):
+            start = time.perf_counter()
+            async with session.get(url + path) as response:
+                await response.read()
+                return time.perf_counter() - start, response.status
+
+        samples = await asyncio.gather(*(timed_get(path) for path in ['/api/hero', '/api/articles', '/debug']
+                                         for _ in range(requests_during_refresh // 3)))
+        await refreshed
+        refresh_seconds = time.perf_counter() - refresh_start
+
+        await asyncio.wait(streams, timeout=10)
+        for stream in streams:
+            stream.cancel()
+
+        latencies = sorted(latency for latency, status in samples if status < 400)
+        notify = sorted(at - refresh_start for at in received)
+        return {
+            'sse_clients': sse_clients,
+            'sse_notified': len(received),
+            'sse_notify_p50_ms': round(percentile(notify, 50) * 1000, 2) if notify else None,
+            'refresh_seconds': round(refresh_seconds, 3),
+            'requests_during_refresh': len(samples),
+            'errors_during_refresh': sum(1 for _, status in samples if status >= 400),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None
+        }
+
+
+def run(feeds, sse_clients=1000, requests_during_refresh=300):
+    stop, url = start_async_app(feeds)
+    try:
+        return asyncio.run(scenario(url, sse_clients, requests_during_refresh))
+    finally:
+        stop()
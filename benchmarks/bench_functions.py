@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Per-function throughput of the extraction and ranking helpers on recorded fixtures
+"""
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import feedparser
+
+from benchmarks.stand_in import FIXTURES_DIR, load_sources
+from extraction import (AI_KEYWORDS, article_id, clean_text, extract_first_paragraph, get_article_image,
+                        get_feed_image, is_ai_related)
+from pipeline import order_articles
+from ranking import FRONT_PAGE_SIZE, page, rank_views
+from topics import Facets, assign
+
+MIN_TIME = 0.5  # Seconds each function is exercised for
+
+
+def legacy_clean_text(text):
+    """clean_text as it was before the table-driven rewrite, kept as a baseline"""
+    if not text:
+        return ""
+    replacements = {
+        '&nbsp;': ' ',
+        '&amp;': '&',
+        '&lt;': '<',
+        '&gt;': '>',
+        '&quot;': '"',
+        '&apos;': "'",
+        '\u2019': "'",
+        '\u2018': "'",
+        '\u201c': '"',
+        '\u201d': '"',
+        '\u2014': '-',
+        '\u2013': '-',
+        '\u00a0': ' ',
+    }
+    for old, new in replacements.items():
+        if old in text:
+            text = text.replace(old, new)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def legacy_front_page(articles, limit=FRONT_PAGE_SIZE):
+    """Hero and front page as the routes picked them before ranked views, kept as a baseline"""
+    hero = next((article for article in articles if article.get('isHero')), None) or articles[0]
+    return hero, [article for article in articles if not article.get('isHero')][:limit]
+
+
+def topic_filter_scan(views, topic, limit=FRONT_PAGE_SIZE):
+    """A topic's page filtered and serialized per request, kept as a baseline for prebuilt facets"""
+    return json.dumps([article for article in page(views, len(views.articles))
+                       if topic in article.get('topics', ())][:limit])
+
+
+def load_snapshot(entries):
+    """Article records shaped like a published snapshot, built from parsed entries"""
+    return order_articles([{
+        'id': article_id(entry.link),
+        'title': entry.title,
+        'link': entry.link,
+        'published': datetime(*entry.published_parsed[:6]).isoformat() if entry.get('published_parsed') else '',
+        'source': {'name': entry.get('author', '')},
+        'topics': assign(entry.title, entry.get('summary', ''), entry.get('tags')),
+        'isHero': False
+    } for entry in entries])
+
+
+def measure(func, inputs, min_time=MIN_TIME):
+    """Call func over inputs repeatedly for at least min_time seconds"""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_time:
+        for args in inputs:
+            func(*args)
+        calls += len(inputs)
+        elapsed = time.perf_counter() - start
+    return {
+        'calls': calls,
+        'seconds': round(elapsed, 4),
+        'ops_per_sec': round(calls / elapsed, 1),
+        'mean_us': round(elapsed / calls * 1e6, 2)
+    }
+
+
+def load_feed_bytes(base='http://127.0.0.1/r0'):
+    """Return the raw bytes of every recorded feed"""
+    feeds = []
+    for publisher, info in sorted(load_sources().items()):
+        with open(os.path.join(FIXTURES_DIR, publisher, info['feed']), encoding='utf-8') as f:
+            feeds.append(f.read().replace('{base}', base).encode('utf-8'))
+    return feeds
+
+
+def load_entries(feed_urls=None):
+    """Parse the recorded feeds, either offline or from running stand-ins"""
+    entries = []
+    if feed_urls:
+        for url in feed_urls:
+            entries.extend(feedparser.parse(url).entries)
+    else:
+        for content in load_feed_bytes():
+            entries.extend(feedparser.parse(content).entries)
+    return entries
+
+
+def run(feed_urls=None, min_time=MIN_TIME):
+    """Benchmark every helper; feed_urls enables get_article_image page fetches"""
+    feeds = load_feed_bytes()
+    entries = load_entries()
+    titles = [(entry.title,) for entry in entries]
+    summaries = [(entry.summary,) for entry in entries]
+    contents = [(entry.content[0]['value'],) for entry in entries if entry.get('content')]
+
+    results = {
+        'feedparser.parse': measure(feedparser.parse, [(content,) for content in feeds], min_time),
+        'clean_text_legacy': measure(legacy_clean_text, titles + summaries, min_time),
+        'clean_text': measure(clean_text, titles + summaries, min_time),
+        'extract_first_paragraph': measure(extract_first_paragraph, summaries + contents, min_time),
+        'is_ai_related': measure(is_ai_related, [(entry, AI_KEYWORDS) for entry in entries], min_time),
+        'get_feed_image': measure(get_feed_image, [(entry,) for entry in entries], min_time),
+        'topics.assign': measure(lambda entry: assign(entry.title, entry.summary, entry.get('tags')),
+                                 [(entry,) for entry in entries], min_time)
+    }
+
+    # Hero and front page per request: a scan of the snapshot against the precomputed views
+    snapshot = load_snapshot(entries)
+    views = rank_views(snapshot)
+    results['front_page_scan'] = measure(legacy_front_page, [(views.articles,)], min_time)
+    results['front_page_ranked'] = measure(lambda: (views.hero, page(views, FRONT_PAGE_SIZE, include_hero=False)),
+                                           [()], min_time)
+    results['rank_views'] = measure(rank_views, [(snapshot,)], min_time)
+    results['rank_views']['articles'] = len(snapshot)
+
+    # A topic's page per request: filtering and serializing against the facets built once per snapshot
+    topic = max(Facets(snapshot, json.dumps).counts().items(), key=lambda item: item[1])[0]
+    facets = Facets(page(views, len(views.articles)), json.dumps)
+    results['topic_filter_scan'] = measure(topic_filter_scan, [(views, topic)], min_time)
+    results['topic_facet_page'] = measure(facets.page_json, [(topic, None, FRONT_PAGE_SIZE)], min_time)
+    results['facets_build'] = measure(lambda: Facets(page(views, len(views.articles)), json.dumps), [()], min_time)
+
+    if feed_urls:
+        # Entries parsed from the stand-ins link to pages that can actually be fetched
+        live_entries = load_entries(feed_urls)
+        results['get_article_image'] = measure(get_article_image, [(entry,) for entry in live_entries], min_time)
+
+    return results
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Concurrent load generator for the article API
+
+Either targets an already running server (--url) or starts
+pythonanywhereapp in-process, fed by the local stand-ins. api.py needs a
+reachable DATABASE_URL at import, so it is only used when pointed at with --url.
+"""
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+ENDPOINTS = ['/api/articles', '/api/hero', '/api/summary']
+IMAGE_ENDPOINT = '/img'
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+def start_local_app(feeds):
+    """Serve pythonanywhereapp on a free port, reading from the given feeds"""
+    from werkzeug.serving import make_server
+    import pythonanywhereapp
+    from feed_registry import FeedRegistry
+
+    pythonanywhereapp.feed_registry = FeedRegistry(feeds=feeds)
+    # Never overwrite the real snapshot in the repository
+    bench_dir = tempfile.mkdtemp(prefix='nexusai-bench-')
+    pythonanywhereapp.CACHE_FILE = os.path.join(bench_dir, 'articles_cache.json')
+    pythonanywhereapp.image_proxy.cache_dir = os.path.join(bench_dir, 'image_cache')
+    # The stand-ins listen on 127.0.0.1, which the proxy refuses by default
+    pythonanywhereapp.image_proxy.allow_private = True
+    pythonanywhereapp.archive.directory = os.path.join(bench_dir, 'archive')
+    pythonanywhereapp.init()
+    pythonanywhereapp.get_articles(force_refresh=True)
+
+    server = make_server('127.0.0.1', 0, pythonanywhereapp.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def image_paths(base_url):
+    """Proxied image paths of the current articles whose source is a local stand-in"""
+    articles = requests.get(base_url + '/api/articles', timeout=30).json()['articles']
+    return [article['image'] for article in articles
+            if article['image'].startswith(IMAGE_ENDPOINT + '/')
+            and article.get('imageSource', '').startswith('http://127.0.0.1')]
+
+
+def check_image_proxy(base_url, images):
+    """Fail unless the proxy serves a stand-in image as a JPEG and refuses it by default as a private source"""
+    from image_proxy import ImageFetchError, check_source
+
+    response = requests.get(base_url + images[0], timeout=30)
+    if response.status_code != 200 or response.headers.get('Content-Type') != 'image/jpeg' \
+            or not response.content.startswith(b'\xff\xd8'):
+        raise RuntimeError(f"Image proxy returned {response.status_code} "
+                           f"{response.headers.get('Content-Type')} for {images[0]}")
+    articles = requests.get(base_url + '/api/articles', timeout=30).json()['articles']
+    source = next(article['imageSource'] for article in articles if article['image'] == images[0])
+    try:
+        check_source(source)
+    except ImageFetchError:
+        pass
+    else:
+        raise RuntimeError(f"Image proxy accepted the private source {source}")
+    return {'bytes': len(response.content)}
+
+
+def generate_load(base_url, endpoints=ENDPOINTS, concurrency=16, duration=10.0, paths=None):
+    """Hit every endpoint round-robin from concurrency threads for duration seconds
+
+    paths optionally maps an endpoint to the concrete paths requested for it in turn.
+    """
+    paths = paths or {}
+    samples = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        i = offset
+        while time.perf_counter() < stop_at:
+            endpoint = endpoints[i % len(endpoints)]
+            choices = paths.get(endpoint, [endpoint])
+            path = choices[(i // len(endpoints)) % len(choices)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                ok = session.get(base_url + path, timeout=30).status_code < 400
+            except requests.RequestException:
+                ok = False
+            latency = time.perf_counter() - start
+            with lock:
+                if ok:
+                    samples[endpoint].append(latency)
+                else:
+                    errors[endpoint] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    results = {}
+    for endpoint in endpoints:
+        latencies = sorted(samples[endpoint])
+        results[endpoint] = {
+            'requests': len(latencies),
+            'errors': errors[endpoint],
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None
+        }
+    return results
+
+
+def run(feeds=None, url=None, concurrency=16, duration=10.0):
+    """Run the load test against url, or against a local app fed by feeds"""
+    server = None
+    if url is None:
+        server, url = start_local_app(feeds)
+    try:
+        endpoints, paths, image_check = list(ENDPOINTS), {}, None
+        images = image_paths(url)
+        if images:
+            # Resized variants served by the image proxy from the stand-ins' image
+            image_check = check_image_proxy(url, images)
+            endpoints.append(IMAGE_ENDPOINT)
+            paths[IMAGE_ENDPOINT] = images
+        return {
+            'target': 'external' if server is None else 'pythonanywhereapp',
+            'concurrency': concurrency,
+            'duration_seconds': duration,
+            'image_check': image_check,
+            'endpoints': generate_load(url, endpoints, concurrency=concurrency, duration=duration, paths=paths)
+        }
+    finally:
+        if server is not None:
+            server.shutdown()
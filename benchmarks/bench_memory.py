@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Memory per article of a long in-memory history: article dicts against records.ArticleHistory
+
+The recorded feed entries are turned into article records the way the
+pipeline builds them (a source dict and fresh strings per article) and
+repeated with unique links until the history holds the requested count.
+"""
+import gc
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+import feedparser
+
+from benchmarks.stand_in import FIXTURES_DIR, load_sources
+from extraction import article_id, extract_first_paragraph, get_feed_image
+from records import ArticleHistory
+from topics import assign
+
+SERIALIZE_BATCH = 1000  # Articles serialized per timing sample
+
+
+def fresh(text):
+    """A new str object with the same value, as each parsed entry would have"""
+    return text[:1] + text[1:] if text else text
+
+
+def recorded_articles(base='http://127.0.0.1/r0'):
+    """One article dict per recorded feed entry"""
+    templates = []
+    for publisher, info in sorted(load_sources().items()):
+        with open(os.path.join(FIXTURES_DIR, publisher, info['feed']), encoding='utf-8') as f:
+            feed = feedparser.parse(f.read().replace('{base}', base).encode('utf-8'))
+        for entry in feed.entries:
+            published = entry.get('published_parsed')
+            summary = extract_first_paragraph(entry.get('summary', ''), 50)
+            templates.append({
+                'title': entry.title,
+                'summary': summary,
+                'link': entry.link,
+                'published': datetime(*published[:6]).isoformat() if published else datetime.now().isoformat(),
+                'image': get_feed_image(entry),
+                'source': {'name': info['name'], 'url': info.get('website', ''), 'logo': info.get('logo', '')},
+                'topics': assign(entry.title, summary, entry.get('tags'))
+            })
+    return templates
+
+
+def synthetic_articles(templates, count):
+    """count article dicts shaped like the pipeline's, each with its own strings and source dict"""
+    for n in range(count):
+        template = templates[n % len(templates)]
+        link = f"{template['link']}?n={n}"
+        yield {
+            'id': article_id(link),
+            'title': fresh(template['title']),
+            'summary': fresh(template['summary']),
+            'link': link,
+            'published': fresh(template['published']),
+            'image': fresh(template['image']),
+            'source': {key: fresh(value) for key, value in template['source'].items()},
+            'topics': list(template['topics']),
+            'isHero': False
+        }
+
+
+def traced_bytes(build):
+    """Bytes still allocated by build() once it returns (the result is kept alive)"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def serialize_seconds(serialize, rounds=5):
+    """Best time of several runs of serialize()"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        serialize()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(count=100000):
+    templates = recorded_articles()
+    dicts, dict_bytes = traced_bytes(lambda: list(synthetic_articles(templates, count)))
+
+    def build_history():
+        # Each dict is dropped as soon as it is stored
+        history = ArticleHistory()
+        history.extend(synthetic_articles(templates, count))
+        return history
+
+    history, history_bytes = traced_bytes(build_history)
+
+    batch = dicts[:SERIALIZE_BATCH]
+    rows = range(min(SERIALIZE_BATCH, len(history)))
+    dict_seconds = serialize_seconds(lambda: json.dumps(batch))
+    record_seconds = serialize_seconds(lambda: history.to_json(rows))
+    assert history.to_json(rows) == json.dumps(batch)
+    assert [history[row].to_dict() for row in rows] == batch
+
+    return {
+        'articles': count,
+        'dict_bytes_per_article': round(dict_bytes / count, 1),
+        'record_bytes_per_article': round(history_bytes / count, 1),
+        'record_column_bytes_per_article': round(history.nbytes() / count, 1),
+        'reduction': round(dict_bytes / history_bytes, 2) if history_bytes else None,
+        'serialize_dicts_us_per_article': round(dict_seconds / len(batch) * 1e6, 3),
+        'serialize_records_us_per_article': round(record_seconds / len(rows) * 1e6, 3)
+    }
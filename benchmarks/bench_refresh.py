@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+End-to-end refresh time against the local stand-ins
+"""
+import time
+
+import pipeline
+from entry_memo import EntryMemo
+
+
+def time_full_crawl(feeds, rounds):
+    """Refresh with every image resolved inline (single phase)"""
+    timings = []
+    articles = 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = pipeline.ingest(feeds, defer_images=False, memo=None)
+        timings.append(time.perf_counter() - start)
+        articles = len(result.articles)
+    return timings, articles
+
+
+def time_two_phase(feeds, rounds):
+    """Refresh with deferred images: time to publish and time until images are resolved"""
+    publish_timings = []
+    enriched_timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = pipeline.ingest(feeds, defer_images=True, memo=None)
+        publish_timings.append(time.perf_counter() - start)
+        if result.pending_images:
+            pipeline.enrich_images(result.pending_images)
+        enriched_timings.append(time.perf_counter() - start)
+    return publish_timings, enriched_timings
+
+
+def time_memoized(feeds, rounds):
+    """Refresh again over unchanged feeds with a warm entry memo"""
+    memo = EntryMemo(path=None)
+    pipeline.ingest(feeds, defer_images=False, memo=memo)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        pipeline.ingest(feeds, defer_images=False, memo=memo)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'rounds': len(ordered),
+        'min_seconds': round(ordered[0], 4),
+        'median_seconds': round(ordered[len(ordered) // 2], 4),
+        'max_seconds': round(ordered[-1], 4)
+    }
+
+
+def run(feeds, rounds=5):
+    """Benchmark a full crawl and a two-phase refresh over feeds"""
+    full, articles = time_full_crawl(feeds, rounds)
+    published, enriched = time_two_phase(feeds, rounds)
+    memoized = time_memoized(feeds, rounds)
+    return {
+        'feeds': len(feeds),
+        'articles': articles,
+        'full_crawl': summarize(full),
+        'two_phase_publish': summarize(published),
+        'two_phase_enriched': summarize(enriched),
+        'memoized_refresh': summarize(memoized),
+        'stages': pipeline.last_stats.get('stages', {})
+    }
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Static file serving: the development handler in server.py against production mode
+
+Both servers serve the repository on free ports. Each is loaded twice, once
+on its own and once while a slow client holds a connection open with an
+unfinished request, which stalls the single-threaded development server.
+"""
+import socket
+import socketserver
+import threading
+import time
+
+import requests
+
+import assets
+import server
+from benchmarks.bench_load import generate_load
+
+STATIC_ENDPOINTS = ['/', '/index.html', '/styles.css', '/script.js']
+
+
+def start_server(production):
+    """Serve the repository with either handler on a free port"""
+    if production:
+        assets.build_or_none()
+        httpd = server.ProductionServer(('127.0.0.1', 0), server.ProductionRequestHandler)
+    else:
+        httpd = socketserver.TCPServer(('127.0.0.1', 0), server.Handler)
+    threading.Thread(target=httpd.serve_forever, name='bench-static', daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}"
+
+
+def hold_slow_client(port, stop):
+    """Open a connection and dribble an incomplete request until stop is set"""
+    sock = socket.create_connection(('127.0.0.1', port))
+    try:
+        sock.sendall(b'GET /index.html HTTP/1.1\r\n')
+        while not stop.wait(0.5):
+            sock.sendall(b'X-Slow: 1\r\n')
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def transfer_sizes(base_url):
+    """Bytes sent for a first visit to the page and its assets, and for a repeat visit of the page"""
+    session = requests.Session()
+    headers = {'Accept-Encoding': 'gzip, br'}
+    page = session.get(base_url + '/', headers=headers)
+    if '/assets/' in page.text:
+        paths = ['/' + hashed for hashed in assets.manifest.values()]
+    else:
+        paths = ['/' + name for name in assets.ASSETS]
+    sizes = [int(page.headers.get('Content-Length', 0))]
+    for path in paths:
+        sizes.append(int(session.get(base_url + path, headers=headers).headers.get('Content-Length', 0)))
+    etag = page.headers.get('ETag')
+    repeat = session.get(base_url + '/', headers=dict(headers, **({'If-None-Match': etag} if etag else {})))
+    return {
+        'first_visit_bytes': sum(sizes),
+        'repeat_status': repeat.status_code,
+        'repeat_bytes': int(repeat.headers.get('Content-Length', 0))
+    }
+
+
+def run(concurrency=16, duration=5.0):
+    """Load both handlers with and without a slow client"""
+    results = {}
+    for mode in ('development', 'production'):
+        httpd, url = start_server(mode == 'production')
+        try:
+            results[mode] = {'idle': generate_load(url, STATIC_ENDPOINTS, concurrency=concurrency, duration=duration)}
+            stop = threading.Event()
+            slow = threading.Thread(target=hold_slow_client, args=(httpd.server_address[1], stop), daemon=True)
+            slow.start()
+            time.sleep(0.2)
+            # The slow client gives up when the load ends, so stalled requests finish instead of timing out
+            threading.Timer(duration, stop.set).start()
+            results[mode]['slow_client'] = generate_load(url, STATIC_ENDPOINTS, concurrency=concurrency,
+                                                         duration=duration)
+            slow.join()
+            results[mode]['transfer'] = transfer_sizes(url)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+    return results
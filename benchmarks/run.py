@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Run the offline benchmark suite and save the results as JSON
+
+Usage (from the repository root):
+    python -m benchmarks.run
+    python -m benchmarks.run --suites functions,refresh --latency 0.2 --failure-rate 0.1
+    python -m benchmarks.run --compare benchmarks/results/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks import bench_functions, bench_load, bench_memory, bench_refresh, bench_static
+from benchmarks.stand_in import start_stand_ins, stop_stand_ins
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+SUITES = ['functions', 'refresh', 'load', 'static', 'async', 'memory']
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def flatten(data, prefix=''):
+    """Flatten nested results into {'a.b.c': number}"""
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(previous, current):
+    """Print every metric that exists in both result files with its change"""
+    old = flatten(previous.get('results', {}))
+    new = flatten(current.get('results', {}))
+    print(f"\n{'metric':<70} {'before':>12} {'after':>12} {'change':>9}")
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name], new[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else 'n/a'
+        print(f"{name:<70} {before:>12} {after:>12} {change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='NexusAI offline benchmarks')
+    parser.add_argument('--suites', default=','.join(SUITES), help='Comma separated: ' + ', '.join(SUITES))
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds of latency added by the stand-ins')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of stand-in requests that fail')
+    parser.add_argument('--failure-mode', choices=['error', 'hang'], default='error')
+    parser.add_argument('--replicas', type=int, default=1, help='Copies of each recorded feed to serve')
+    parser.add_argument('--rounds', type=int, default=5, help='Refresh rounds')
+    parser.add_argument('--min-time', type=float, default=bench_functions.MIN_TIME, help='Seconds per function benchmark')
+    parser.add_argument('--url', help='Load test an already running server instead of a local app')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load')
+    parser.add_argument('--sse-clients', type=int, default=1000, help='Event stream clients in the async suite')
+    parser.add_argument('--history-size', type=int, default=100000, help='Articles held in the memory suite')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    suites = [suite.strip() for suite in args.suites.split(',') if suite.strip()]
+
+    servers, feeds = start_stand_ins(replicas=args.replicas, latency=args.latency, jitter=args.jitter,
+                                     failure_rate=args.failure_rate, failure_mode=args.failure_mode)
+    results = {}
+    try:
+        if 'functions' in suites:
+            print('Benchmarking functions...')
+            results['functions'] = bench_functions.run([feed['url'] for feed in feeds], min_time=args.min_time)
+        if 'refresh' in suites:
+            print('Benchmarking refresh...')
+            results['refresh'] = bench_refresh.run(feeds, rounds=args.rounds)
+        if 'load' in suites:
+            print('Generating load...')
+            results['load'] = bench_load.run(feeds, url=args.url, concurrency=args.concurrency, duration=args.duration)
+        if 'static' in suites:
+            print('Benchmarking static serving...')
+            results['static'] = bench_static.run(concurrency=args.concurrency, duration=args.duration)
+        if 'async' in suites:
+            # Imported here because aiohttp is only needed for the async serving mode
+            from benchmarks import bench_async
+            print('Benchmarking async serving...')
+            results['async'] = bench_async.run(feeds, sse_clients=args.sse_clients)
+        if 'memory' in suites:
+            print('Benchmarking article memory...')
+            results['memory'] = bench_memory.run(count=args.history_size)
+    finally:
+        stop_stand_ins(servers)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'options': vars(args)
+        },
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"\nSaved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
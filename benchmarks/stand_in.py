@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-in for the upstream publishers
+
+Serves the recorded feeds and article pages in benchmarks/fixtures, one
+server (and so one host:port) per publisher, so per-host logic like the
+circuit breakers behaves as it would against the real sites. Latency and
+failures can be injected per request.
+"""
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Recorded lead image served for every /images/ request
+IMAGE_FIXTURE = os.path.join(FIXTURES_DIR, 'image.jpg')
+
+
+def load_sources():
+    """Return the publisher fixtures keyed by directory name"""
+    with open(os.path.join(FIXTURES_DIR, 'sources.json')) as f:
+        return json.load(f)
+
+
+class StandInServer:
+    """Threaded HTTP server for one publisher's fixtures
+
+    latency: seconds added to every response (plus up to jitter seconds)
+    failure_rate: fraction of requests that fail
+    failure_mode: 'error' answers 503, 'hang' sleeps for hang_seconds first
+    replicas: number of copies of the feed served under /r<n>/, each with its
+    own article links, to simulate a large feed registry
+    """
+
+    def __init__(self, publisher, latency=0.0, jitter=0.0, failure_rate=0.0, failure_mode='error',
+                 hang_seconds=30.0, replicas=1, seed=0):
+        self.publisher = publisher
+        self.root = os.path.join(FIXTURES_DIR, publisher)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.hang_seconds = hang_seconds
+        self.replicas = replicas
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}"
+
+    def feed_urls(self):
+        """URLs of every replica of this publisher's feed"""
+        return [f"{self.base_url}/r{n}/feed.xml" for n in range(self.replicas)]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=f"stand-in-{self.publisher}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                self.failures += 1
+                return True
+            return False
+
+    def _delay(self):
+        with self._lock:
+            jitter = self.random.random() * self.jitter if self.jitter else 0.0
+        return self.latency + jitter
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                delay = server._delay()
+                if delay:
+                    time.sleep(delay)
+                if server._should_fail():
+                    if server.failure_mode == 'hang':
+                        time.sleep(server.hang_seconds)
+                    self.send_error(503)
+                    return
+
+                # /r<n>/feed.xml, /r<n>/articles/<page>.html, /r<n>/images/<name>.jpg
+                parts = self.path.split('?')[0].strip('/').split('/')
+                if len(parts) < 2 or not parts[0].startswith('r'):
+                    self.send_error(404)
+                    return
+                base = f"{server.base_url}/{parts[0]}"
+                rel = '/'.join(parts[1:])
+                if rel.startswith('images/'):
+                    with open(IMAGE_FIXTURE, 'rb') as f:
+                        self._send(f.read(), 'image/jpeg')
+                    return
+                path = os.path.normpath(os.path.join(server.root, rel))
+                if not path.startswith(server.root) or not os.path.isfile(path):
+                    self.send_error(404)
+                    return
+                with open(path, 'r', encoding='utf-8') as f:
+                    body = f.read().replace('{base}', base).encode('utf-8')
+                content_type = 'application/rss+xml; charset=utf-8' if rel.endswith('.xml') else 'text/html; charset=utf-8'
+                self._send(body, content_type)
+
+            def _send(self, body, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def start_stand_ins(replicas=1, **options):
+    """Start one stand-in per publisher and return (servers, feeds)
+
+    feeds has the same shape as RSS_FEEDS, pointing at the stand-ins.
+    """
+    servers = []
+    feeds = []
+    for publisher, info in sorted(load_sources().items()):
+        server = StandInServer(publisher, replicas=replicas, **options).start()
+        servers.append(server)
+        for n, url in enumerate(server.feed_urls()):
+            feeds.append({
+                'url': url,
+                'name': info['name'] if replicas == 1 else f"{info['name']} {n}",
+                'website': info['website'],
+                'logo': info['logo']
+            })
+    return servers, feeds
+
+
+def stop_stand_ins(servers):
+    for server in servers:
+        server.stop()
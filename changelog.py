@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Versioned changelog of the published snapshot for incremental client sync
+
+Every published snapshot (a refresh or an image patch) bumps the app's
+snapshot version. The changelog keeps, for the last CHANGELOG_SIZE versions,
+which article IDs were added, updated or removed, so a client that already
+holds version N can be sent only what changed since:
+- Changes of several versions are collapsed per article: the current copy
+  of every added or updated article, and the IDs of removed ones
+- A client too far behind, or holding a version from a previous process
+  (a different epoch, or none), is told to reset and reload the full list;
+  /api/articles returns the epoch with the version
+- Deltas carry the IDs of the ranked page in order, so clients can place
+  upserted articles where the server ranks them
+"""
+import os
+import secrets
+import threading
+from collections import deque, namedtuple
+
+CHANGELOG_SIZE = int(os.environ.get('CHANGELOG_SIZE', 100))  # Snapshot versions kept
+
+Change = namedtuple('Change', ['version', 'added', 'updated', 'removed'])
+
+
+class Changelog:
+    """Bounded log of the article IDs changed by each snapshot version"""
+
+    def __init__(self, max_versions=CHANGELOG_SIZE):
+        # Versions restart at 0 with the process, so clients also echo the epoch back
+        self.epoch = secrets.token_hex(4)
+        self._lock = threading.Lock()
+        self._changes = deque(maxlen=max_versions)
+
+    def record(self, version, old_index, new_index):
+        """Diff two article indexes (ID -> (article, ETag)) and log them as `version`"""
+        added = [article_id for article_id in new_index if article_id not in old_index]
+        removed = [article_id for article_id in old_index if article_id not in new_index]
+        updated = [article_id for article_id, (_, etag) in new_index.items()
+                   if article_id in old_index and old_index[article_id][1] != etag]
+        with self._lock:
+            self._changes.append(Change(version, added, updated, removed))
+
+    def since(self, version, current_version, index, epoch=None):
+        """(upserted articles, removed IDs) after `version`, or None if the client must reset
+
+        index must be the article index of current_version. A client that
+        sends no epoch (or another process's) is told to reset.
+        """
+        if epoch != self.epoch or version > current_version:
+            return None
+        if version == current_version:
+            return [], []
+        with self._lock:
+            changes = [change for change in self._changes if version < change.version <= current_version]
+        # The oldest change needed must still be in the log
+        if not changes or changes[0].version != version + 1:
+            return None
+        changed = set()
+        for change in changes:
+            changed.update(change.added, change.updated, change.removed)
+        upserted = [index[article_id][0] for article_id in changed if article_id in index]
+        removed = sorted(article_id for article_id in changed if article_id not in index)
+        return upserted, removed
+
+    def stats(self):
+        with self._lock:
+            versions = [change.version for change in self._changes]
+        return {
+            'epoch': self.epoch,
+            'versions': len(versions),
+            'oldest': versions[0] if versions else None,
+            'newest': versions[-1] if versions else None
+        }
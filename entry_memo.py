@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Content-hash memoization of processed feed entries across refreshes
+
+Most entries are unchanged from one refresh to the next. Each processed
+entry is stored under a hash of its source, link, title, summary and
+content, so an unchanged entry skips classification, BeautifulSoup and the
+image lookups entirely. Memory is bounded by an LRU limit and the memo can
+optionally be persisted to disk (ENTRY_CACHE_FILE).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.environ.get('ENTRY_CACHE_SIZE', 5000))
+ENTRY_CACHE_FILE = os.environ.get('ENTRY_CACHE_FILE')  # Unset keeps the memo in memory only
+KEY_VERSION = '4'  # Bump whenever processed articles change (2: digest-based IDs, 3: topics, 4: summaries unescaped once)
+
+
+def entry_key(source, entry):
+    """Hash everything that affects how an entry is processed"""
+    parts = [
+        KEY_VERSION,
+        source.get('url', ''),
+        source.get('name', ''),
+        entry.get('link', ''),
+        entry.get('title', ''),
+        entry.get('summary', entry.get('description', '')),
+    ]
+    for content in entry.get('content', []) or []:
+        parts.append(content.get('value', ''))
+    for tag in entry.get('tags', []) or []:
+        parts.append(tag.get('term') or '')
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode('utf-8', 'replace'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+class EntryMemo:
+    """Bounded LRU map of entry hash -> processed result
+
+    A result is {'related': False} for entries filtered out as not AI-related,
+    or {'related': True, 'article': {...}, 'pending_image': bool} for kept ones.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, path=ENTRY_CACHE_FILE):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return a copy of the stored result, or None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        result = dict(result)
+        if 'article' in result:
+            # Callers mutate their article (e.g. isHero), never the stored one
+            result['article'] = dict(result['article'])
+        return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def patch_images(self, resolved):
+        """Record images resolved by the background phase"""
+        with self._lock:
+            for key, result in self._entries.items():
+                article = result.get('article')
+                if article and result.get('pending_image') and article['link'] in resolved:
+                    self._entries[key] = dict(result, article=dict(article, image=resolved[article['link']]),
+                                              pending_image=False)
+                    self._dirty = True
+
+    def stats(self):
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits,
+                'misses': self.misses, 'persisted': bool(self.path)}
+
+    def load(self):
+        """Load the memo from disk if the file exists"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    entries = json.load(f)
+                with self._lock:
+                    self._entries = OrderedDict(entries[-self.max_entries:])
+                logger.info(f"Loaded {len(self._entries)} memoized entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading entry memo: {e}")
+
+    def save(self):
+        """Persist the memo to disk if a path is configured and it changed"""
+        if not self.path or not self._dirty:
+            return
+        try:
+            with self._lock:
+                entries = list(self._entries.items())
+                self._dirty = False
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving entry memo: {e}")
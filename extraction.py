@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Content extraction helpers shared by the ingestion pipeline
+- Cleans titles and summaries
+- Derives stable article IDs from canonical links
+- Filters entries for AI-related content
+- Resolves article images from the feed entry or the article page
+"""
+from bs4 import BeautifulSoup
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit
+import hashlib
+import html
+import logging
+import re
+from feed_health import health_registry, CircuitOpenError, BudgetExceededError
+
+logger = logging.getLogger(__name__)
+
+# Fallback images to use when no image is found, requested from Unsplash at the largest image proxy
+# variant (1280px, quality 80) rather than as 2000px originals
+FALLBACK_IMAGES = [
+    "https://images.unsplash.com/photo-1677442135046-c10d516d84c6?q=80&w=1280&auto=format&fit=crop",
+    "https://images.unsplash.com/photo-1620712943543-bcc4688e7485?q=80&w=1280&auto=format&fit=crop",
+    "https://images.unsplash.com/photo-1529107386315-e1a2ed48a620?q=80&w=1280&auto=format&fit=crop",
+    "https://images.unsplash.com/photo-1532187863486-abf9dbad1b69?q=80&w=1280&auto=format&fit=crop",
+    "https://images.unsplash.com/photo-1526304640581-d334cdbbf45e?q=80&w=1280&auto=format&fit=crop",
+    "https://images.unsplash.com/photo-1616469829581-73993eb86b02?q=80&w=1280&auto=format&fit=crop",
+    "https://images.unsplash.com/photo-1557838429-06a189a5cb26?q=80&w=1280&auto=format&fit=crop",
+]
+
+# Keywords used to keep AI-related entries from general feeds
+AI_KEYWORDS = ['ai', 'artificial intelligence', 'machine learning', 'deep learning', 'neural network', 'gpt', 'llm']
+
+# Query parameters that identify a campaign rather than an article
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'ocid', 'cmpid'}
+ARTICLE_ID_LENGTH = 16  # Hex digits of the link digest kept as the article ID
+
+def canonical_link(link):
+    """Normalize a link so variants of the same article URL compare equal
+
+    The scheme, fragment, tracking parameters, a leading 'www.', default
+    ports and a trailing slash are dropped; the host is lowercased and the
+    remaining query parameters are sorted.
+    """
+    parts = urlsplit((link or '').strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS)
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else '')
+
+def article_id(link):
+    """Stable article ID: a prefix of the SHA-256 of the canonical link
+
+    Unlike hash(), the digest is the same in every process and across restarts,
+    so clients can keep IDs between refreshes.
+    """
+    return hashlib.sha256(canonical_link(link).encode('utf-8')).hexdigest()[:ARTICLE_ID_LENGTH]
+
+def extract_first_paragraph(html_content, max_words=50):
+    """Extract first paragraph from HTML content, limited to max_words"""
+    if not html_content:
+        return ""
+    
+    soup = BeautifulSoup(html_content, 'html.parser')
+    
+    # Remove any script or style elements
+    for script in soup(["script", "style"]):
+        script.extract()
+    
+    # Find the first paragraph
+    paragraph = soup.find('p')
+    if paragraph:
+        text = paragraph.get_text().strip()
+    else:
+        # If no paragraph, just get the text
+        text = soup.get_text().strip()
+    
+    # Clean up the text; BeautifulSoup already decoded its entities
+    text = clean_text(text, unescape=False)
+    
+    # Split into words and limit to max_words
+    words = text.split()
+    if len(words) > max_words:
+        text = ' '.join(words[:max_words]) + '...'
+    
+    return text
+
+# Unicode punctuation and spacing folded to plain equivalents, applied after
+# HTML entities are unescaped so '&rsquo;' and '\u2019' end up the same
+TEXT_TRANSLATION = {
+    '\u2018': "'",  # Left single quotation mark
+    '\u2019': "'",  # Right single quotation mark
+    '\u201a': "'",  # Single low-9 quotation mark
+    '\u201b': "'",  # Single high-reversed-9 quotation mark
+    '\u2032': "'",  # Prime
+    '\u201c': '"',  # Left double quotation mark
+    '\u201d': '"',  # Right double quotation mark
+    '\u201e': '"',  # Double low-9 quotation mark
+    '\u201f': '"',  # Double high-reversed-9 quotation mark
+    '\u2033': '"',  # Double prime
+    '\u2010': '-',  # Hyphen
+    '\u2011': '-',  # Non-breaking hyphen
+    '\u2012': '-',  # Figure dash
+    '\u2013': '-',  # En dash
+    '\u2014': '-',  # Em dash
+    '\u2015': '-',  # Horizontal bar
+    '\u2212': '-',  # Minus sign
+    '\u2026': '...',  # Ellipsis
+    '\u00a0': ' ',  # Non-breaking space
+    '\u2002': ' ', '\u2003': ' ', '\u2009': ' ', '\u200a': ' ',  # En, em, thin and hair spaces
+    '\u202f': ' ',  # Narrow non-breaking space
+    '\u00ad': '',  # Soft hyphen
+    '\u200b': '', '\u200c': '', '\u200d': '', '\u2060': '', '\ufeff': '',  # Zero-width characters
+}
+
+# One precomputed table for str.translate(); ASCII text skips it entirely
+TRANSLATION_TABLE = str.maketrans(TEXT_TRANSLATION)
+
+def _normalize(text, unescape=True):
+    """Unescape entities and fold the translation table, leaving whitespace as is"""
+    if unescape and '&' in text:
+        text = html.unescape(text)
+    if not text.isascii():
+        text = text.translate(TRANSLATION_TABLE)
+    return text
+
+def clean_text(text, unescape=True):
+    """Clean up text by unescaping HTML entities, folding Unicode punctuation and collapsing whitespace
+
+    Pass unescape=False for text that was already decoded (e.g. by an HTML
+    parser), so literal entities in it are kept.
+    """
+    if not text:
+        return ""
+    return ' '.join(_normalize(text, unescape).split())
+
+def normalize_articles(articles):
+    """Clean the titles of a refresh batch in place
+
+    Summaries are already cleaned by extract_first_paragraph(); cleaning them
+    again would unescape literal entities such as '&amp;lt;' twice.
+    """
+    for article in articles:
+        article['title'] = clean_text(article['title'])
+    return articles
+
+def is_ai_related(entry, keywords):
+    """Check if entry is related to AI based on keywords"""
+    try:
+        if not keywords:
+            # If no keywords provided, include all articles
+            return True
+            
+        # Convert all content to lowercase for case-insensitive matching
+        title = entry.title.lower() if hasattr(entry, 'title') else ''
+        summary = ''
+        
+        if hasattr(entry, 'summary'):
+            summary = entry.summary.lower()
+        elif hasattr(entry, 'description'):
+            summary = entry.description.lower()
+            
+        # Check if any keyword is in title or summary
+        for keyword in keywords:
+            if keyword.lower() in title or keyword.lower() in summary:
+                return True
+                
+        return False
+    except Exception as e:
+        logger.error(f"Error in is_ai_related: {str(e)}")
+        return False
+
+def get_feed_image(entry):
+    """Extract image URL from the feed entry itself, without any network access"""
+    # Method 1: Check for media_thumbnail
+    if hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
+        return entry.media_thumbnail[0]['url']
+        
+    # Method 2: Check for media content
+    if hasattr(entry, 'media_content') and entry.media_content:
+        for media in entry.media_content:
+            if media.get('type', '').startswith('image/'):
+                return media['url']
+            # Some feeds don't specify type but still contain image URLs
+            if 'url' in media and (media['url'].endswith('.jpg') or 
+                                  media['url'].endswith('.jpeg') or 
+                                  media['url'].endswith('.png')):  
+                return media['url']
+    
+    # Method 3: Check for enclosures
+    if hasattr(entry, 'enclosures') and entry.enclosures:
+        for enclosure in entry.enclosures:
+            if enclosure.get('type', '').startswith('image/'):
+                return enclosure.get('href', enclosure.get('url', ''))
+    
+    # Method 4: Check for content field
+    if hasattr(entry, 'content') and entry.content:
+        for content in entry.content:
+            if 'value' in content:
+                soup = BeautifulSoup(content['value'], 'html.parser')
+                img = soup.find('img')
+                if img and img.get('src'):
+                    # Avoid small icons and tracking pixels
+                    if not (img.get('width') and int(img['width']) < 50) and not \
+                       (img.get('height') and int(img['height']) < 50):
+                        # Make sure we're not grabbing an icon or tiny image
+                        if not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
+                            return img['src']
+    
+    # Method 5: Parse HTML in summary
+    if hasattr(entry, 'summary'):
+        soup = BeautifulSoup(entry.summary, 'html.parser')
+        imgs = soup.find_all('img')
+        for img in imgs:
+            # Avoid small icons and tracking pixels by checking src and dimensions
+            if img.get('src'):
+                # Skip probable logos/icons
+                if not (img.get('width') and int(img['width']) < 50) and not \
+                   (img.get('height') and int(img['height']) < 50):
+                    # Make sure we're not grabbing an icon or tiny image
+                    if not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
+                        return img['src']
+    
+    return None
+
+def find_page_image(html, link):
+    """Look for the lead image in an article page's HTML"""
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # First look for Open Graph image meta tag (most accurate for article image)
+    og_image = soup.find('meta', property='og:image')
+    if og_image and og_image.get('content'):
+        return og_image['content']
+    
+    # Then look for Twitter image card
+    twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
+    if twitter_image and twitter_image.get('content'):
+        return twitter_image['content']
+    
+    # Finally look for article-specific images
+    article_tag = soup.find('article') or soup.find('main') or soup
+    imgs = article_tag.find_all('img')
+    for img in imgs:
+        if img.get('src') and not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
+            if img.get('width') and int(img['width']) >= 200 or img.get('height') and int(img['height']) >= 200:
+                # Found a reasonably sized image
+                src = img['src']
+                # Fix relative URLs
+                if src.startswith('//'):
+                    src = 'https:' + src
+                elif src.startswith('/'):
+                    # Extract domain from entry link
+                    domain = '{uri.scheme}://{uri.netloc}'.format(uri=urlparse(link))
+                    src = domain + src
+                return src
+    return None
+
+def fetch_page_image(link, deadline=None):
+    """Fetch the full article page and look for its lead image (Method 6)"""
+    try:
+        # The health registry skips hosts whose circuit is open and adapts the timeout to observed latency
+        response = health_registry.fetch(link, deadline=deadline)
+        if response.status_code == 200:
+            return find_page_image(response.text, link)
+    except (CircuitOpenError, BudgetExceededError) as e:
+        logger.info(f"Skipping article page fetch: {e}")
+    except Exception as e:
+        logger.info(f"Couldn't extract image from article content: {e}")
+    
+    return None
+
+def placeholder_image(link):
+    """Pick a fallback image deterministically so the same article always gets the same one"""
+    digest = hashlib.md5((link or '').encode('utf-8')).hexdigest()
+    return FALLBACK_IMAGES[int(digest, 16) % len(FALLBACK_IMAGES)]
+
+def get_article_image(entry, deadline=None):
+    """Extract image URL from feed entry, fetching the article page only within the deadline"""
+    try:
+        image = get_feed_image(entry) or fetch_page_image(entry.link, deadline=deadline)
+        if image:
+            return image
+        
+        # If all else fails, fallback to a placeholder image
+        fallback = placeholder_image(entry.get('link'))
+        logger.info(f"Using fallback image for {entry.get('title', 'Unknown title')}: {fallback}")
+        return fallback
+    except Exception as e:
+        logger.error(f"Error extracting image: {e}")
+        return placeholder_image(entry.get('link'))
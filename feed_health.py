@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Per-host health tracking for upstream fetches (RSS feeds and article pages)
+
+Each host gets a circuit breaker and an adaptive timeout:
+- After FAILURE_THRESHOLD consecutive failures the circuit opens and requests
+  to that host are skipped until the backoff expires
+- Once the backoff expires a single probe request is let through (half-open);
+  success closes the circuit, failure re-opens it with a doubled backoff
+- Timeouts follow the observed latency of the host (p95 of recent successful
+  requests times a safety factor), clamped between MIN_TIMEOUT and MAX_TIMEOUT
+"""
+import logging
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import feedparser
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Breaker settings
+FAILURE_THRESHOLD = 3       # Consecutive failures before the circuit opens
+BASE_BACKOFF = 30           # Seconds to wait before the first probe
+MAX_BACKOFF = 1800          # Never wait longer than 30 minutes between probes
+
+# Adaptive timeout settings
+DEFAULT_TIMEOUT = 3.0       # Used until we have enough latency samples
+MIN_TIMEOUT = 1.0
+MAX_TIMEOUT = 10.0
+TIMEOUT_FACTOR = 2.0        # Timeout = p95 latency * factor
+LATENCY_WINDOW = 50         # Number of recent latencies kept per host
+MIN_SAMPLES = 5
+
+# Total time budget for one refresh of all feeds
+REFRESH_BUDGET = 60
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is skipped because the host's circuit is open"""
+
+
+class BudgetExceededError(Exception):
+    """Raised when a request is skipped because the refresh budget is spent"""
+
+
+def _percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers (nearest rank)"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class HostHealth:
+    """Circuit breaker and latency statistics for a single host"""
+
+    def __init__(self, host):
+        self.host = host
+        self.state = 'closed'
+        self.failures = 0
+        self.backoff = BASE_BACKOFF
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.total_requests = 0
+        self.total_failures = 0
+        self.last_error = None
+
+    def timeout(self):
+        """Current timeout for this host, based on recent latency"""
+        if len(self.latencies) < MIN_SAMPLES:
+            return DEFAULT_TIMEOUT
+        adaptive = _percentile(self.latencies, 95) * TIMEOUT_FACTOR
+        return max(MIN_TIMEOUT, min(MAX_TIMEOUT, adaptive))
+
+    def allow(self, now):
+        """Check whether a request may be sent to this host right now"""
+        if self.state == 'closed':
+            return True
+        if self.state == 'open' and now - self.opened_at >= self.backoff:
+            # Backoff expired, let a single probe through
+            self.state = 'half-open'
+        if self.state == 'half-open' and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self, latency):
+        """Record a successful request and close the circuit"""
+        self.total_requests += 1
+        self.latencies.append(latency)
+        if self.state != 'closed':
+            logger.info(f"Circuit for {self.host} closed after successful probe")
+        self.state = 'closed'
+        self.failures = 0
+        self.backoff = BASE_BACKOFF
+        self.opened_at = None
+        self.probe_in_flight = False
+
+    def record_failure(self, error, now):
+        """Record a failed request, opening the circuit if needed"""
+        self.total_requests += 1
+        self.total_failures += 1
+        self.failures += 1
+        self.last_error = str(error)
+        if self.state == 'half-open':
+            # Probe failed, back off exponentially
+            self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+            self.state = 'open'
+            self.opened_at = now
+            logger.warning(f"Probe to {self.host} failed, circuit re-opened for {self.backoff}s")
+        elif self.state == 'closed' and self.failures >= FAILURE_THRESHOLD:
+            self.state = 'open'
+            self.opened_at = now
+            logger.warning(f"Circuit for {self.host} opened after {self.failures} failures")
+        self.probe_in_flight = False
+
+    def to_dict(self, now):
+        """Serializable view of this host's health for /debug"""
+        retry_in = None
+        if self.state == 'open':
+            retry_in = max(0, round(self.opened_at + self.backoff - now, 1))
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'backoff': self.backoff,
+            'retry_in': retry_in,
+            'timeout': round(self.timeout(), 2),
+            'p50_latency': round(_percentile(self.latencies, 50), 3) if self.latencies else None,
+            'p95_latency': round(_percentile(self.latencies, 95), 3) if self.latencies else None,
+            'requests': self.total_requests,
+            'failures': self.total_failures,
+            'last_error': self.last_error
+        }
+
+
+class HealthRegistry:
+    """Tracks HostHealth for every upstream host and performs guarded fetches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _get(self, url):
+        host = urlparse(url).netloc.lower()
+        health = self._hosts.get(host)
+        if health is None:
+            health = self._hosts[host] = HostHealth(host)
+        return health
+
+    def _admit(self, url, deadline):
+        """Return (health, timeout) for a request, or raise if it must be skipped"""
+        now = time.monotonic()
+        with self._lock:
+            health = self._get(url)
+            timeout = health.timeout()
+            if deadline is not None:
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise BudgetExceededError(f"Refresh budget exhausted before fetching {url}")
+                timeout = min(timeout, remaining)
+            if not health.allow(now):
+                raise CircuitOpenError(f"Circuit open for {health.host}")
+        return health, timeout
+
+    def _record(self, health, start, error=None):
+        with self._lock:
+            if error is not None:
+                health.record_failure(error, time.monotonic())
+            else:
+                health.record_success(time.monotonic() - start)
+
+    def _release(self, health):
+        """Free the probe slot of a request that ended without a verdict on the host"""
+        with self._lock:
+            health.probe_in_flight = False
+
+    def fetch(self, url, deadline=None, session=None, **kwargs):
+        """GET a url through the host's circuit breaker with an adaptive timeout
+
+        deadline is an optional time.monotonic() value; the timeout is capped
+        so that the request never runs past it. Pass a requests.Session to
+        reuse its connection pool.
+        """
+        health, timeout = self._admit(url, deadline)
+        headers = kwargs.pop('headers', None) or {'User-Agent': USER_AGENT}
+        start = time.monotonic()
+        try:
+            response = (session or requests).get(url, headers=headers, timeout=timeout, **kwargs)
+            if response.status_code >= 500 or response.status_code == 429:
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+        except Exception as e:
+            self._record(health, start, e)
+            raise
+        except BaseException:
+            self._release(health)
+            raise
+        self._record(health, start)
+        return response
+
+    async def fetch_async(self, url, session, deadline=None):
+        """fetch() for asyncio callers with an aiohttp.ClientSession
+
+        Returns (status, headers, body) once the whole body has been read.
+        """
+        import aiohttp
+
+        health, timeout = self._admit(url, deadline)
+        start = time.monotonic()
+        try:
+            async with session.get(url, headers={'User-Agent': USER_AGENT},
+                                   timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                body = await response.read()
+                if response.status >= 500 or response.status == 429:
+                    raise aiohttp.ClientResponseError(response.request_info, (), status=response.status,
+                                                      message=f"HTTP {response.status}")
+                result = response.status, response.headers, body
+        except Exception as e:
+            self._record(health, start, e)
+            raise
+        except BaseException:
+            # Cancelled, e.g. by async_server.enrich() at its deadline: no verdict on the host, but a
+            # half-open probe must not stay in flight forever
+            self._release(health)
+            raise
+        self._record(health, start)
+        return result
+
+    def snapshot(self):
+        """Return the health of every known host"""
+        now = time.monotonic()
+        with self._lock:
+            return {host: health.to_dict(now) for host, health in sorted(self._hosts.items())}
+
+
+# Shared registry used by both app entry points
+health_registry = HealthRegistry()
+
+
+def fetch_feed(url, deadline=None):
+    """Download and parse an RSS feed through the health registry
+
+    feedparser.parse(url) has no timeout of its own, so the feed is fetched
+    with requests and the raw bytes are handed to feedparser.
+    """
+    response = health_registry.fetch(url, deadline=deadline)
+    response.raise_for_status()
+    return feedparser.parse(response.content, response_headers={
+        'content-location': url,
+        'content-type': response.headers.get('content-type', 'application/xml')
+    })
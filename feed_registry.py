@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+File-driven feed registry with hot reload and consistent-hash sharding
+
+Feeds are read from feeds.json (or FEEDS_FILE). The file is re-read whenever
+its modification time changes, so feeds can be added or tuned without a
+restart. Each feed may set:
+- limit: maximum articles kept from the feed per refresh
+- priority: higher priority feeds are fetched first
+- poll_interval: minimum seconds between polls of the feed
+- weight: multiplier for the ranking score of the feed's articles
+"""
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEEDS_FILE = os.environ.get('FEEDS_FILE', os.path.join(BASE_DIR, 'feeds.json'))
+
+DEFAULTS = {
+    'limit': 5,
+    'priority': 0,
+    'poll_interval': 1800,
+    'weight': 1.0
+}
+
+VIRTUAL_NODES = 100  # Points per shard on the hash ring
+
+
+class FeedRegistry:
+    """The configured feeds, reloaded from disk when the file changes
+
+    Pass feeds to use a fixed in-memory list instead of a file.
+    """
+
+    def __init__(self, path=FEEDS_FILE, feeds=None):
+        self.path = None if feeds is not None else path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._feeds = []
+        if feeds is not None:
+            self._feeds = self._normalize({'feeds': feeds})
+        else:
+            self.reload()
+
+    def _normalize(self, data):
+        defaults = dict(DEFAULTS, **data.get('defaults', {}))
+        feeds = []
+        seen = set()
+        for feed in data.get('feeds', []):
+            if not feed.get('url') or not feed.get('name'):
+                logger.warning(f"Skipping feed without url or name: {feed}")
+                continue
+            if feed['url'] in seen:
+                logger.warning(f"Skipping duplicate feed: {feed['url']}")
+                continue
+            seen.add(feed['url'])
+            feeds.append({
+                'url': feed['url'],
+                'name': feed['name'],
+                'website': feed.get('website', ''),
+                'logo': feed.get('logo', ''),
+                'limit': int(feed.get('limit', defaults['limit'])),
+                'priority': int(feed.get('priority', defaults['priority'])),
+                'poll_interval': int(feed.get('poll_interval', defaults['poll_interval'])),
+                'weight': float(feed.get('weight', defaults['weight']))
+            })
+        # Highest priority first; stable for equal priorities
+        feeds.sort(key=lambda f: -f['priority'])
+        return feeds
+
+    def reload(self):
+        """Re-read the registry file if it changed since the last load"""
+        if not self.path:
+            return False
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self._mtime:
+                return False
+            with open(self.path, 'r') as f:
+                feeds = self._normalize(json.load(f))
+            with self._lock:
+                self._feeds = feeds
+                self._mtime = mtime
+            logger.info(f"Loaded {len(feeds)} feeds from {self.path}")
+            return True
+        except Exception as e:
+            # Keep serving the last good registry
+            logger.error(f"Error loading feed registry {self.path}: {e}")
+            return False
+
+    def feeds(self):
+        """Current feeds, highest priority first"""
+        self.reload()
+        with self._lock:
+            return list(self._feeds)
+
+    def source_weights(self):
+        """Source name -> ranking weight"""
+        return {feed['name']: feed['weight'] for feed in self.feeds()}
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to shard names"""
+
+    def __init__(self, shards, virtual_nodes=VIRTUAL_NODES):
+        self._ring = []
+        for shard in shards:
+            for n in range(virtual_nodes):
+                self._ring.append((self._hash(f"{shard}#{n}"), shard))
+        self._ring.sort()
+        self._keys = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def shard_for(self, key):
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+def shard_feeds(feeds, shard_count):
+    """Split feeds into shard_count lists by consistent hashing of their URLs
+
+    Adding or removing a shard only moves the feeds that hashed to it, so
+    per-shard state (like the entry memo) stays warm for everything else.
+    """
+    ring = HashRing(range(shard_count))
+    shards = [[] for _ in range(shard_count)]
+    for feed in feeds:
+        shards[ring.shard_for(feed['url'])].append(feed)
+    return shards
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Local image proxy with resized variants
+
+Article images are served from /img/<article-id>?w=<width>&v=<version>
+instead of the publisher's full-size URL:
+- Each source image is fetched once through a pooled HTTP session (and the
+  upstream circuit breakers) and kept in a size-bounded on-disk LRU cache
+- Variants are resized and recompressed to a few fixed widths with Pillow;
+  without Pillow the original bytes are served as they are
+- Sources are only fetched over http(s) from public addresses (unless
+  private ones are allowed, e.g. for the local stand-ins), redirects
+  included, and reading stops past MAX_SOURCE_BYTES
+- The version is a digest of the source URL, so a proxied URL never changes
+  content and is served with immutable cache headers
+"""
+import hashlib
+import io
+import ipaddress
+import logging
+import os
+import socket
+import threading
+from collections import OrderedDict, namedtuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from feed_health import health_registry
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; variants fall back to the original bytes
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGE_PROXY = os.environ.get('IMAGE_PROXY', '1') != '0'
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'image_cache'))
+IMAGE_CACHE_BYTES = int(os.environ.get('IMAGE_CACHE_BYTES', 200 * 1024 * 1024))
+
+VARIANT_WIDTHS = (320, 640, 1280)
+DEFAULT_WIDTH = 640
+JPEG_QUALITY = 80
+MAX_SOURCE_BYTES = 15 * 1024 * 1024  # Larger upstream images are not proxied
+MAX_REDIRECTS = 3
+# Lets the proxy fetch from private, loopback and link-local addresses, e.g. the local stand-ins
+IMAGE_PROXY_ALLOW_PRIVATE = os.environ.get('IMAGE_PROXY_ALLOW_PRIVATE', '0') == '1'
+READ_CHUNK = 64 * 1024
+BACKGROUND = (255, 255, 255)  # Transparent areas are flattened onto white
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+SHORT_CACHE_CONTROL = 'public, max-age=300'  # For requests with an outdated version
+
+ProxiedImage = namedtuple('ProxiedImage', ['body', 'content_type', 'etag', 'cache_control'])
+
+
+class ImageFetchError(Exception):
+    """The source image could not be fetched or decoded"""
+
+
+class DiskLRU:
+    """Files in a directory, evicted least recently used first above max_bytes"""
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        # Rebuild the index from disk, least recently used first
+        entries = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self.size += size
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._index:
+                return None
+            self._index.move_to_end(name)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Keeps the LRU order across restarts
+            return data
+        except OSError:
+            with self._lock:
+                self.size -= self._index.pop(name, 0)
+            return None
+
+    def put(self, name, data):
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.size += len(data) - self._index.pop(name, 0)
+            self._index[name] = len(data)
+            while self.size > self.max_bytes and len(self._index) > 1:
+                oldest, size = self._index.popitem(last=False)
+                self.size -= size
+                try:
+                    os.remove(os.path.join(self.directory, oldest))
+                except OSError:
+                    pass
+
+    def stats(self):
+        return {'files': len(self._index), 'bytes': self.size, 'max_bytes': self.max_bytes}
+
+
+def source_version(url):
+    """Short digest of a source URL, used to version proxied URLs"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:12]
+
+
+def sniff_content_type(data):
+    """Content type of an unconverted image from its magic bytes"""
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF8'):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def check_source(url, allow_private=False):
+    """Raise ImageFetchError unless url is http(s) on a host that resolves only to public addresses"""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ImageFetchError(f"Refusing to fetch image {url}: not an http(s) URL")
+    if allow_private:
+        return
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80),
+                                   type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise ImageFetchError(f"Error resolving image host {parts.hostname}: {e}")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not address.is_global or address.is_multicast:
+            raise ImageFetchError(f"Refusing to fetch image {url}: {address} is not a public address")
+
+
+def resize(data, width):
+    """Scale an image down to width pixels and recompress it as JPEG"""
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+            # JPEG has no alpha; a plain convert('RGB') would turn transparent areas black
+            image = image.convert('RGBA')
+            flattened = Image.new('RGB', image.size, BACKGROUND)
+            flattened.paste(image, mask=image.getchannel('A'))
+            image = flattened
+        elif image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+class ImageProxy:
+    """Maps article ids to their source images and serves resized variants"""
+
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, enabled=IMAGE_PROXY, allow_private=IMAGE_PROXY_ALLOW_PRIVATE):
+        self.enabled = enabled
+        self.cache_dir = cache_dir
+        self.allow_private = allow_private
+        self._cache = None
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def cache(self):
+        # Created lazily so importing the apps never touches the cache directory
+        if self._cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = DiskLRU(self.cache_dir)
+        return self._cache
+
+    def register(self, articles):
+        """Record the source image of every article in a newly published snapshot"""
+        sources = {str(article['id']): article['image'] for article in articles
+                   if str(article.get('image', '')).startswith(('http://', 'https://'))}
+        with self._lock:
+            self._sources = sources
+
+    def url_for(self, article, width=DEFAULT_WIDTH):
+        image = article.get('image', '')
+        return f"/img/{article['id']}?w={width}&v={source_version(image)}"
+
+    def proxy_articles(self, articles):
+        """Copies of articles whose images point at the proxy, with a srcset of every variant"""
+        if not self.enabled:
+            return articles
+        proxied = []
+        for article in articles:
+            if article and str(article.get('image', '')).startswith(('http://', 'https://')):
+                srcset = ', '.join(f"{self.url_for(article, width)} {width}w" for width in VARIANT_WIDTHS)
+                article = dict(article, image=self.url_for(article), imageSource=article['image'], srcset=srcset)
+            proxied.append(article)
+        return proxied
+
+    def source(self, article_id):
+        with self._lock:
+            return self._sources.get(str(article_id))
+
+    def _fetch_lock(self, key):
+        with self._lock:
+            return self._fetch_locks.setdefault(key, threading.Lock())
+
+    def _original(self, url, key):
+        """The source image bytes, fetched at most once while they stay cached"""
+        name = f"{key}-orig"
+        data = self.cache.get(name)
+        if data is not None:
+            return data
+        # Concurrent requests for the same image wait for a single fetch
+        try:
+            with self._fetch_lock(key):
+                data = self.cache.get(name)
+                if data is not None:
+                    return data
+                data = self._download(url)
+                self.cache.put(name, data)
+                return data
+        finally:
+            with self._lock:
+                self._fetch_locks.pop(key, None)
+
+    def _download(self, url):
+        """The body of an image URL, following redirects only to allowed hosts and reading at most MAX_SOURCE_BYTES"""
+        for _ in range(MAX_REDIRECTS + 1):
+            check_source(url, self.allow_private)
+            try:
+                response = health_registry.fetch(url, session=self.session, stream=True, allow_redirects=False)
+            except Exception as e:
+                raise ImageFetchError(f"Error fetching image {url}: {e}")
+            with response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers['Location'])
+                    continue
+                try:
+                    response.raise_for_status()
+                    length = response.headers.get('Content-Length')
+                    if length and length.isdigit() and int(length) > MAX_SOURCE_BYTES:
+                        raise ImageFetchError(f"Image too large: {url}")
+                    body = bytearray()
+                    for chunk in response.iter_content(READ_CHUNK):
+                        body += chunk
+                        if len(body) > MAX_SOURCE_BYTES:
+                            raise ImageFetchError(f"Image too large: {url}")
+                except ImageFetchError:
+                    raise
+                except Exception as e:
+                    raise ImageFetchError(f"Error fetching image {url}: {e}")
+                return bytes(body)
+        raise ImageFetchError(f"Too many redirects fetching image {url}")
+
+    def get(self, article_id, width=None, version=None):
+        """The proxied image for an article, or None if the id is unknown
+
+        Raises ImageFetchError if the source could not be fetched or decoded.
+        """
+        url = self.source(article_id)
+        if not url:
+            return None
+        if width not in VARIANT_WIDTHS:
+            # Snap to the nearest variant so arbitrary widths can't fill the cache
+            width = min(VARIANT_WIDTHS, key=lambda w: abs(w - (width or DEFAULT_WIDTH)))
+        current = source_version(url)
+        cache_control = IMMUTABLE_CACHE_CONTROL if version == current else SHORT_CACHE_CONTROL
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+        etag = f'"{current}-{width}"'
+
+        if Image is None:
+            data = self._original(url, key)
+            return ProxiedImage(data, sniff_content_type(data), f'"{current}"', cache_control)
+
+        name = f"{key}-{width}.jpg"
+        data = self.cache.get(name)
+        if data is None:
+            original = self._original(url, key)
+            try:
+                data = resize(original, width)
+            except Exception as e:
+                raise ImageFetchError(f"Error resizing image {url}: {e}")
+            self.cache.put(name, data)
+        return ProxiedImage(data, 'image/jpeg', etag, cache_control)
+
+    def stats(self):
+        return {'enabled': self.enabled, 'resize': Image is not None, 'allow_private': self.allow_private,
+                'sources': len(self._sources),
+                'cache': self.cache.stats() if self._cache is not None else None}
+
+
+# Shared proxy used by both app entry points
+image_proxy = ImageProxy()
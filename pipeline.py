@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Staged ingestion pipeline shared by api.py and pythonanywhereapp.py
+
+    fetch -> parse -> classify -> extract -> enrich -> dedupe -> publish
+
+Every stage has its own worker threads and reads from a bounded queue, so a
+slow stage applies backpressure to the stages before it instead of letting
+work pile up in memory. Per-stage timings are kept in last_stats for /debug.
+Network-bound stages (fetch, enrich) run wide, and feed parsing can be moved
+to a process pool by setting PIPELINE_PARSE_PROCESSES.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import feedparser
+
+from extraction import (AI_KEYWORDS, article_id, extract_first_paragraph, fetch_page_image, get_article_image,
+                        get_feed_image, is_ai_related, normalize_articles, placeholder_image)
+from entry_memo import EntryMemo, entry_key
+from feed_health import health_registry, REFRESH_BUDGET
+import topics
+
+logger = logging.getLogger(__name__)
+
+# Worker threads per stage
+STAGE_WORKERS = {
+    'fetch': 8,
+    'parse': 2,
+    'classify': 1,
+    'extract': 4,
+    'enrich': 8,
+    'dedupe': 1,
+    'publish': 1
+}
+QUEUE_SIZE = 64  # Items buffered in front of each stage
+PARSE_PROCESSES = int(os.environ.get('PIPELINE_PARSE_PROCESSES', 0))  # 0 parses in threads
+MAX_ARTICLES_PER_FEED = 5  # Used for feeds without their own limit
+
+# Deferred image enrichment (second refresh phase)
+ENRICH_DEADLINE = 30  # Seconds the background phase may spend resolving images
+ENRICH_WORKERS = 4
+
+# Timings of the most recent run, exposed in /debug
+last_stats = {}
+
+# Processed entries memoized across refreshes
+entry_memo = EntryMemo()
+
+# Per-feed state across refreshes: when each feed was last polled and what it produced
+_feed_state = {}
+_feed_state_lock = threading.Lock()
+
+_DONE = object()
+_parse_pool = None
+
+
+class Stage:
+    """One step of the pipeline
+
+    func takes one item and returns an iterable of output items (usually a
+    generator). If pool is given, func is run in that executor and must
+    return a picklable list.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=QUEUE_SIZE, pool=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pool = pool
+
+
+class StageStats:
+    """Counters and timings for one stage of a run"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy = 0.0      # Time spent in the stage function
+        self.blocked = 0.0   # Time spent waiting on a full downstream queue
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'workers': self.workers,
+            'in': self.items_in,
+            'out': self.items_out,
+            'errors': self.errors,
+            'busy_seconds': round(self.busy, 3),
+            'blocked_seconds': round(self.blocked, 3),
+            'wall_seconds': round(self.finished - self.started, 3) if self.started and self.finished else None
+        }
+
+
+class Pipeline:
+    """Runs items through a list of stages connected by bounded queues"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.stats = {}
+
+    def run(self, items):
+        """Feed items through every stage and return the output of the last one"""
+        self.stats = {stage.name: StageStats(stage.workers) for stage in self.stages}
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        output = queue.Queue()
+        remaining = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            outbox = queues[index + 1] if index + 1 < len(self.stages) else output
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(index, queues[index], outbox, remaining, lock),
+                                          name=f"pipeline-{stage.name}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        def feed():
+            for item in items:
+                queues[0].put(item)
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+
+        feeder = threading.Thread(target=feed, name='pipeline-feeder', daemon=True)
+        feeder.start()
+
+        results = []
+        while True:
+            item = output.get()
+            if item is _DONE:
+                break
+            results.append(item)
+
+        feeder.join()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _worker(self, index, inbox, outbox, remaining, lock):
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        with lock:
+            if stats.started is None:
+                stats.started = time.monotonic()
+
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            start = time.monotonic()
+            blocked = 0.0
+            produced = 0
+            try:
+                if stage.pool is not None:
+                    results = stage.pool.submit(stage.func, item).result()
+                else:
+                    results = stage.func(item)
+                for result in results:
+                    put_start = time.monotonic()
+                    outbox.put(result)
+                    blocked += time.monotonic() - put_start
+                    produced += 1
+                failed = False
+            except Exception as e:
+                logger.error(f"Error in pipeline stage {stage.name}: {e}")
+                failed = True
+            with lock:
+                stats.items_in += 1
+                stats.items_out += produced
+                stats.errors += failed
+                stats.busy += time.monotonic() - start - blocked
+                stats.blocked += blocked
+
+        with lock:
+            remaining[index] -= 1
+            last_worker = remaining[index] == 0
+            if last_worker:
+                stats.finished = time.monotonic()
+        if last_worker:
+            # Tell every worker of the next stage that no more items are coming
+            downstream = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            for _ in range(downstream):
+                outbox.put(_DONE)
+
+
+def parse_feed(item):
+    """Parse downloaded feed bytes into entries (runs in a process pool when enabled)"""
+    feed = feedparser.parse(item['content'], response_headers={
+        'content-location': item['source']['url'],
+        'content-type': item['content_type']
+    })
+    return [{'source': item['source'], 'entries': feed.entries}]
+
+
+def _get_parse_pool():
+    global _parse_pool
+    if PARSE_PROCESSES > 0 and _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(max_workers=PARSE_PROCESSES)
+    return _parse_pool
+
+
+class IngestionResult:
+    """Articles produced by one pipeline run"""
+
+    def __init__(self, articles, pending_images, stats, by_feed):
+        self.articles = articles
+        self.pending_images = pending_images
+        self.stats = stats
+        self.by_feed = by_feed  # Feed URL -> articles, for every feed that was fetched
+
+
+class Ingestion:
+    """Stage functions for one refresh, sharing its deadline and bookkeeping"""
+
+    def __init__(self, defer_images=True, budget=REFRESH_BUDGET, memo=None, prefetched=None):
+        self.defer_images = defer_images
+        self.memo = memo
+        self.prefetched = prefetched
+        self.deadline = time.monotonic() + budget
+        self.pending_images = []
+        self.by_feed = {}
+        self.seen_ids = set()
+        self.lock = threading.Lock()
+
+    def fetch(self, source):
+        """Download the raw feed through the upstream health registry"""
+        logger.info(f"Parsing feed: {source['url']}")
+        if self.prefetched is not None:
+            # Downloaded by the caller (e.g. with an async client); missing feeds failed to download
+            if source['url'] not in self.prefetched:
+                raise ValueError(f"Feed was not downloaded: {source['url']}")
+            content, content_type = self.prefetched[source['url']]
+            yield {'source': source, 'content': content, 'content_type': content_type}
+            return
+        response = health_registry.fetch(source['url'], deadline=self.deadline)
+        response.raise_for_status()
+        yield {
+            'source': source,
+            'content': response.content,
+            'content_type': response.headers.get('content-type', 'application/xml')
+        }
+
+    def classify(self, item):
+        """Keep the first AI-related entries of each feed
+
+        Entries already in the memo carry their processed article along and
+        skip the remaining stages' work.
+        """
+        source = item['source']
+        limit = source.get('limit', MAX_ARTICLES_PER_FEED)
+        with self.lock:
+            self.by_feed.setdefault(source['url'], [])
+        count = 0
+        for entry in item['entries']:
+            key = entry_key(source, entry) if self.memo is not None else None
+            cached = self.memo.get(key) if key else None
+            if cached is not None:
+                if not cached['related']:
+                    continue
+                yield {'source': source, 'entry': entry, 'key': key, 'article': cached['article'],
+                       'pending_image': cached['pending_image'], 'cached': True}
+            # Only process if AI-related or if this source has AI-specific feed
+            elif 'ai' in source['url'].lower() or is_ai_related(entry, AI_KEYWORDS):
+                yield {'source': source, 'entry': entry, 'key': key}
+            else:
+                if key:
+                    self.memo.put(key, {'related': False})
+                continue
+            count += 1
+            if count >= limit:
+                break
+        logger.info(f"Successfully parsed {count} articles from {source['name']}")
+
+    def extract(self, item):
+        """Build the article record from the entry's text fields"""
+        if item.get('cached'):
+            yield item
+            return
+        entry = item['entry']
+        source = item['source']
+
+        # Try to get the published date
+        published = entry.get('published_parsed')
+        if published:
+            published_date = datetime(*published[:6]).isoformat()
+        else:
+            published_date = datetime.now().isoformat()
+
+        # Extract summary
+        if 'summary' in entry:
+            summary = extract_first_paragraph(entry.summary, 50)
+        elif 'description' in entry:
+            summary = extract_first_paragraph(entry.description, 50)
+        else:
+            summary = "Read the full article for more information."
+
+        item['article'] = {
+            'id': article_id(entry.link),
+            'title': entry.title,
+            'summary': summary,
+            'link': entry.link,
+            'published': published_date,
+            'image': None,
+            'source': {
+                'name': source['name'],
+                'url': source.get('website', ''),
+                'logo': source.get('logo', '')
+            },
+            # Tagged once here; the memo keeps the tags with the rest of the article
+            'topics': topics.assign(entry.title, summary, entry.get('tags')),
+            'isHero': False
+        }
+        yield item
+
+    def enrich(self, item):
+        """Resolve the article image, or defer page lookups to the background phase"""
+        if item.get('cached') and (self.defer_images or not item['pending_image']):
+            yield item
+            return
+        entry = item['entry']
+        article = item['article']
+        try:
+            if not self.defer_images:
+                article['image'] = get_article_image(entry, deadline=self.deadline)
+                item['pending_image'] = False
+            else:
+                article['image'] = get_feed_image(entry)
+                if not article['image']:
+                    article['image'] = placeholder_image(entry.link)
+                    item['pending_image'] = True
+        except Exception as e:
+            logger.error(f"Error getting image: {str(e)}")
+            article['image'] = placeholder_image(entry.link)
+        if item['key']:
+            self.memo.put(item['key'], {'related': True, 'article': dict(article),
+                                        'pending_image': bool(item.get('pending_image'))})
+        yield item
+
+    def dedupe(self, item):
+        """Drop entries whose canonical link was already seen in this run"""
+        key = item['article']['id']
+        if key in self.seen_ids:
+            return
+        self.seen_ids.add(key)
+        yield item
+
+    def publish(self, item):
+        """Emit the public article record"""
+        with self.lock:
+            self.by_feed[item['source']['url']].append(item['article'])
+            if item.get('pending_image'):
+                self.pending_images.append(item['article']['link'])
+        yield item['article']
+
+    def build(self):
+        """Assemble the pipeline for this run"""
+        stages = [
+            Stage('fetch', self.fetch, STAGE_WORKERS['fetch']),
+            Stage('parse', parse_feed, STAGE_WORKERS['parse'], pool=_get_parse_pool()),
+            Stage('classify', self.classify, STAGE_WORKERS['classify']),
+            Stage('extract', self.extract, STAGE_WORKERS['extract']),
+            Stage('enrich', self.enrich, STAGE_WORKERS['enrich']),
+            Stage('dedupe', self.dedupe, STAGE_WORKERS['dedupe']),
+            Stage('publish', self.publish, STAGE_WORKERS['publish'])
+        ]
+        return Pipeline(stages)
+
+
+def ingest(feeds, defer_images=True, memo=entry_memo, prefetched=None):
+    """Run every feed through the pipeline and return the ordered articles
+
+    Pass memo=None to process every entry from scratch. prefetched maps feed
+    URLs to (content, content_type) already downloaded by the caller.
+    """
+    start = time.monotonic()
+    ingestion = Ingestion(defer_images=defer_images, memo=memo, prefetched=prefetched)
+    pipeline = ingestion.build()
+    # Titles are normalized here; summaries were cleaned when they were extracted
+    articles = order_articles(normalize_articles(list(pipeline.run(feeds))))
+
+    stats = {name: stage_stats.to_dict() for name, stage_stats in pipeline.stats.items()}
+    last_stats.clear()
+    last_stats.update({
+        'finished': datetime.now().isoformat(),
+        'seconds': round(time.monotonic() - start, 3),
+        'articles': len(articles),
+        'pending_images': len(ingestion.pending_images),
+        'memo': memo.stats() if memo is not None else None,
+        'stages': stats
+    })
+    if memo is not None:
+        memo.save()
+    return IngestionResult(articles, ingestion.pending_images, stats, ingestion.by_feed)
+
+
+def order_articles(articles):
+    """Deduplicate and sort newest first
+
+    Articles are copied with isHero cleared, so records shared with an earlier
+    snapshot are never mutated; the hero is picked by ranking.rank_views()
+    when the snapshot is published.
+    """
+    seen = set()
+    ordered = []
+    for article in articles:
+        if article['id'] in seen:
+            continue
+        seen.add(article['id'])
+        ordered.append(dict(article, isHero=False))
+
+    # Sort by published date (newest first)
+    ordered.sort(key=lambda x: x.get('published', ''), reverse=True)
+    return ordered
+
+
+def index_articles(articles):
+    """Map article ID -> (article, ETag) for single-article lookups
+
+    The ETag is a digest of the article's JSON, so it only changes when the
+    article itself does, not on every new snapshot version.
+    """
+    index = {}
+    for article in articles:
+        body = json.dumps(article, sort_keys=True, separators=(',', ':'))
+        index[str(article['id'])] = (article, '"%s"' % hashlib.sha256(body.encode('utf-8')).hexdigest()[:16])
+    return index
+
+
+def enrich_images(links, deadline_seconds=ENRICH_DEADLINE):
+    """Resolve images for the given article links within the deadline
+
+    Returns a dict of link -> image URL for every link resolved in time.
+    """
+    deadline = time.monotonic() + deadline_seconds
+    resolved = {}
+
+    executor = ThreadPoolExecutor(max_workers=ENRICH_WORKERS)
+    try:
+        futures = {executor.submit(fetch_page_image, link, deadline): link for link in links}
+        done, not_done = wait(futures, timeout=deadline_seconds)
+        for future in done:
+            try:
+                image = future.result()
+            except Exception as e:
+                logger.error(f"Error resolving image for {futures[future]}: {e}")
+                continue
+            if image:
+                resolved[futures[future]] = image
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return resolved
+
+
+def due_feeds(feeds, now):
+    """Feeds whose poll_interval has elapsed since they were last polled"""
+    with _feed_state_lock:
+        return [feed for feed in feeds
+                if now - _feed_state.get(feed['url'], {}).get('polled', 0) >= feed.get('poll_interval', 0)]
+
+
+def apply_images(resolved, patch, ingestor=None):
+    """Record images resolved by the background phase everywhere articles are kept"""
+    entry_memo.patch_images(resolved)
+    entry_memo.save()
+    if hasattr(ingestor, 'patch_images'):
+        ingestor.patch_images(resolved)
+    _patch_feed_state(resolved)
+    patch(resolved)
+
+
+def refresh(feeds, publish, patch=None, defer_images=True, ingestor=None, force=False, enricher=None):
+    """Ingest due feeds, publish the merged snapshot, then enrich images in the background
+
+    Only feeds whose poll_interval has elapsed are fetched (all of them with
+    force); the others keep the articles from their last successful poll.
+    ingestor(feeds, defer_images=...) defaults to ingest() in this process.
+
+    publish(articles) stores the new snapshot. If images were deferred,
+    patch(resolved) is later called from a background thread with a dict of
+    link -> image URL so the caller can update the live snapshot.
+    enricher(links, apply) replaces that thread; it must call apply(resolved).
+    Returns the snapshot version publish() returned.
+    """
+    now = time.time()
+    due = list(feeds) if force else due_feeds(feeds, now)
+    result = (ingestor or ingest)(due, defer_images=defer_images)
+
+    with _feed_state_lock:
+        for url, feed_articles in result.by_feed.items():
+            _feed_state[url] = {'polled': now, 'articles': feed_articles}
+        # Forget feeds that were removed from the registry
+        current = {feed['url'] for feed in feeds}
+        for url in list(_feed_state):
+            if url not in current:
+                del _feed_state[url]
+        merged = [article for feed in feeds for article in _feed_state.get(feed['url'], {}).get('articles', [])]
+
+    articles = order_articles(merged)
+    version = publish(articles)
+    logger.info(f"Fetched {len(result.articles)} articles from {len(result.by_feed)} of {len(feeds)} sources, "
+                f"published {len(articles)} (version {version})")
+
+    if result.pending_images and patch is not None:
+        def apply(resolved):
+            if resolved:
+                apply_images(resolved, patch, ingestor)
+
+        if enricher is not None:
+            enricher(result.pending_images, apply)
+            return version
+
+        def enrich():
+            start = time.monotonic()
+            resolved = enrich_images(result.pending_images)
+            logger.info(f"Image enrichment resolved {len(resolved)} of {len(result.pending_images)} images "
+                        f"in {time.monotonic() - start:.1f}s")
+            apply(resolved)
+
+        threading.Thread(target=enrich, name='image-enrichment', daemon=True).start()
+
+    return version
+
+
+def _patch_feed_state(resolved):
+    """Keep resolved images for feeds that are carried over to later snapshots"""
+    with _feed_state_lock:
+        for state in _feed_state.values():
+            state['articles'] = [
+                dict(article, image=resolved[article['link']]) if article['link'] in resolved else article
+                for article in state['articles']
+            ]
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Opt-in profiles of single requests and full refreshes, saved to disk
+
+Nothing is profiled, and no hook is installed, unless asked for:
+- PROFILE=requests profiles every request with cProfile; with ADMIN_TOKEN
+  set, an admin request carrying `X-Profile: 1` profiles just that request
+- PROFILE=refresh profiles every refresh with a wall-clock sampling profiler
+  across all threads (the pipeline stages run in their own threads, which a
+  cProfile of the calling thread would not see); POST /api/admin/refresh?profile=1
+  profiles one manual refresh
+- Request profiles are cProfile/pstats dumps (.prof; open with pstats,
+  snakeviz), refresh profiles are folded stacks (.folded; flamegraph.pl,
+  speedscope); both are written to PROFILE_DIR, keeping the PROFILE_KEEP newest
+
+Only one cProfile runs at a time; a request that asks while another is
+profiled is served unprofiled.
+"""
+import cProfile
+import itertools
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Outside the site directory, which the apps serve as static files; profiles are only downloadable by admins
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'nexusai-profiles'))
+PROFILE = {kind.strip() for kind in os.environ.get('PROFILE', '').lower().split(',') if kind.strip()}
+PROFILE_REQUESTS = bool(PROFILE & {'1', 'all', 'requests'})
+PROFILE_REFRESH = bool(PROFILE & {'1', 'all', 'refresh'})
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 50))
+SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_HEADER = 'X-Profile'
+
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+\.(prof|folded)$')
+LABEL_RE = re.compile(r'[^\w.-]+')
+
+_cprofile_lock = threading.Lock()  # Only one cProfile can be active per interpreter
+_sequence = itertools.count()
+
+
+def profile_path(kind, label, extension):
+    """A new path in PROFILE_DIR for a profile of `kind` ('request' or 'refresh')"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    label = LABEL_RE.sub('_', label).strip('_')[:80] or 'root'
+    return os.path.join(PROFILE_DIR, f"{stamp}-{os.getpid()}-{next(_sequence)}-{kind}-{label}.{extension}")
+
+
+def prune(keep=PROFILE_KEEP):
+    """Delete all but the `keep` newest profiles"""
+    for profile in list_profiles()[keep:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, profile['name']))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """Saved profiles, newest first"""
+    try:
+        names = [name for name in os.listdir(PROFILE_DIR) if PROFILE_NAME_RE.match(name)]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            continue
+        profiles.append({
+            'name': name,
+            'format': 'pstats' if name.endswith('.prof') else 'folded',
+            'bytes': stat.st_size,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(stat.st_mtime)),
+            'mtime': stat.st_mtime
+        })
+    profiles.sort(key=lambda profile: profile.pop('mtime'), reverse=True)
+    return profiles
+
+
+def find_profile(name):
+    """Path of a saved profile, or None for unknown or malformed names"""
+    if not PROFILE_NAME_RE.match(name or ''):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def wants_request_profile(header, authorization, authorized):
+    """Whether to profile a request, given its X-Profile and Authorization headers"""
+    return PROFILE_REQUESTS or (header == '1' and authorized(authorization))
+
+
+class RequestProfile:
+    """cProfile of one request; a no-op if another profile is running
+
+    Use as a context manager; the profile is saved when it exits.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.profiler = None
+        self.path = None
+
+    def __enter__(self):
+        if _cprofile_lock.acquire(blocking=False):
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # Another profiling tool (e.g. a debugger) is active
+                self.profiler = None
+                _cprofile_lock.release()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler is None:
+            return False
+        self.profiler.disable()
+        _cprofile_lock.release()
+        try:
+            self.path = profile_path('request', self.label, 'prof')
+            self.profiler.dump_stats(self.path)
+            prune()
+            logger.info(f"Saved request profile {os.path.basename(self.path)}")
+        except OSError as e:
+            logger.error(f"Error saving request profile: {e}")
+        return False
+
+
+class ProfilingMiddleware:
+    """WSGI middleware profiling the requests wants_request_profile() selects"""
+
+    def __init__(self, app, authorized):
+        self.app = app
+        self.authorized = authorized
+
+    def __call__(self, environ, start_response):
+        if not wants_request_profile(environ.get('HTTP_X_PROFILE'), environ.get('HTTP_AUTHORIZATION'),
+                                     self.authorized):
+            return self.app(environ, start_response)
+        label = f"{environ.get('REQUEST_METHOD', 'GET')} {environ.get('PATH_INFO', '')}"
+        with RequestProfile(label):
+            # Flask bodies are built by the view, so the profile covers the response too
+            return self.app(environ, start_response)
+
+
+def install(app, authorized, admin_enabled):
+    """Wrap a Flask app's WSGI callable when request profiles can be asked for; else leave it untouched"""
+    if PROFILE_REQUESTS or admin_enabled:
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app, authorized)
+
+
+class Sampler:
+    """Wall-clock sampling profiler of every thread, aggregated as folded stacks"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_label(code):
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, 'thread').replace(';', ':').replace(' ', '_'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def save_samples(label, sampler, start):
+    try:
+        path = profile_path('refresh', label, 'folded')
+        sampler.write(path)
+        prune()
+        logger.info(f"Saved refresh profile {os.path.basename(path)}: {sampler.samples} samples "
+                    f"in {time.monotonic() - start:.1f}s")
+    except OSError as e:
+        logger.error(f"Error saving refresh profile: {e}")
+
+
+def profile_refresh(label, run, force=False):
+    """run() under the sampling profiler if refreshes are profiled (or force), saving the profile"""
+    if not (force or PROFILE_REFRESH):
+        return run()
+    start = time.monotonic()
+    sampler = Sampler()
+    try:
+        with sampler:
+            return run()
+    finally:
+        # Saved even if the refresh failed
+        save_samples(label, sampler, start)
+
+
+async def profile_refresh_async(label, run, force=False):
+    """profile_refresh() for a coroutine function"""
+    if not (force or PROFILE_REFRESH):
+        return await run()
+    start = time.monotonic()
+    sampler = Sampler()
+    try:
+        with sampler:
+            return await run()
+    finally:
+        save_samples(label, sampler, start)
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for pythonanywhereapp.py; point the PythonAnywhere WSGI
+configuration file at `application`
+
+Starts the process (assets, archive compactor, cached snapshot) before the
+first request instead of on it.
+"""
+from pythonanywhereapp import app as application, init
+
+init()
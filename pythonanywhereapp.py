@@ -5,16 +5,26 @@ All-in-one Flask application for NexusAI News Hub
 - Provides API endpoints for news articles
 - Fetches articles from RSS feeds
 """
-import feedparser
-import requests
-from bs4 import BeautifulSoup
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, jsonify, send_from_directory, request, make_response, redirect, send_file
 from flask_cors import CORS
 from datetime import datetime
-import random
+import threading
 import logging
 import time
 import os
+import admin
+import assets
+from archive import archive, parse_range, MAX_QUERY_ARTICLES
+from feed_health import health_registry
+from image_proxy import image_proxy, ImageFetchError
+import pipeline
+import profiling
+from pipeline import refresh
+from feed_registry import FeedRegistry
+from changelog import Changelog
+from ranking import rank_views, map_views, page
+from sharding import build_ingestor
+from topics import FacetCache, TOPICS
 import json
 
 # Configure logging
@@ -27,39 +37,16 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
+# cProfile of requests, only when PROFILE=requests or an admin asks with X-Profile
+profiling.install(app, admin.authorized, bool(admin.ADMIN_TOKEN))
 
 # Get the directory of this script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# List of AI-related RSS feeds
-RSS_FEEDS = [
-    {
-        'url': 'https://techcrunch.com/category/artificial-intelligence/feed/',
-        'name': 'TechCrunch',
-        'website': 'https://techcrunch.com',
-        'logo': 'https://techcrunch.com/wp-content/uploads/2021/01/TechCrunch_logo.png'
-    },
-    {
-        'url': 'https://venturebeat.com/category/ai/feed/',
-        'name': 'VentureBeat',
-        'website': 'https://venturebeat.com',
-        'logo': 'https://venturebeat.com/wp-content/uploads/2018/09/venturebeat-logo-rec.png?w=192'
-    },
-    {
-        'url': 'https://www.wired.com/feed/tag/ai/latest/rss',
-        'name': 'Wired',
-        'website': 'https://www.wired.com',
-        'logo': 'https://www.wired.com/assets/logo-header.png'
-    }
-]
-
-# Fallback images if no image is found in the feed
-FALLBACK_IMAGES = [
-    'https://images.unsplash.com/photo-1677442135046-c10d516d84c6?q=100&w=2000&auto=format&fit=crop',
-    'https://images.unsplash.com/photo-1529107386315-e1a2ed48a620?q=100&w=2000&auto=format&fit=crop',
-    'https://images.unsplash.com/photo-1532187863486-abf9dbad1b69?q=100&w=2000&auto=format&fit=crop',
-    'https://images.unsplash.com/photo-1620712943543-bcc4688e7485?q=100&w=2000&auto=format&fit=crop'
-]
+# Feed registry, hot-reloaded from feeds.json
+feed_registry = FeedRegistry()
+# Ingests in this process unless INGEST_WORKERS or INGEST_NODE_COUNT are set
+ingestor = build_ingestor()
 
 # Sample data to use as fallback
 SAMPLE_ARTICLES = [
@@ -105,25 +92,36 @@ SAMPLE_ARTICLES = [
 # Cache for articles to reduce repeated parsing
 CACHED_ARTICLES = []
 LAST_UPDATED = None
+CACHE_VERSION = 0
+ARTICLE_INDEX = {}  # Article ID -> (article, ETag) for /api/articles/<id>
+RANKED_VIEWS = None  # Ranked hero and front page (ranking.RankedViews) of CACHED_ARTICLES
+cache_lock = threading.Lock()
+changelog = Changelog()  # Per-version article changes for /api/articles/changes
+# Per-topic and per-source article lists of RANKED_VIEWS for /api/articles?topic=&source=
+facet_cache = FacetCache(lambda article: json.dumps(image_proxy.proxy_articles([article])[0]))
 CACHE_TIMEOUT = 3600  # 1 hour in seconds
 CACHE_FILE = os.path.join(BASE_DIR, 'articles_cache.json')
 
 def load_cached_articles():
     """Load articles from cache file if it exists"""
-    global CACHED_ARTICLES, LAST_UPDATED
+    global CACHED_ARTICLES, LAST_UPDATED, ARTICLE_INDEX, RANKED_VIEWS
     
     try:
         if os.path.exists(CACHE_FILE):
             with open(CACHE_FILE, 'r') as f:
                 cache_data = json.load(f)
-                CACHED_ARTICLES = cache_data.get('articles', [])
+                RANKED_VIEWS = rank_views(cache_data.get('articles', []), feed_registry.source_weights())
+                CACHED_ARTICLES = RANKED_VIEWS.articles
                 LAST_UPDATED = cache_data.get('timestamp')
+                ARTICLE_INDEX = pipeline.index_articles(CACHED_ARTICLES)
+                image_proxy.register(CACHED_ARTICLES)
                 logger.info(f"Loaded {len(CACHED_ARTICLES)} articles from cache file")
     except Exception as e:
         logger.error(f"Error loading cache file: {e}")
         # Fall back to sample data
         CACHED_ARTICLES = SAMPLE_ARTICLES
         LAST_UPDATED = time.time()
+        ARTICLE_INDEX = pipeline.index_articles(CACHED_ARTICLES)
 
 def save_cached_articles():
     """Save articles to cache file"""
@@ -137,185 +135,58 @@ def save_cached_articles():
     except Exception as e:
         logger.error(f"Error saving cache file: {e}")
 
-def parse_rss_feeds():
-    """Parse multiple RSS feeds and extract article information"""
-    logger.info("Starting to parse RSS feeds...")
-    all_articles = []
+def publish_articles(articles):
+    """Replace the cached articles with a freshly ingested snapshot"""
+    global CACHED_ARTICLES, LAST_UPDATED, CACHE_VERSION, ARTICLE_INDEX, RANKED_VIEWS
     
-    try:
-        for feed_source in RSS_FEEDS:
-            try:
-                logger.info(f"Parsing feed: {feed_source['url']}")
-                feed = feedparser.parse(feed_source['url'])
-                
-                for entry in feed.entries[:5]:  # Limit to 5 articles per feed
-                    # Extract article details
-                    article = {
-                        'id': random.randint(1000, 9999),
-                        'title': entry.get('title', 'Untitled Article'),
-                        'summary': _extract_summary(entry),
-                        'link': entry.get('link', ''),
-                        'published': entry.get('published', datetime.now().isoformat()),
-                        'image': _extract_image(entry),
-                        'source': {
-                            'name': feed_source['name'],
-                            'url': feed_source['website'],
-                            'logo': feed_source['logo']
-                        },
-                        'isHero': False
-                    }
-                    
-                    # Set the first article as hero
-                    if len(all_articles) == 0:
-                        article['isHero'] = True
-                    
-                    all_articles.append(article)
-                
-                logger.info(f"Successfully parsed {len(feed.entries[:5])} articles from {feed_source['name']}")
-                
-            except Exception as e:
-                logger.error(f"Error parsing feed {feed_source['url']}: {e}")
-    except Exception as e:
-        logger.error(f"Error in parse_rss_feeds: {e}")
-        # Return sample data if something goes wrong
-        return SAMPLE_ARTICLES
-    
-    if not all_articles:
+    if not articles:
         logger.warning("No articles parsed from feeds, falling back to sample data")
-        return SAMPLE_ARTICLES
+        articles = SAMPLE_ARTICLES
     
-    logger.info(f"Total articles parsed: {len(all_articles)}")
-    return all_articles
-
-def _extract_summary(entry):
-    """Extract and clean up article summary"""
-    # Try different fields that might contain the summary
-    if 'summary' in entry:
-        text = entry.summary
-    elif 'description' in entry:
-        text = entry.description
-    else:
-        return "No summary available"
+    # Rank once per snapshot; hero and front-page requests read the precomputed views
+    views = rank_views(articles, feed_registry.source_weights())
+    with cache_lock:
+        CACHED_ARTICLES = views.articles
+        RANKED_VIEWS = views
+        LAST_UPDATED = time.time()
+        CACHE_VERSION += 1
+        version = CACHE_VERSION
+        old_index, ARTICLE_INDEX = ARTICLE_INDEX, pipeline.index_articles(CACHED_ARTICLES)
+        changelog.record(version, old_index, ARTICLE_INDEX)
+        image_proxy.register(CACHED_ARTICLES)
+    facet_cache.get(views)
+    save_cached_articles()
+    archive.append(views.articles)
+    return version
+
+def patch_images(resolved):
+    """Patch images resolved by the background phase into the cached articles"""
+    global CACHED_ARTICLES, CACHE_VERSION, ARTICLE_INDEX, RANKED_VIEWS
     
-    # Clean up HTML
-    try:
-        soup = BeautifulSoup(text, 'html.parser')
-        # Remove script and style elements
-        for tag in soup(['script', 'style']):
-            tag.decompose()
-        
-        # Get text and clean it up
-        text = soup.get_text().strip()
-        # Normalize whitespace
-        text = ' '.join(text.split())
-        
-        # Limit length
-        if len(text) > 200:
-            text = text[:197] + '...'
-        
-        return text
-    except:
-        return "Summary extraction failed"
+    with cache_lock:
+        RANKED_VIEWS = map_views(get_views_locked(), lambda article: dict(
+            article, image=resolved[article['link']]) if article.get('link') in resolved else article)
+        CACHED_ARTICLES = RANKED_VIEWS.articles
+        CACHE_VERSION += 1
+        version = CACHE_VERSION
+        old_index, ARTICLE_INDEX = ARTICLE_INDEX, pipeline.index_articles(CACHED_ARTICLES)
+        changelog.record(version, old_index, ARTICLE_INDEX)
+        image_proxy.register(CACHED_ARTICLES)
+        patched = [article for article in CACHED_ARTICLES if article.get('link') in resolved]
+        views = RANKED_VIEWS
+    facet_cache.get(views)
+    save_cached_articles()
+    # Archive the copies with their resolved images; queries return the newest copy
+    archive.append(patched, update=True)
+    return version
 
-def _extract_image(entry):
-    """Extract image URL from feed entry"""
-    try:
-        # Method 1: Check for media_thumbnail
-        if hasattr(entry, 'media_thumbnail') and entry.media_thumbnail:
-            return entry.media_thumbnail[0]['url']
-            
-        # Method 2: Check for media content
-        if hasattr(entry, 'media_content') and entry.media_content:
-            for media in entry.media_content:
-                if media.get('type', '').startswith('image/'):
-                    return media['url']
-                # Some feeds don't specify type but still contain image URLs
-                if 'url' in media and (media['url'].endswith('.jpg') or 
-                                      media['url'].endswith('.jpeg') or 
-                                      media['url'].endswith('.png')):  
-                    return media['url']
-        
-        # Method 3: Check for enclosures
-        if hasattr(entry, 'enclosures') and entry.enclosures:
-            for enclosure in entry.enclosures:
-                if enclosure.get('type', '').startswith('image/'):
-                    return enclosure.get('href', enclosure.get('url', ''))
-        
-        # Method 4: Check for content field
-        if hasattr(entry, 'content') and entry.content:
-            for content in entry.content:
-                if 'value' in content:
-                    soup = BeautifulSoup(content['value'], 'html.parser')
-                    img = soup.find('img')
-                    if img and img.get('src'):
-                        # Avoid small icons and tracking pixels
-                        if not (img.get('width') and int(img['width']) < 50) and not \
-                           (img.get('height') and int(img['height']) < 50):
-                            # Make sure we're not grabbing an icon or tiny image
-                            if not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
-                                return img['src']
-        
-        # Method 5: Parse HTML in summary
-        if hasattr(entry, 'summary'):
-            soup = BeautifulSoup(entry.summary, 'html.parser')
-            imgs = soup.find_all('img')
-            for img in imgs:
-                # Avoid small icons and tracking pixels by checking src and dimensions
-                if img.get('src'):
-                    # Skip probable logos/icons
-                    if not (img.get('width') and int(img['width']) < 50) and not \
-                       (img.get('height') and int(img['height']) < 50):
-                        # Make sure we're not grabbing an icon or tiny image
-                        if not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
-                            return img['src']
-        
-        # Method 6: Fetch the full article to look for images (optimized for performance)
-        try:
-            # Only attempt this for entries where we couldn't find images
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(entry.link, headers=headers, timeout=3)  # 3-second timeout to not slow down the app
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # First look for Open Graph image meta tag (most accurate for article image)
-                og_image = soup.find('meta', property='og:image')
-                if og_image and og_image.get('content'):
-                    return og_image['content']
-                
-                # Then look for Twitter image card
-                twitter_image = soup.find('meta', attrs={'name': 'twitter:image'})
-                if twitter_image and twitter_image.get('content'):
-                    return twitter_image['content']
-                
-                # Finally look for article-specific images
-                article_tag = soup.find('article') or soup.find('main') or soup
-                imgs = article_tag.find_all('img')
-                for img in imgs:
-                    if img.get('src') and not any(word in img['src'].lower() for word in ['icon', 'logo', 'avatar', 'button', 'pixel', 'tracking']):
-                        if img.get('width') and int(img['width']) >= 200 or img.get('height') and int(img['height']) >= 200:
-                            # Found a reasonably sized image
-                            src = img['src']
-                            # Fix relative URLs
-                            if src.startswith('//'):
-                                src = 'https:' + src
-                            elif src.startswith('/'):
-                                # Extract domain from entry link
-                                from urllib.parse import urlparse
-                                domain = '{uri.scheme}://{uri.netloc}'.format(uri=urlparse(entry.link))
-                                src = domain + src
-                            return src
-        except Exception as e:
-            logger.info(f"Couldn't extract image from article content: {e}")
-        
-        # If all else fails, fallback to random image
-        fallback = random.choice(FALLBACK_IMAGES)
-        logger.info(f"Using fallback image for {entry.get('title', 'Unknown title')}: {fallback}")
-        return fallback
-    except Exception as e:
-        logger.error(f"Error extracting image: {e}")
-        return random.choice(FALLBACK_IMAGES)
+def refresh_articles(profile=False, force=True):
+    """Crawl the due feeds (every feed with force) and publish the result; returns its version"""
+    return profiling.profile_refresh('refresh_articles', lambda: refresh(
+        feed_registry.feeds(), publish_articles, patch_images, ingestor=ingestor, force=force), force=profile)
+
+# Request-driven and manual refreshes run one at a time in the background; see POST /api/admin/refresh
+refresh_trigger = admin.RefreshTrigger(refresh_articles)
 
 def get_articles(force_refresh=False):
     """Get articles, refreshing the cache if needed"""
@@ -325,22 +196,54 @@ def get_articles(force_refresh=False):
     current_time = time.time()
     if force_refresh or not CACHED_ARTICLES or not LAST_UPDATED or (current_time - LAST_UPDATED > CACHE_TIMEOUT):
         logger.info("Cache empty or expired, fetching new articles")
-        try:
-            CACHED_ARTICLES = parse_rss_feeds()
-            LAST_UPDATED = current_time
-            save_cached_articles()
-        except Exception as e:
-            logger.error(f"Error refreshing articles: {e}")
+        # Concurrent requests (and a manual refresh in flight) share one crawl
+        run = refresh_trigger.run(force=force_refresh)
+        if run and run['status'] == 'failed':
+            logger.error(f"Error refreshing articles: {run['error']}")
             if not CACHED_ARTICLES:
                 CACHED_ARTICLES = SAMPLE_ARTICLES
     
     return CACHED_ARTICLES
 
+def get_views_locked():
+    """Ranked views of CACHED_ARTICLES (call with cache_lock held)"""
+    global CACHED_ARTICLES, RANKED_VIEWS
+    
+    # Sample data set without publishing has no views yet
+    if RANKED_VIEWS is None or RANKED_VIEWS.articles is not CACHED_ARTICLES:
+        RANKED_VIEWS = rank_views(CACHED_ARTICLES, feed_registry.source_weights())
+        CACHED_ARTICLES = RANKED_VIEWS.articles
+    return RANKED_VIEWS
+
+def get_views():
+    """Ranked hero and front page, refreshing the cache if needed"""
+    get_articles()
+    with cache_lock:
+        return get_views_locked()
+
 # Routes for static files
 @app.route('/')
 def index():
     """Serve the main HTML page"""
-    return send_from_directory(BASE_DIR, 'index.html')
+    return send_asset('index.html') or send_from_directory(BASE_DIR, 'index.html')
+
+def send_asset(name):
+    """Send a built asset, picking the best precompressed variant the client accepts"""
+    asset = assets.resolve(name, request.headers.get('Accept-Encoding'))
+    if asset is None:
+        return None
+    path, content_type, encoding, cache_control = asset
+    response = send_file(path, mimetype=content_type, conditional=True, etag=True)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+@app.route('/assets/<path:name>')
+def fingerprinted_asset(name):
+    """Serve a minified, content-hashed asset with immutable caching"""
+    return send_asset('assets/' + name) or (jsonify({'error': 'Not found'}), 404)
 
 @app.route('/test')
 def test_endpoint():
@@ -354,59 +257,62 @@ def static_files(path):
 
 # API routes
 
+def build_summary(articles):
+    """Plain-text digest of the articles served by /api/summary"""
+    # Current date for the file
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    
+    # Create the text content
+    summary_text = f"NexusAI News Summary - {current_date}\n"
+    summary_text += "=" * 50 + "\n\n"
+    
+    if articles:
+        # Find a hero article (first article or one marked as hero)
+        hero_article = None
+        for article in articles:
+            if article.get('isHero'):
+                hero_article = article
+                break
+        
+        # If no hero found, use the first article
+        if not hero_article and articles:
+            hero_article = articles[0]
+        
+        # Add hero article
+        if hero_article:
+            summary_text += f"HEADLINE: {hero_article['title']}\n"
+            summary_text += f"SOURCE: {hero_article['source']['name']}\n"
+            summary_text += f"LINK: {hero_article['link']}\n\n"
+        
+        # Add other articles
+        summary_text += "OTHER STORIES:\n" + "-" * 50 + "\n\n"
+        
+        for article in articles:
+            # Skip the hero article if we found one
+            if hero_article and article == hero_article:
+                continue
+            
+            summary_text += f"TITLE: {article['title']}\n"
+            summary_text += f"SOURCE: {article['source']['name']}\n"
+            summary_text += f"LINK: {article['link']}\n\n"
+    else:
+        summary_text += "No articles available at this time.\n\n"
+    
+    # Add footer
+    summary_text += "=" * 50 + "\n"
+    summary_text += f"Generated by NexusAI News Hub on {current_date}\n"
+    return summary_text
+
 @app.route('/api/summary')
 def api_summary():
     """Generate a text summary of all articles"""
     try:
-        # Current date for the file
         current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # Create the text content
-        summary_text = f"NexusAI News Summary - {current_date}\n"
-        summary_text += "=" * 50 + "\n\n"
-        
-        # Get all articles
-        articles = get_articles()
-        
-        if articles:
-            # Find a hero article (first article or one marked as hero)
-            hero_article = None
-            for article in articles:
-                if article.get('isHero'):
-                    hero_article = article
-                    break
-            
-            # If no hero found, use the first article
-            if not hero_article and articles:
-                hero_article = articles[0]
-            
-            # Add hero article
-            if hero_article:
-                summary_text += f"HEADLINE: {hero_article['title']}\n"
-                summary_text += f"SOURCE: {hero_article['source']['name']}\n"
-                summary_text += f"LINK: {hero_article['link']}\n\n"
-            
-            # Add other articles
-            summary_text += "OTHER STORIES:\n" + "-" * 50 + "\n\n"
-            
-            for article in articles:
-                # Skip the hero article if we found one
-                if hero_article and article == hero_article:
-                    continue
-                
-                summary_text += f"TITLE: {article['title']}\n"
-                summary_text += f"SOURCE: {article['source']['name']}\n"
-                summary_text += f"LINK: {article['link']}\n\n"
-        else:
-            summary_text += "No articles available at this time.\n\n"
-        
-        # Add footer
-        summary_text += "=" * 50 + "\n"
-        summary_text += f"Generated by NexusAI News Hub on {current_date}\n"
+        summary = build_summary(get_articles())
         
         # Set response headers to make it a downloadable file
         from flask import make_response
-        response = make_response(summary_text)
+        response = make_response(summary)
         response.headers["Content-Disposition"] = f"attachment; filename=nexusai_news_summary_{current_date}.txt"
         response.headers["Content-Type"] = "text/plain"
         
@@ -417,59 +323,245 @@ def api_summary():
 
 @app.route('/api/articles')
 def api_articles():
-    """API endpoint to get all articles"""
+    """API endpoint to get all articles, or those of one topic and/or source
+
+    Filtered lists include the hero and are served from the lists prebuilt
+    for the snapshot.
+    """
     # Get limit parameter with default value
     limit = request.args.get('limit', default=12, type=int)
-    force_refresh = request.args.get('refresh', default=False, type=bool)
+    topic = request.args.get('topic')
+    source = request.args.get('source')
     
-    articles = get_articles(force_refresh)
+    views = get_views()
+    articles = views.articles
     
-    # Filter out hero article (which is returned by the /api/hero endpoint)
-    non_hero_articles = [a for a in articles if not a.get('isHero', False)][:limit]
+    if topic or source:
+        if topic and topic not in TOPICS:
+            return jsonify({'error': f"Unknown topic: {topic}", 'topics': list(TOPICS)}), 400
+        body = facet_cache.get(views).page_json(
+            topic, source, limit,
+            lastUpdated=datetime.fromtimestamp(LAST_UPDATED).isoformat() if LAST_UPDATED else None,
+            version=CACHE_VERSION, epoch=changelog.epoch)
+        return app.response_class(body, mimetype='application/json')
+    
+    # Best ranked articles without the hero (which is returned by the /api/hero endpoint)
+    non_hero_articles = page(views, limit, include_hero=False)
     
     return jsonify({
-        'articles': non_hero_articles,
+        'articles': image_proxy.proxy_articles(non_hero_articles),
         'lastUpdated': datetime.fromtimestamp(LAST_UPDATED).isoformat() if LAST_UPDATED else None,
-        'total': len(articles)
+        'total': len(articles),
+        'version': CACHE_VERSION,
+        'epoch': changelog.epoch
+    })
+
+@app.route('/api/archive')
+def api_archive():
+    """API endpoint to get archived articles published in a date range, optionally from one source
+
+    from/to are UTC dates or ISO timestamps; the range defaults to the last 7 days.
+    """
+    try:
+        start, end = parse_range(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = min(request.args.get('limit', default=100, type=int), MAX_QUERY_ARTICLES)
+    articles, total = archive.query(start, end, request.args.get('source'), limit)
+    return jsonify({
+        'articles': articles,
+        'total': total
     })
 
+@app.route('/api/articles/changes')
+def api_article_changes():
+    """API endpoint to get only the articles added, updated or removed since the client's snapshot version
+
+    Returns the new version with the current copy of every added or updated
+    article, the IDs of removed ones and the IDs of the hero and the first
+    `limit` articles in rank order, or reset=true when the client must
+    reload /api/articles.
+    """
+    since = request.args.get('since', default=0, type=int)
+    limit = request.args.get('limit', default=12, type=int)
+    get_articles()
+    with cache_lock:
+        version, index, views = CACHE_VERSION, ARTICLE_INDEX, get_views_locked()
+    delta = changelog.since(since, version, index, request.args.get('epoch'))
+    if delta is None:
+        return jsonify({'version': version, 'epoch': changelog.epoch, 'reset': True})
+    upserted, removed = delta
+    return jsonify({
+        'version': version,
+        'epoch': changelog.epoch,
+        'reset': False,
+        'upserted': image_proxy.proxy_articles(upserted),
+        'removed': removed,
+        'order': [article['id'] for article in page(views, limit + 1)]
+    })
+
+@app.route('/api/articles/<article_id>')
+def api_article(article_id):
+    """API endpoint to get a single article by its stable ID, with its own ETag"""
+    if not ARTICLE_INDEX:
+        get_articles()
+    entry = ARTICLE_INDEX.get(article_id)
+    if entry is None:
+        return jsonify({'error': 'Article not found'}), 404
+    article, etag = entry
+    if request.headers.get('If-None-Match') == etag:
+        response = make_response('', 304)
+    else:
+        response = jsonify({
+            'article': image_proxy.proxy_articles([article])[0],
+            'version': CACHE_VERSION
+        })
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/hero')
 def api_hero():
     """API endpoint to get only the hero article"""
-    force_refresh = request.args.get('refresh', default=False, type=bool)
-    
-    articles = get_articles(force_refresh)
-    
-    # Find the hero article
-    hero = next((article for article in articles if article.get('isHero', False)), None)
-    
-    # If no hero is designated, use the first article
-    if not hero and articles:
-        hero = articles[0]
+    # The hero was ranked when the snapshot was published
+    hero = get_views().hero
     
     return jsonify({
-        'article': hero,
-        'lastUpdated': datetime.fromtimestamp(LAST_UPDATED).isoformat() if LAST_UPDATED else None
+        'article': image_proxy.proxy_articles([hero])[0],
+        'lastUpdated': datetime.fromtimestamp(LAST_UPDATED).isoformat() if LAST_UPDATED else None,
+        'version': CACHE_VERSION
     })
 
+@app.route('/api/admin/refresh', methods=['POST'])
+def admin_refresh():
+    """Start a full refresh in the background (admin token required, rate limited per client)
+
+    Returns 202 with the id of the refresh; poll /api/admin/refresh/<id>
+    until it reports the version it published. Triggers while a full refresh
+    is in flight join it; one that finds a refresh of only the due feeds in
+    flight queues a full refresh after it. With profile=1 the refresh is profiled and the
+    profile shows up in /api/admin/profiles.
+    """
+    rejected = admin.check_refresh(request.remote_addr, request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    profile = request.args.get('profile') == '1'
+    run_id, coalesced = refresh_trigger.trigger(profile)
+    return jsonify({
+        'id': run_id,
+        'status': f"/api/admin/refresh/{run_id}",
+        'currentVersion': CACHE_VERSION,
+        'coalesced': coalesced,
+        'profiled': profile and not coalesced
+    }), 202
+
+@app.route('/api/admin/refresh/<run_id>')
+def admin_refresh_status(run_id):
+    """Status of a manual refresh: running, published (with its version) or failed (admin token required)"""
+    rejected = admin.check_admin(request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    run = refresh_trigger.status(run_id)
+    if run is None:
+        return jsonify({'error': 'Unknown refresh'}), 404
+    return jsonify(run)
+
+@app.route('/api/admin/profiles')
+def admin_profiles():
+    """List the saved request and refresh profiles, newest first (admin token required)"""
+    rejected = admin.check_admin(request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    return jsonify({'profiles': profiling.list_profiles()})
+
+@app.route('/api/admin/profiles/<name>')
+def admin_profile(name):
+    """Download a saved profile (admin token required)"""
+    rejected = admin.check_admin(request.headers.get('Authorization'))
+    if rejected is not None:
+        status, body, headers = rejected
+        return jsonify(body), status, headers
+    path = profiling.find_profile(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True, download_name=name)
+
 @app.route('/debug')
 def debug_info():
     """Debug endpoint to check app status"""
     return jsonify({
         'status': 'running',
         'articles_count': len(CACHED_ARTICLES),
+        'version': CACHE_VERSION,
         'cache_updated': datetime.fromtimestamp(LAST_UPDATED).isoformat() if LAST_UPDATED else None,
-        'feeds': RSS_FEEDS,
+        'feeds': feed_registry.feeds(),
+        'upstream_health': health_registry.snapshot(),
+        'pipeline': pipeline.last_stats,
+        'image_proxy': image_proxy.stats(),
+        'changelog': changelog.stats(),
+        'archive': archive.stats(),
+        'manual_refresh': dict(refresh_trigger.stats(), rate_limit=admin.refresh_limiter.stats()),
         'directories': {
             'base_dir': BASE_DIR,
             'files': os.listdir(BASE_DIR)
         }
     })
 
+@app.route('/img/<article_id>')
+def proxied_image(article_id):
+    """Serve a resized variant of an article's image from the local image cache"""
+    try:
+        image = image_proxy.get(article_id, request.args.get('w', type=int), request.args.get('v'))
+    except ImageFetchError as e:
+        logger.warning(str(e))
+        # Let the browser try the publisher directly
+        response = redirect(image_proxy.source(article_id))
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    if image is None:
+        return jsonify({'error': 'Unknown image'}), 404
+    if request.headers.get('If-None-Match') == image.etag:
+        response = make_response('', 304)
+    else:
+        response = make_response(image.body)
+        response.headers['Content-Type'] = image.content_type
+    response.headers['ETag'] = image.etag
+    response.headers['Cache-Control'] = image.cache_control
+    return response
+
 # When the app starts, try to load cached articles
-load_cached_articles()
+init_lock = threading.Lock()
+initialized = False
+
+def init():
+    """Start the process: assets, archive compactor and the cached snapshot
+
+    Runs once per process. It is not run at import, so ingestion worker
+    processes (which re-import the main module) and tests stay free of side
+    effects; pythonanywhere_wsgi.py, async_server.py and __main__ call it,
+    and the first request does if none did.
+    """
+    global initialized
+    with init_lock:
+        if initialized:
+            return
+        # Minified, fingerprinted and precompressed copies of the page assets
+        assets.build_or_none()
+        # Articles that dropped out of the snapshot stay queryable through /api/archive
+        archive.start_compactor()
+        load_cached_articles()
+        initialized = True
+
+@app.before_request
+def ensure_initialized():
+    if not initialized:
+        init()
 
 if __name__ == '__main__':
+    init()
     # If run directly, start the server
     port = int(os.environ.get('PORT', 5001))
     app.run(host='0.0.0.0', port=port, debug=True)
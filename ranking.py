@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Ranking of the published snapshot for hero and front-page selection
+
+Articles are scored as they are added:
+- Recency: the score halves every HALF_LIFE_HOURS since publication
+- Source weight: the feed's 'weight' in the feed registry (default 1.0)
+- Duplicate clusters: stories covered by several sources (titles sharing
+  most of their significant words) are boosted by CLUSTER_BOOST per copy
+
+The best k articles are kept in a min-heap while articles arrive, so ranking
+a snapshot never sorts all of it. rank_views() runs once per published
+snapshot; the hero and front page are then served from the precomputed views.
+"""
+import heapq
+import math
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+
+HALF_LIFE_HOURS = 12.0
+CLUSTER_BOOST = 0.5  # Added to the multiplier for every other article in the cluster
+CLUSTER_SIMILARITY = 0.5  # Jaccard similarity of title words for two articles to cluster
+FRONT_PAGE_SIZE = 12
+UNDATED_AGE_HOURS = 24 * 7  # Age assumed for articles without a parseable date
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset([
+    'about', 'after', 'again', 'against', 'also', 'amid', 'back', 'been', 'being', 'could', 'does', 'from',
+    'have', 'here', 'into', 'just', 'more', 'most', 'new', 'news', 'over', 'says', 'than', 'that', 'their',
+    'them', 'then', 'there', 'these', 'they', 'this', 'what', 'when', 'where', 'which', 'while', 'will',
+    'with', 'would', 'your'
+])
+
+RankedViews = namedtuple('RankedViews', ['articles', 'hero', 'front_page'])
+
+
+def title_words(title):
+    """Significant lowercased words of a title"""
+    return frozenset(word for word in WORD_RE.findall((title or '').lower())
+                     if len(word) > 3 and word not in STOPWORDS)
+
+
+def age_hours(published, now):
+    try:
+        published = datetime.fromisoformat(published)
+    except (TypeError, ValueError):
+        return UNDATED_AGE_HOURS
+    if published.tzinfo is not None:
+        published = published.astimezone(timezone.utc).replace(tzinfo=None)
+    return max(0.0, (now - published).total_seconds() / 3600)
+
+
+class Ranker:
+    """Scores articles as they are added and keeps the best k in a min-heap
+
+    Adding an article to a duplicate cluster raises the score of the whole
+    cluster; the raised members are pushed again and their outdated heap
+    entries are dropped when the top is read.
+    """
+
+    def __init__(self, k=FRONT_PAGE_SIZE + 1, source_weights=None, now=None):
+        self.k = k
+        self.source_weights = source_weights or {}
+        # Feed dates are UTC; compare them against naive UTC
+        self.now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        self.articles = {}  # Insertion order -> article
+        self.base_scores = {}  # Insertion order -> score before the cluster boost
+        self.scores = {}  # Insertion order -> current score
+        self._heap = []  # (score, -order): the earliest added wins ties
+        self._words = {}
+        self._word_index = {}  # Title word -> insertion orders of the articles using it
+        self._parent = {}  # Union-find over insertion orders
+        self._members = {}  # Cluster root -> insertion orders
+
+    def __len__(self):
+        return len(self.articles)
+
+    def _root(self, order):
+        while self._parent[order] != order:
+            self._parent[order] = self._parent[self._parent[order]]
+            order = self._parent[order]
+        return order
+
+    def _cluster(self, order, words):
+        """Join the clusters of similar earlier articles; returns the new root"""
+        self._parent[order] = order
+        self._members[order] = [order]
+        shared = {}
+        for word in words:
+            for other in self._word_index.get(word, ()):
+                shared[other] = shared.get(other, 0) + 1
+            self._word_index.setdefault(word, []).append(order)
+        root = order
+        for other, common in shared.items():
+            similarity = common / (len(words) + len(self._words[other]) - common)
+            if similarity < CLUSTER_SIMILARITY:
+                continue
+            other_root = self._root(other)
+            if other_root == root:
+                continue
+            # Merge the smaller cluster into the larger one
+            if len(self._members[other_root]) > len(self._members[root]):
+                other_root, root = root, other_root
+            self._parent[other_root] = root
+            self._members[root].extend(self._members.pop(other_root))
+        return root
+
+    def _push(self, order):
+        entry = (self.scores[order], -order)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def add(self, article):
+        order = len(self.articles)
+        self.articles[order] = article
+        source = article.get('source') or {}
+        weight = self.source_weights.get(source.get('name'), 1.0)
+        self.base_scores[order] = weight * math.pow(0.5, age_hours(article.get('published'), self.now)
+                                                    / HALF_LIFE_HOURS)
+        words = title_words(article.get('title'))
+        self._words[order] = words
+        root = self._cluster(order, words)
+        members = self._members[root]
+        boost = 1 + CLUSTER_BOOST * (len(members) - 1)
+        for member in members:
+            self.scores[member] = self.base_scores[member] * boost
+            self._push(member)
+
+    def top(self):
+        """The best k articles, best first"""
+        current = {}
+        for score, negative_order in self._heap:
+            if self.scores[-negative_order] == score:
+                current[-negative_order] = score
+        if len(current) < min(self.k, len(self.articles)):
+            # Outdated entries took slots another article needed; rebuild from the current scores
+            self._heap = heapq.nlargest(self.k, ((score, -order) for order, score in self.scores.items()))
+            heapq.heapify(self._heap)
+            current = {-negative_order: score for score, negative_order in self._heap}
+        best = sorted(current.items(), key=lambda item: (item[1], -item[0]), reverse=True)
+        return [self.articles[order] for order, _ in best]
+
+
+def rank_views(articles, source_weights=None, front_page_size=FRONT_PAGE_SIZE, now=None):
+    """Rank a snapshot and precompute its hero and front page
+
+    Returns RankedViews(articles, hero, front_page). articles is the snapshot
+    with isHero set on the ranked hero only; the flagged articles are copies,
+    so records shared with an earlier snapshot are never mutated.
+    """
+    ranker = Ranker(front_page_size + 1, source_weights, now)
+    for article in articles:
+        ranker.add(article)
+    top = ranker.top()
+    if not top:
+        return RankedViews(list(articles), None, [])
+    flagged = []
+    copies = {}
+    for article in articles:
+        is_hero = article is top[0]
+        if bool(article.get('isHero')) != is_hero:
+            copies[id(article)] = article = dict(article, isHero=is_hero)
+        flagged.append(article)
+    hero, *front_page = [copies.get(id(article), article) for article in top]
+    return RankedViews(flagged, hero, front_page)
+
+
+def map_views(views, update):
+    """Apply update(article) -> article across a snapshot and its views without re-ranking"""
+    updated = {}
+    articles = []
+    for article in views.articles:
+        updated[id(article)] = new = update(article)
+        articles.append(new)
+    hero = updated.get(id(views.hero), views.hero)
+    return RankedViews(articles, hero, [updated.get(id(article), article) for article in views.front_page])
+
+
+def page(views, limit, include_hero=True):
+    """The first `limit` articles by rank: the ranked views, then the rest newest first"""
+    ranked = ([views.hero] if include_hero and views.hero is not None else []) + views.front_page
+    if limit <= len(ranked):
+        return ranked[:max(limit, 0)]
+    # Only requests past the front page pay for a pass over the snapshot
+    skip = {id(article) for article in ranked + [views.hero]}
+    rest = [article for article in views.articles if id(article) not in skip]
+    return ranked + rest[:limit - len(ranked)]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Compact in-memory representation of article histories
+
+A published article is a dict with its own copy of the source dict and a str
+object per field, several hundred bytes of overhead per article before any
+text. ArticleHistory stores a long history column-wise instead:
+- Sources are interned; each article holds a 4-byte reference
+- IDs (the 64-bit link digest) and publication times (microseconds since
+  the epoch) live in typed arrays, and topics in a 16-bit mask per article
+- Title, summary, link and image are UTF-8 in one shared buffer, decoded
+  only when a row is serialized or turned back into a dict
+- to_json() writes rows straight to JSON, with each source's JSON encoded
+  once, instead of building a dict per article
+
+Articles are read back through ArticleRecord, a __slots__ view of one row
+whose to_dict() decodes all of its fields at once.
+
+Nothing in the apps uses the store: it only backs the memory benchmark,
+which measures it against article dicts. The time and ID helpers are shared
+with archive.py's index.
+"""
+from array import array
+from datetime import datetime, timedelta, timezone
+import json
+from json.encoder import encode_basestring_ascii
+import threading
+
+from extraction import ARTICLE_ID_LENGTH
+from topics import TOPIC_SLUGS
+
+TEXT_FIELDS = ('title', 'summary', 'link', 'image')
+NO_TIME = -(2 ** 63)  # Publication time that could not be parsed
+EPOCH = datetime(1970, 1, 1)
+# Key order and separators of json.dumps(ArticleRecord.to_dict())
+ARTICLE_JSON = ('{"id": %s, "title": %s, "summary": %s, "link": %s, "published": %s, "image": %s, '
+                '"source": %s, "topics": %s, "isHero": false}')
+TOPIC_BITS = {slug: 1 << bit for bit, slug in enumerate(TOPIC_SLUGS)}
+
+
+def encode_time(published):
+    """Microseconds since the epoch of a naive ISO timestamp (NO_TIME if unparseable)"""
+    try:
+        moment = datetime.fromisoformat(published)
+    except (TypeError, ValueError):
+        return NO_TIME
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def decode_time(value):
+    if value == NO_TIME:
+        return ''
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def encode_topics(topics):
+    """Bit mask of the known topic slugs in topics"""
+    mask = 0
+    for slug in topics or ():
+        mask |= TOPIC_BITS.get(slug, 0)
+    return mask
+
+
+def decode_topics(mask):
+    return [slug for slug in TOPIC_SLUGS if mask & TOPIC_BITS[slug]]
+
+
+def parse_digest(article_id):
+    """The integer value of a link-digest article ID, or None for any other ID"""
+    if not isinstance(article_id, str) or len(article_id) != ARTICLE_ID_LENGTH:
+        return None
+    try:
+        return int(article_id, 16)
+    except ValueError:
+        return None
+
+
+class ArticleRecord:
+    """Read-only view of one article in an ArticleHistory"""
+    __slots__ = ('_history', '_row')
+
+    def __init__(self, history, row):
+        self._history = history
+        self._row = row
+
+    def to_dict(self):
+        """The article as the API serves it"""
+        history, row = self._history, self._row
+        title, summary, link, image = history._decode_all(row)
+        return {
+            'id': history._id(row),
+            'title': title,
+            'summary': summary,
+            'link': link,
+            'published': decode_time(history._times[row]),
+            'image': image or None,
+            'source': dict(history._sources[history._source_refs[row]]),
+            'topics': decode_topics(history._topics[row]),
+            'isHero': False
+        }
+
+    def __repr__(self):
+        return f"ArticleRecord({self._history._id(self._row)!r})"
+
+
+class ArticleHistory:
+    """Append-only, column-wise store of articles"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = array('Q')
+        self._other_ids = {}  # Row -> ID for IDs that are not link digests (e.g. sample data)
+        self._times = array('q')
+        self._source_refs = array('I')
+        self._topics = array('H')
+        self._sources = []
+        self._source_index = {}
+        self._sources_json = {}
+        self._text = bytearray()
+        self._offsets = array('Q', [0])  # Start of every text field, plus the end of the buffer
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return ArticleRecord(self, row)
+
+    def _intern_source(self, source):
+        key = (source.get('name', ''), source.get('url', ''), source.get('logo', ''))
+        ref = self._source_index.get(key)
+        if ref is None:
+            ref = len(self._sources)
+            self._sources.append({'name': key[0], 'url': key[1], 'logo': key[2]})
+            self._source_index[key] = ref
+        return ref
+
+    def append(self, article):
+        """Store a copy of an article dict; returns its row"""
+        article_id = article.get('id')
+        fields = [(article.get(field) or '').encode('utf-8') for field in TEXT_FIELDS]
+        with self._lock:
+            row = len(self._ids)
+            digest = parse_digest(article_id)
+            if digest is None:
+                self._other_ids[row] = article_id
+            self._ids.append(digest or 0)
+            self._times.append(encode_time(article.get('published')))
+            self._source_refs.append(self._intern_source(article.get('source') or {}))
+            self._topics.append(encode_topics(article.get('topics')))
+            for field in fields:
+                self._text += field
+                self._offsets.append(len(self._text))
+            return row
+
+    def extend(self, articles):
+        for article in articles:
+            self.append(article)
+        return len(self)
+
+    def _id(self, row):
+        other = self._other_ids.get(row)
+        if other is not None:
+            return other
+        return f"{self._ids[row]:0{ARTICLE_ID_LENGTH}x}"
+
+    def _decode_all(self, row):
+        base = row * len(TEXT_FIELDS)
+        offsets, text = self._offsets, self._text
+        return [text[offsets[index]:offsets[index + 1]].decode('utf-8')
+                for index in range(base, base + len(TEXT_FIELDS))]
+
+    def _source_json(self, ref):
+        encoded = self._sources_json.get(ref)
+        if encoded is None:
+            source = self._sources[ref]
+            encoded = self._sources_json[ref] = '{"name": %s, "url": %s, "logo": %s}' % tuple(
+                encode_basestring_ascii(source[key]) for key in ('name', 'url', 'logo'))
+        return encoded
+
+    @staticmethod
+    def _topics_json(mask, cache):
+        encoded = cache.get(mask)
+        if encoded is None:
+            encoded = cache[mask] = json.dumps(decode_topics(mask))
+        return encoded
+
+    def to_json(self, rows=None):
+        """JSON array of the given rows (all by default), as json.dumps() of their to_dict() would write it"""
+        rows = range(len(self)) if rows is None else rows
+        encode = encode_basestring_ascii
+        text, offsets, times, refs, other_ids = self._text, self._offsets, self._times, self._source_refs, self._other_ids
+        masks = self._topics
+        width = len(TEXT_FIELDS)
+        topics_json = {}  # Mask -> encoded list; articles share a handful of topic combinations
+        parts = []
+        for row in rows:
+            base = row * width
+            title, summary, link, image = [text[offsets[index]:offsets[index + 1]].decode('utf-8')
+                                           for index in range(base, base + width)]
+            parts.append(ARTICLE_JSON % (
+                json.dumps(other_ids[row]) if row in other_ids else '"%0*x"' % (ARTICLE_ID_LENGTH, self._ids[row]),
+                encode(title), encode(summary), encode(link), encode(decode_time(times[row])),
+                encode(image) if image else 'null',
+                self._source_json(refs[row]),
+                self._topics_json(masks[row], topics_json)))
+        return '[' + ', '.join(parts) + ']'
+
+    def nbytes(self):
+        """Approximate memory held by the columns, excluding the interned sources"""
+        return (self._ids.itemsize * len(self._ids) + self._times.itemsize * len(self._times) +
+                self._source_refs.itemsize * len(self._source_refs) + self._topics.itemsize * len(self._topics) +
+                len(self._text) +
+                self._offsets.itemsize * len(self._offsets))
@@ -49,7 +49,17 @@ const API_CONFIG = {
         : '', // Empty string means same domain for production
     ARTICLES_ENDPOINT: '/api/articles',
     HERO_ENDPOINT: '/api/hero',
-    LIMIT: 12 // Number of articles to fetch
+    CHANGES_ENDPOINT: '/api/articles/changes',
+    LIMIT: 12, // Number of articles to fetch
+    SYNC_INTERVAL: 60 * 1000 // Poll for changes every minute
+};
+
+// The articles on screen and the snapshot version they come from,
+// kept current with the deltas from /api/articles/changes
+const syncState = {
+    version: null,
+    epoch: '',
+    articles: new Map()
 };
 
 // Fallback articles in case the API is not available
@@ -160,6 +170,11 @@ async function fetchArticlesFromAPI() {
         
         renderFeaturedArticles(featuredArticles.length > 0 ? featuredArticles : FALLBACK_ARTICLES.slice(1));
         
+        // Remember what is shown so later polls only need the changes
+        syncState.version = typeof articlesData.version === 'number' ? articlesData.version : null;
+        syncState.epoch = articlesData.epoch || '';
+        syncState.articles = new Map([heroArticle, ...featuredArticles].filter(Boolean).map(article => [article.id, article]));
+        
         // Update last fetched time in footer if available
         if (articlesData.lastUpdated) {
             const lastUpdated = new Date(articlesData.lastUpdated);
@@ -190,6 +205,7 @@ async function fetchArticlesFromAPI() {
         
         // Fall back to sample data if API fails
         console.log('Falling back to sample data');
+        syncState.version = null;
         const heroArticle = FALLBACK_ARTICLES.find(article => article.isHero);
         const featuredArticles = FALLBACK_ARTICLES.filter(article => !article.isHero);
         
@@ -216,6 +232,11 @@ function renderHeroArticle(article) {
     // Create image
     const img = document.createElement('img');
     img.src = article.image;
+    if (article.srcset) {
+        // Resized variants from the local image proxy
+        img.srcset = article.srcset;
+        img.sizes = '100vw';
+    }
     img.alt = article.title;
     heroArticleElement.appendChild(img);
     
@@ -266,6 +287,11 @@ function renderFeaturedArticles(articles) {
         // Create image
         const img = document.createElement('img');
         img.src = article.image;
+        if (article.srcset) {
+            img.srcset = article.srcset;
+            img.sizes = '(max-width: 768px) 100vw, 33vw';
+        }
+        img.loading = 'lazy';
         img.alt = article.title;
         card.appendChild(img);
         
@@ -313,13 +339,63 @@ function renderArticlesDirect(articles) {
     renderFeaturedArticles(articles);
 }
 
+// Apply the changes since the version on screen instead of reloading every article
+async function syncArticles() {
+    if (syncState.version === null) {
+        // Nothing synced yet (or the API was unavailable): load everything
+        return fetchArticlesFromAPI();
+    }
+    try {
+        const response = await fetch(`${API_CONFIG.BASE_URL}${API_CONFIG.CHANGES_ENDPOINT}?since=${syncState.version}&epoch=${encodeURIComponent(syncState.epoch)}&limit=${API_CONFIG.LIMIT}`, {
+            method: 'GET',
+            mode: 'cors',
+            credentials: 'same-origin',
+            headers: {
+                'Accept': 'application/json'
+            }
+        });
+        if (!response.ok) {
+            throw new Error(`Failed to fetch changes: ${response.statusText}`);
+        }
+        const delta = await response.json();
+        if (delta.reset) {
+            // Too far behind, or the server restarted
+            console.log('Article changes unavailable, reloading all articles');
+            return fetchArticlesFromAPI();
+        }
+        syncState.version = delta.version;
+        syncState.epoch = delta.epoch;
+        if (delta.upserted.length === 0 && delta.removed.length === 0) {
+            return;
+        }
+        console.log(`Applying ${delta.upserted.length} updated and ${delta.removed.length} removed articles`);
+        delta.upserted.forEach(article => syncState.articles.set(article.id, article));
+        delta.removed.forEach(id => syncState.articles.delete(id));
+        
+        // In the server's rank order
+        const ordered = delta.order.map(id => syncState.articles.get(id));
+        if (ordered.length === 0 || ordered.some(article => !article)) {
+            // An article that is not on screen moved up; only a full reload has it
+            return fetchArticlesFromAPI();
+        }
+        const heroArticle = ordered.find(article => article.isHero) || ordered[0];
+        const featuredArticles = ordered.filter(article => article !== heroArticle).slice(0, API_CONFIG.LIMIT);
+        renderHeroArticle(heroArticle);
+        renderFeaturedArticles(featuredArticles);
+        // Keep only what is on screen; articles pushed out come back as upserts if they change
+        syncState.articles = new Map([heroArticle, ...featuredArticles].map(article => [article.id, article]));
+    } catch (error) {
+        console.error('Error syncing articles:', error);
+    }
+}
+
 // Add a function to periodically refresh articles
 function setupArticleRefresh() {
-    // Refresh articles every 15 minutes
+    // Poll for changes every minute; unchanged polls cost a few bytes
     setInterval(() => {
-        console.log('Refreshing articles...');
-        fetchArticlesFromAPI();
-    }, 15 * 60 * 1000); // 15 minutes in milliseconds
+        console.log('Checking for article changes...');
+        syncArticles();
+    }, API_CONFIG.SYNC_INTERVAL);
 }
 
 // Call this after initial fetch
@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
 """
 Simple HTTP server for hosting the NexusAI website
+
+Usage:
+    python server.py [port]                 # Development: single-threaded, opens a browser
+    python server.py [port] --production    # Threaded, zero-copy, cache-aware (or SERVER_MODE=production)
 """
+import email.utils
 import http.server
 import socketserver
 import os
+import socket
+from urllib.parse import unquote, urlsplit
+
+import assets
 
 # Set the port
 PORT = 8000
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Set the directory to serve files from
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BASE_DIR)
 
 # Create a handler with directory listing enabled
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
@@ -23,12 +34,179 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
 
 Handler = CustomHTTPRequestHandler
 
+
+class ProductionRequestHandler(CustomHTTPRequestHandler):
+    """Keep-alive handler that sends files with sendfile and honours cache validators
+
+    - / and /assets/ come from the fingerprinted build in assets.py
+    - Besides the build, only the site files in SITE_FILES and images at the
+      top of the site are served, negotiated against .br/.gz siblings when
+      present; everything else (sources, data, directories) is a 404
+    - ETag/Last-Modified with 304s, single byte ranges with 206/416
+    """
+    protocol_version = 'HTTP/1.1'
+    DEFAULT_CACHE_CONTROL = 'no-cache'
+    # Unbuilt copies of the page, in case the build failed, and the other static pages
+    SITE_FILES = {assets.INDEX, 'simple.html', 'favicon.ico', *assets.ASSETS}
+    IMAGE_EXTENSIONS = ('.ico', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp')
+
+    def setup(self):
+        super().setup()
+        # Headers and the sendfile body go out as separate writes; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        self.send_file(head=False)
+
+    def do_HEAD(self):
+        self.send_file(head=True)
+
+    def select_file(self):
+        """Pick (path, content_type, content_encoding, cache_control) for the request, or None"""
+        url_path = urlsplit(self.path).path
+        accept_encoding = self.headers.get('Accept-Encoding')
+        if url_path in ('/', '/' + assets.INDEX):
+            selected = assets.resolve(assets.INDEX, accept_encoding)
+        elif url_path.startswith('/' + assets.ASSET_PREFIX):
+            selected = assets.resolve(url_path[1:], accept_encoding)
+        else:
+            selected = None
+        if selected:
+            return selected
+
+        name = unquote(url_path).lstrip('/')
+        if '/' in name or '\\' in name:
+            return None
+        if name not in self.SITE_FILES and not name.lower().endswith(self.IMAGE_EXTENSIONS):
+            return None
+        path = os.path.join(BASE_DIR, name)
+        if not os.path.isfile(path):
+            return None
+        accepted = assets.accepted_encodings(accept_encoding)
+        for coding, suffix in assets.ENCODINGS:
+            if coding in accepted and os.path.isfile(path + suffix):
+                return path + suffix, self.guess_type(path), coding, self.DEFAULT_CACHE_CONTROL
+        return path, self.guess_type(path), None, self.DEFAULT_CACHE_CONTROL
+
+    def list_directory(self, path):
+        self.send_error(404, "File not found")
+        return None
+
+    def not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def byte_range(self, etag, size):
+        """(start, end) of a satisfiable single range, 'invalid' if unsatisfiable, None for the full body"""
+        header = self.headers.get('Range')
+        if not header or not header.startswith('bytes=') or ',' in header:
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range.strip() != etag:
+            return None
+        start, _, end = header[len('bytes='):].strip().partition('-')
+        try:
+            if not start:
+                length = int(end)
+                if length <= 0:
+                    return 'invalid'
+                return max(0, size - length), size - 1
+            start = int(start)
+            end = min(int(end), size - 1) if end else size - 1
+        except ValueError:
+            return None
+        if start >= size or start > end:
+            return 'invalid'
+        return start, end
+
+    def send_file(self, head=False):
+        selected = self.select_file()
+        if selected is None:
+            self.send_error(404, "File not found")
+            return
+        path, content_type, encoding, cache_control = selected
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            common = {
+                'ETag': etag,
+                'Last-Modified': email.utils.formatdate(stat.st_mtime, usegmt=True),
+                'Cache-Control': cache_control,
+                'Vary': 'Accept-Encoding'
+            }
+
+            if self.not_modified(etag, stat.st_mtime):
+                self.send_response(304)
+                for name, value in common.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+
+            offset, length = 0, stat.st_size
+            byte_range = self.byte_range(etag, stat.st_size)
+            if byte_range == 'invalid':
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{stat.st_size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byte_range:
+                offset, end = byte_range
+                length = end - offset + 1
+                self.send_response(206)
+                self.send_header('Content-Range', f"bytes {offset}-{end}/{stat.st_size}")
+            else:
+                self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            for name, value in common.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if not head and length:
+                # Zero-copy from the page cache to the socket where the OS supports it
+                self.connection.sendfile(f, offset, length)
+
+
+class ProductionServer(http.server.ThreadingHTTPServer):
+    """One thread per connection, so a slow client never blocks the others"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def run_production(port=PORT):
+    assets.build_or_none()
+    with ProductionServer(("", port), ProductionRequestHandler) as httpd:
+        print(f"Serving (production) at http://localhost:{port}")
+        httpd.serve_forever()
+
+
 if __name__ == "__main__":
     import sys
     import webbrowser
     from threading import Timer
-    if len(sys.argv) > 1:
-        PORT = int(sys.argv[1])
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if args:
+        PORT = int(args[0])
+    if '--production' in sys.argv or os.environ.get('SERVER_MODE') == 'production':
+        run_production(PORT)
+        sys.exit(0)
     def open_browser():
         webbrowser.open(f"http://localhost:{PORT}/index.html")
     Timer(1, open_browser).start()
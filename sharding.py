@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Horizontally sharded ingestion
+
+Feeds are split across shards with the consistent hash ring from
+feed_registry, so each feed keeps landing on the same shard and that shard's
+entry memo stays warm.
+
+- ShardedIngestor runs one ingestion worker process per shard on this
+  machine, so parsing and extraction are not limited by a single GIL
+- NodeIngestor lets several nodes share the registry: each node ingests only
+  its own shard and exchanges results with the others through a local store
+  directory (for example a shared volume)
+
+Both are drop-in ingestors for pipeline.refresh().
+"""
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import pipeline
+from entry_memo import EntryMemo
+from feed_health import health_registry
+from feed_registry import HashRing, shard_feeds
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 0))  # 0 ingests in the app process
+INGEST_NODE_COUNT = int(os.environ.get('INGEST_NODE_COUNT', 1))
+INGEST_NODE_INDEX = int(os.environ.get('INGEST_NODE_INDEX', 0))
+INGEST_STORE_DIR = os.environ.get('INGEST_STORE_DIR')
+WORKER_TIMEOUT = 300  # Seconds to wait for a worker's shard before giving up on it
+
+
+def _worker_main(conn, shard):
+    """Ingestion worker process: ingest every batch of feeds sent over conn
+
+    Replies carry the sequence number of the request they answer.
+    """
+    memo_path = os.environ.get('ENTRY_CACHE_FILE')
+    memo = EntryMemo(path=f"{memo_path}.shard{shard}" if memo_path else None)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        command, sequence, payload = message
+        try:
+            if command == 'ingest':
+                feeds, defer_images = payload
+                result = pipeline.ingest(feeds, defer_images=defer_images, memo=memo)
+                conn.send(('ok', sequence, {
+                    'articles': result.articles,
+                    'pending_images': result.pending_images,
+                    'by_feed': result.by_feed,
+                    'stats': pipeline.last_stats,
+                    'upstream_health': health_registry.snapshot()
+                }))
+            elif command == 'patch_images':
+                memo.patch_images(payload)
+                memo.save()
+        except Exception as e:
+            logger.error(f"Error in ingestion worker {shard}: {e}")
+            if command == 'ingest':
+                conn.send(('error', sequence, str(e)))
+
+
+class ShardedIngestor:
+    """Ingest feeds in worker_count processes, one consistent-hash shard each
+
+    A worker that dies or times out is replaced, so one bad shard only loses
+    its own feeds for that refresh.
+    """
+
+    def __init__(self, worker_count=INGEST_WORKERS):
+        self.worker_count = worker_count
+        self.shard_stats = {}
+        self.restarts = 0
+        self._workers = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._context = multiprocessing.get_context('spawn')
+
+    def _spawn(self, shard):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn, shard),
+                                        name=f"ingest-worker-{shard}", daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _start(self):
+        if not self._workers:
+            self._workers = [self._spawn(shard) for shard in range(self.worker_count)]
+            logger.info(f"Started {self.worker_count} ingestion worker processes")
+            return
+        for shard, (process, conn) in enumerate(self._workers):
+            if not process.is_alive():
+                logger.warning(f"Ingestion worker {shard} exited with code {process.exitcode}; restarting it")
+                self._restart(shard)
+
+    def _restart(self, shard):
+        process, conn = self._workers[shard]
+        if process.is_alive():
+            process.terminate()
+        process.join(5)
+        conn.close()
+        self._workers[shard] = self._spawn(shard)
+        self.restarts += 1
+
+    def _send(self, shard, message):
+        """Send a message to a worker, restarting it once if its pipe is broken"""
+        try:
+            self._workers[shard][1].send(message)
+        except (EOFError, OSError) as e:
+            logger.error(f"Ingestion worker {shard} is unreachable ({e}); restarting it")
+            self._restart(shard)
+            self._workers[shard][1].send(message)
+
+    def _receive(self, shard, sequence, deadline):
+        """The payload of the worker's reply to request `sequence`, or None if it failed or timed out"""
+        process, conn = self._workers[shard]
+        while True:
+            if not conn.poll(max(0, deadline - time.monotonic())):
+                logger.error(f"Ingestion worker {shard} timed out; restarting it")
+                self._restart(shard)
+                return None
+            status, replied, payload = conn.recv()
+            if replied != sequence:
+                continue  # Late reply to an earlier request
+            if status != 'ok':
+                logger.error(f"Ingestion worker {shard} failed: {payload}")
+                return None
+            return payload
+
+    def __call__(self, feeds, defer_images=True):
+        with self._lock:
+            self._start()
+            self._sequence += 1
+            sequence = self._sequence
+            shards = shard_feeds(feeds, self.worker_count)
+            sent = set()
+            for shard, batch in enumerate(shards):
+                try:
+                    self._send(shard, ('ingest', sequence, (batch, defer_images)))
+                    sent.add(shard)
+                except (EOFError, OSError) as e:
+                    logger.error(f"Could not send shard {shard} to its worker: {e}")
+
+            articles, pending_images, by_feed, stats = [], [], {}, {}
+            deadline = time.monotonic() + WORKER_TIMEOUT
+            for shard, batch in enumerate(shards):
+                if shard not in sent:
+                    continue
+                try:
+                    payload = self._receive(shard, sequence, deadline)
+                except (EOFError, OSError) as e:
+                    logger.error(f"Ingestion worker {shard} died during the refresh ({e}); restarting it")
+                    self._restart(shard)
+                    continue
+                if payload is None:
+                    continue
+                articles.extend(payload['articles'])
+                pending_images.extend(payload['pending_images'])
+                by_feed.update(payload['by_feed'])
+                stats[shard] = {
+                    'feeds': len(batch),
+                    'pipeline': payload['stats'],
+                    'upstream_health': payload['upstream_health']
+                }
+            self.shard_stats = stats
+
+        pipeline.last_stats.clear()
+        pipeline.last_stats.update({'shards': stats, 'worker_restarts': self.restarts})
+        return pipeline.IngestionResult(pipeline.order_articles(articles), pending_images, stats, by_feed)
+
+    def patch_images(self, resolved):
+        """Forward images resolved by the background phase to the workers' memos"""
+        with self._lock:
+            self._start()
+            for shard in range(len(self._workers)):
+                try:
+                    self._send(shard, ('patch_images', None, resolved))
+                except (EOFError, OSError) as e:
+                    logger.error(f"Could not patch the images of worker {shard}: {e}")
+
+    def stop(self):
+        with self._lock:
+            for process, conn in self._workers:
+                try:
+                    conn.send(None)
+                except (EOFError, OSError):
+                    pass
+            for process, conn in self._workers:
+                process.join(5)
+                if process.is_alive():
+                    process.terminate()
+            self._workers = []
+
+
+class NodeIngestor:
+    """Ingest only this node's shard and merge every node's latest results
+
+    Each node writes its shard to <store_dir>/shard-<index>.json and reads
+    the files written by the other nodes.
+    """
+
+    def __init__(self, node_index=INGEST_NODE_INDEX, node_count=INGEST_NODE_COUNT, store_dir=INGEST_STORE_DIR,
+                 ingestor=None):
+        self.node_index = node_index
+        self.node_count = node_count
+        self.store_dir = store_dir
+        self.ingestor = ingestor or pipeline.ingest
+        self.ring = HashRing(range(node_count))
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _shard_path(self, index):
+        return os.path.join(self.store_dir, f"shard-{index}.json")
+
+    def __call__(self, feeds, defer_images=True):
+        mine = [feed for feed in feeds if self.ring.shard_for(feed['url']) == self.node_index]
+        result = self.ingestor(mine, defer_images=defer_images)
+
+        # Publish our shard for the other nodes
+        path = self._shard_path(self.node_index)
+        try:
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'node': self.node_index, 'updated': time.time(), 'by_feed': result.by_feed}, f)
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            logger.error(f"Error writing shard {path}: {e}")
+
+        # Merge the latest results of the other nodes; refresh() drops feeds no longer in the registry
+        by_feed = dict(result.by_feed)
+        for other in glob.glob(os.path.join(self.store_dir, 'shard-*.json')):
+            if other == path:
+                continue
+            try:
+                with open(other, 'r') as f:
+                    shard = json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading shard {other}: {e}")
+                continue
+            for url, feed_articles in shard.get('by_feed', {}).items():
+                if self.ring.shard_for(url) != self.node_index:
+                    by_feed[url] = feed_articles
+
+        articles = [article for feed_articles in by_feed.values() for article in feed_articles]
+        return pipeline.IngestionResult(pipeline.order_articles(articles), result.pending_images, result.stats, by_feed)
+
+
+def build_ingestor():
+    """Pick the ingestor configured through the environment (None means in-process)"""
+    ingestor = ShardedIngestor(INGEST_WORKERS) if INGEST_WORKERS > 0 else None
+    if INGEST_NODE_COUNT > 1:
+        if not INGEST_STORE_DIR:
+            raise ValueError("INGEST_STORE_DIR is required when INGEST_NODE_COUNT > 1")
+        ingestor = NodeIngestor(ingestor=ingestor)
+    return ingestor
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Topic tags and prebuilt per-topic and per-source article lists
+
+Topics are assigned once, when an entry is extracted:
+- The title, summary and the feed's own tags (RSS <category>) are matched
+  against a topic lexicon compiled into phrase and prefix tables, so tagging
+  an article is one tokenizing pass and a few dict lookups per word, whatever
+  the number of topics
+- Articles carry the slugs of their topics in TOPICS order
+
+For every published snapshot, Facets builds the article list of every topic,
+every source and every topic/source pair in ranked order, with each article
+serialized to JSON once. /api/articles?topic=&source= then joins the first
+`limit` prebuilt entries instead of filtering and serializing the snapshot.
+"""
+import json
+import re
+import threading
+
+from ranking import page
+
+# Slug -> (label, keywords). Keywords are lowercase words or phrases, singular (a trailing 's' on the
+# last word also matches); a trailing '*' matches any word starting with the keyword.
+# At most 16 topics, as records.py keeps them in a 16-bit mask.
+TOPICS = {
+    'machine-learning': ('Machine Learning', [
+        'machine learning', 'deep learning', 'neural network', 'neural net', 'reinforcement learning',
+        'training data', 'training run', 'fine-tune', 'fine-tuned', 'fine-tuning', 'ml'
+    ]),
+    'nlp': ('NLP', [
+        'natural language', 'nlp', 'language model', 'llm', 'chatbot', 'chatgpt', 'gpt*', 'claude', 'gemini',
+        'speech recognition', 'machine translation'
+    ]),
+    'computer-vision': ('Computer Vision', [
+        'computer vision', 'image recognition', 'facial recognition', 'face recognition', 'object detection',
+        'image generation', 'image generator', 'video generation', 'video generator', 'self-driving',
+        'autonomous vehicle', 'autonomous driving', 'autonomous car', 'lidar'
+    ]),
+    'generative-ai': ('Generative AI', [
+        'generative', 'genai', 'diffusion model', 'stable diffusion', 'midjourney', 'dall-e', 'sora',
+        'text-to-image', 'text-to-video', 'text-to-speech', 'chatgpt', 'deepfake'
+    ]),
+    'robotics': ('Robotics', [
+        'robot', 'robotic', 'robotics', 'humanoid', 'drone', 'autonomous vehicle', 'autonomous driving',
+        'autonomous car'
+    ]),
+    'hardware': ('Hardware', [
+        'chip', 'gpu', 'tpu', 'nvidia', 'semiconductor', 'data center', 'data centre', 'datacenter',
+        'supercomputer'
+    ]),
+    'research': ('Research', [
+        'research', 'researcher', 'paper', 'benchmark', 'breakthrough', 'scientist', 'study', 'arxiv'
+    ]),
+    'policy': ('Policy & Ethics', [
+        'regulat*', 'ai act', 'legislation', 'lawsuit', 'copyright', 'ethic', 'ethics', 'ai safety', 'bias',
+        'privacy', 'congress', 'senate'
+    ]),
+    'business': ('Business', [
+        'funding', 'raise', 'raised', 'startup', 'acquire', 'acquisition', 'valuation', 'investor', 'ipo',
+        'earnings', 'revenue'
+    ])
+}
+TOPIC_SLUGS = list(TOPICS)
+
+# Words, keeping hyphenated and dotted ones like 'text-to-image' or 'gpt-4.5' whole
+WORD_RE = re.compile(r'[a-z0-9]+(?:[-.][a-z0-9]+)*')
+
+
+def _compile_lexicon(topics):
+    """(phrase -> slugs, prefix -> slugs, first words of multi-word phrases, longest phrase in words)"""
+    phrases, prefixes = {}, {}
+    for slug, (_, keywords) in topics.items():
+        for keyword in keywords:
+            if keyword.endswith('*'):
+                prefixes.setdefault(keyword[:-1], []).append(slug)
+            else:
+                phrases.setdefault(keyword, []).append(slug)
+    starts = {phrase.split(' ')[0] for phrase in phrases if ' ' in phrase}
+    longest = max(len(phrase.split(' ')) for phrase in phrases)
+    return phrases, prefixes, starts, longest
+
+
+PHRASES, PREFIXES, PHRASE_STARTS, MAX_PHRASE_WORDS = _compile_lexicon(TOPICS)
+PREFIX_TUPLE = tuple(PREFIXES)
+
+
+def _lookup(phrase):
+    slugs = PHRASES.get(phrase)
+    if slugs is None and phrase.endswith('s'):
+        slugs = PHRASES.get(phrase[:-1])
+    return slugs
+
+
+def assign(title, summary='', tags=None):
+    """Slugs of the topics of an entry, in TOPICS order
+
+    tags are the entry's feed tags (feedparser's entry.tags, dicts with a 'term').
+    Each field is tokenized once and its words and phrases are looked up in
+    the lexicon tables.
+    """
+    found = set()
+    # Fields are matched separately, so phrases never span two of them
+    for text in [title, summary] + [tag.get('term') for tag in tags or ()]:
+        words = WORD_RE.findall((text or '').lower())
+        for position, word in enumerate(words):
+            slugs = _lookup(word)
+            if slugs:
+                found.update(slugs)
+            if word.startswith(PREFIX_TUPLE):
+                for prefix, slugs in PREFIXES.items():
+                    if word.startswith(prefix):
+                        found.update(slugs)
+            if word in PHRASE_STARTS:
+                for length in range(2, MAX_PHRASE_WORDS + 1):
+                    slugs = _lookup(' '.join(words[position:position + length]))
+                    if slugs:
+                        found.update(slugs)
+    return [slug for slug in TOPIC_SLUGS if slug in found]
+
+
+def source_key(name):
+    return (name or '').strip().lower()
+
+
+class Facets:
+    """Article lists of one snapshot by topic, by source and by both, in ranked order
+
+    serialize(article) returns the JSON of an article as served; every
+    article is serialized once and shared by all of its lists.
+    """
+
+    def __init__(self, ordered, serialize):
+        self.lists = {}  # (topic or None, source key or None) -> serialized articles
+        for article in ordered:
+            encoded = serialize(article)
+            source = source_key((article.get('source') or {}).get('name'))
+            for topic in [None] + list(article.get('topics') or ()):
+                for key in ((topic, source), (topic, None)):
+                    if key != (None, None):
+                        self.lists.setdefault(key, []).append(encoded)
+
+    def counts(self):
+        """Articles per topic"""
+        return {slug: len(self.lists.get((slug, None), ())) for slug in TOPIC_SLUGS}
+
+    def page_json(self, topic=None, source=None, limit=12, **fields):
+        """JSON object with the first `limit` articles of a list, their total and any extra fields
+
+        Costs O(limit) whatever the size of the snapshot.
+        """
+        encoded = self.lists.get((topic or None, source_key(source) or None), [])
+        body = '{"articles": [%s], "total": %d' % (', '.join(encoded[:max(limit, 0)]), len(encoded))
+        for name, value in fields.items():
+            body += ', "%s": %s' % (name, json.dumps(value))
+        return body + '}'
+
+
+class FacetCache:
+    """Facets of the latest ranked views (ranking.RankedViews), built once per snapshot"""
+
+    def __init__(self, serialize):
+        self._serialize = serialize
+        self._lock = threading.Lock()
+        self._views = None
+        self._facets = None
+
+    def get(self, views):
+        with self._lock:
+            if self._views is not views:
+                # Ranked order: the hero, the front page, then the rest newest first
+                self._facets = Facets(page(views, len(views.articles)), self._serialize)
+                self._views = views
+            return self._facets
@@ -0,0 +1,10 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for api.py, e.g. `gunicorn wsgi:app`
+
+Starts the process (warm snapshot, background fetcher, ...) before the first
+request instead of on it.
+"""
+from api import app, init
+
+init()